@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark content extraction on deeply nested pages.
+
+Page builders such as Elementor or Divi wrap every paragraph in 15-20
+levels of <div>. Calling get_text() and find() per block (the previous
+extraction approach) re-walks each subtree, so time grows with the square
+of the nesting depth. The single-pass extractor in scrape_site.py should
+scale linearly: the time per node stays flat as the depth grows.
+
+Usage:
+    python benchmark_extraction.py
+    python benchmark_extraction.py --depths 20 80 320 640 --sections 10
+"""
+
+import argparse
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+from scrape_site import ReplayFetcher, WebsiteCrawler
+
+
+def nested_page(depth: int, sections: int) -> str:
+    """
+    Build a page-builder style page.
+
+    Args:
+        depth: Wrapper <div> levels around each section's content
+        sections: Number of sections on the page
+
+    Returns:
+        HTML string
+    """
+    parts = ['<html><head><title>Nested page</title></head><body><main>']
+    for section in range(sections):
+        # Every wrapper level carries a little text of its own, as builders do with labels
+        for level in range(depth):
+            parts.append(f'<div class="elementor-column-wrap level-{level}"><span>Wrapper {level}</span>')
+        parts.append(f'<h2>Section {section} heading text</h2>')
+        parts.append(f'<p>Paragraph text of section {section} that is long enough to keep.</p>')
+        parts.append('<ul><li>First list item</li><li>Second list item</li></ul>')
+        parts.append('</div>' * depth)
+    parts.append('</main></body></html>')
+    return ''.join(parts)
+
+
+def naive_clean_text(soup: BeautifulSoup) -> str:
+    """Clean text computed the previous way: get_text() and find() on every block."""
+    main_content = soup.find('main') or soup.find('body') or soup
+    clean_parts = []
+    for element in main_content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'ul', 'ol', 'blockquote', 'div']):
+        text = element.get_text(separator=' ', strip=True)
+        if element.name == 'div' and element.find(['div', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+            continue
+        if text and len(text) > 15:
+            if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+                clean_parts.append(f"{'#' * int(element.name[1])} {text}")
+            elif element.name in ['ul', 'ol']:
+                for li in element.find_all('li', recursive=False):
+                    li_text = li.get_text(separator=' ', strip=True)
+                    if li_text:
+                        clean_parts.append(f"• {li_text}")
+            elif element.name == 'blockquote':
+                clean_parts.append(f"> {text}")
+            else:
+                clean_parts.append(text)
+
+    lines = []
+    prev_line = None
+    for line in '\n\n'.join(clean_parts).split('\n'):
+        line = line.strip()
+        if line and line != prev_line:
+            lines.append(line)
+            prev_line = line
+    clean_text = re.sub(r'\n{3,}', '\n\n', '\n'.join(lines))
+    return re.sub(r'[ \t]+', ' ', clean_text).strip()
+
+
+def best_time(function, repeat: int) -> float:
+    """Fastest of `repeat` runs, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    """Run the benchmark and print a scaling table."""
+    parser = argparse.ArgumentParser(description='Benchmark extraction on deeply nested pages.')
+    parser.add_argument('--depths', type=int, nargs='+', default=[20, 40, 80, 160, 320],
+                        help='Nesting depths to test (default: 20 40 80 160 320)')
+    parser.add_argument('--sections', type=int, default=20,
+                        help='Sections per page (default: 20)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per measurement; the fastest counts (default: 3)')
+    args = parser.parse_args()
+
+    crawler = WebsiteCrawler(base_url="https://example.com", fetcher=ReplayFetcher({}), respect_robots=False)
+
+    print(f"{'depth':>6} {'nodes':>8} {'per-block ms':>13} {'single-pass ms':>15} "
+          f"{'µs/node':>8} {'speed-up':>9}")
+    for depth in args.depths:
+        soup = BeautifulSoup(nested_page(depth, args.sections), 'html.parser')
+        nodes = sum(1 for _ in soup.descendants)
+
+        expected = naive_clean_text(soup)
+        assert crawler.extract_content(soup)['clean'] == expected, f"Output differs at depth {depth}"
+
+        naive = best_time(lambda: naive_clean_text(soup), args.repeat)
+        single_pass = best_time(lambda: crawler.extract_content(soup), args.repeat)
+        print(f"{depth:>6} {nodes:>8} {naive * 1000:>13.1f} {single_pass * 1000:>15.1f} "
+              f"{single_pass / nodes * 1e6:>8.2f} {naive / single_pass:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,3164 @@ Ethically scrapes all pages from a website for analysis and redesign purposes.
 """
 
 import argparse
+import asyncio
+import base64
+import codecs
+import email.utils
+import fnmatch
+import functools
+import gzip
+import hashlib
+import heapq
+import http.client
+import io
+import itertools
 import json
+import math
+import mimetypes
+import os
+import random
 import re
+import sqlite3
+import threading
 import time
+import types
+import uuid
+import xml.etree.ElementTree as ElementTree
+from array import array
 from collections import deque
-from typing import Dict, List, Set
-from urllib.parse import urljoin, urlparse, urlunparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from html import unescape
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import unquote, urljoin, urlparse, urlunparse
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, FeatureNotFound, NavigableString, Tag
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.dammit import EncodingDetector, EntitySubstitution, UnicodeDammit
+
+# Bump whenever extraction output changes so cached results are re-extracted
+EXTRACTOR_VERSION = 1
+
+# Sent with every request so site owners can recognize the crawler
+USER_AGENT = 'Mozilla/5.0 (compatible; WebsiteCrawler/1.0; +ethical-scraping)'
+
+# charset parameter of a Content-Type header
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Bytes at the top of a page searched for a byte-order mark or <meta charset>
+CHARSET_SNIFF_BYTES = 4096
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at `rate` tokens per second up to `capacity`.
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        """
+        Initialize a full bucket.
+        
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of stored tokens (the burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float):
+        """Add the tokens earned since the last refill."""
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+    
+    def time_until_token(self) -> float:
+        """Seconds until one whole token is available (0 if one is ready)."""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class PolitenessScheduler:
+    """
+    Thread-safe politeness scheduler with one token bucket per host.
+    
+    Every request asks the scheduler for permission with acquire() and
+    reports completion with release(). Tokens refill continuously, so the
+    time a crawler spends parsing a page counts towards the next request
+    instead of being added on top of the delay.
+    """
+    
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        burst: int = 1,
+        max_in_flight: Optional[int] = None
+    ):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            requests_per_second: Sustained request rate allowed per host (None for unlimited)
+            burst: Number of requests a host may receive back-to-back after being idle
+            max_in_flight: Maximum concurrent requests per host (None for unlimited)
+        """
+        self.requests_per_second = requests_per_second
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._host_limits: Dict[str, float] = {}
+        self._condition = threading.Condition()
+    
+    def _bucket(self, host: str) -> Optional[TokenBucket]:
+        """Return the token bucket for a host, creating it on first use."""
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate = self.requests_per_second if self.requests_per_second and self.requests_per_second > 0 else None
+            limit = self._host_limits.get(host)
+            if limit is not None:
+                rate = min(rate, limit) if rate else limit
+            if rate is None:
+                return None
+            bucket = TokenBucket(rate, self.burst)
+            self._buckets[host] = bucket
+        return bucket
+    
+    def current_rate(self, host: str) -> Optional[float]:
+        """Return the request rate currently allowed for a host (None for unlimited)."""
+        with self._condition:
+            bucket = self._bucket(host)
+            return bucket.rate if bucket else None
+    
+    def limit_rate(self, host: str, requests_per_second: float):
+        """
+        Cap the request rate of one host (e.g. from a robots.txt Crawl-delay).
+        
+        Args:
+            host: Network location (netloc) to limit
+            requests_per_second: Highest rate this host may ever be sent
+        """
+        with self._condition:
+            self._host_limits[host] = requests_per_second
+            bucket = self._buckets.get(host)
+            if bucket is not None and bucket.rate > requests_per_second:
+                bucket.refill(time.monotonic())
+                bucket.rate = requests_per_second
+    
+    def acquire(self, host: str):
+        """
+        Block until a request to `host` is allowed, then reserve it.
+        
+        Args:
+            host: Network location (netloc) the request is going to
+        """
+        with self._condition:
+            while True:
+                # Honor any pause requested by the server (Retry-After)
+                paused_for = self._paused_until.get(host, 0) - time.monotonic()
+                if paused_for > 0:
+                    self._condition.wait(paused_for)
+                    continue
+                
+                in_flight = self._in_flight.get(host, 0)
+                bucket = self._bucket(host)
+                wait = None
+                
+                if self.max_in_flight is None or in_flight < self.max_in_flight:
+                    if bucket is None:
+                        break
+                    bucket.refill(time.monotonic())
+                    wait = bucket.time_until_token()
+                    if wait <= 0:
+                        bucket.tokens -= 1
+                        break
+                
+                # Either wait for a token or, when no timeout is set, for a release()
+                self._condition.wait(wait)
+            
+            self._in_flight[host] = in_flight + 1
+    
+    def release(self, host: str):
+        """
+        Mark a request to `host` as finished.
+        
+        Args:
+            host: Network location (netloc) the request went to
+        """
+        with self._condition:
+            self._in_flight[host] = max(0, self._in_flight.get(host, 0) - 1)
+            self._condition.notify_all()
+    
+    def pause(self, host: str, seconds: float):
+        """
+        Hold back every request to `host` for the given number of seconds.
+        
+        Args:
+            host: Network location (netloc) to pause
+            seconds: How long to wait before the next request
+        """
+        with self._condition:
+            until = time.monotonic() + seconds
+            self._paused_until[host] = max(self._paused_until.get(host, 0), until)
+    
+    def record_response(self, host: str, latency: float, status_code: int):
+        """
+        Feedback hook called after every response (no-op for a fixed rate).
+        
+        Args:
+            host: Network location (netloc) that answered
+            latency: Seconds from sending the request to receiving the response
+            status_code: HTTP status code of the response
+        """
+    
+    def record_timeout(self, host: str):
+        """
+        Feedback hook called when a request times out (no-op for a fixed rate).
+        
+        Args:
+            host: Network location (netloc) that failed to answer
+        """
+
+
+class AdaptivePolitenessScheduler(PolitenessScheduler):
+    """
+    Politeness scheduler that tunes each host's rate with AIMD.
+    
+    While response times stay close to the fastest latency seen for a host,
+    its rate grows additively (about `increase_step` req/s per second of
+    crawling). A 429/503, a timeout or a latency spike cuts the rate by
+    `decrease_factor`, at most once per `cooldown` seconds so that a burst of
+    failing concurrent requests counts as a single congestion signal.
+    """
+    
+    THROTTLE_STATUS_CODES = (429, 503)
+    
+    def __init__(
+        self,
+        requests_per_second: float = 1.0,
+        burst: int = 1,
+        max_in_flight: Optional[int] = None,
+        min_rate: float = 0.1,
+        max_rate: float = 10.0,
+        increase_step: float = 0.5,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        cooldown: float = 2.0
+    ):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            requests_per_second: Starting request rate per host
+            burst: Number of requests a host may receive back-to-back after being idle
+            max_in_flight: Maximum concurrent requests per host (None for unlimited)
+            min_rate: Lowest rate a host is ever slowed down to
+            max_rate: Highest rate a host is ever sped up to
+            increase_step: Additive increase in req/s per second of healthy responses
+            decrease_factor: Multiplier applied to the rate on a congestion signal
+            latency_tolerance: Latency above this multiple of the baseline counts as congestion
+            cooldown: Minimum seconds between two rate decreases for a host
+        """
+        super().__init__(min(max(requests_per_second, min_rate), max_rate), burst, max_in_flight)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        
+        # host -> {'ewma': float, 'baseline': float, 'last_decrease': float}
+        self._latency: Dict[str, Dict[str, float]] = {}
+    
+    def _set_rate(self, host: str, rate: float):
+        """Change a host's bucket rate, keeping the tokens earned so far."""
+        bucket = self._bucket(host)
+        bucket.refill(time.monotonic())
+        max_rate = min(self.max_rate, self._host_limits.get(host, self.max_rate))
+        bucket.rate = min(max(rate, self.min_rate), max_rate)
+    
+    def _decrease(self, host: str, reason: str):
+        """Multiplicative decrease, rate-limited by the cooldown."""
+        stats = self._latency.setdefault(host, {'ewma': 0.0, 'baseline': 0.0, 'last_decrease': 0.0})
+        now = time.monotonic()
+        if now - stats['last_decrease'] < self.cooldown:
+            return
+        stats['last_decrease'] = now
+        
+        old_rate = self._bucket(host).rate
+        self._set_rate(host, old_rate * self.decrease_factor)
+        print(f"🐢 Slowing down {host}: {old_rate:.2f} → {self._bucket(host).rate:.2f} req/s ({reason})")
+    
+    def record_response(self, host: str, latency: float, status_code: int):
+        """Adjust the host's rate from the latency and status of a response."""
+        with self._condition:
+            if status_code in self.THROTTLE_STATUS_CODES:
+                self._decrease(host, f"HTTP {status_code}")
+                return
+            
+            stats = self._latency.get(host)
+            if stats is None:
+                stats = {'ewma': latency, 'baseline': latency, 'last_decrease': 0.0}
+                self._latency[host] = stats
+            
+            # Exponentially weighted latency, compared with the best seen so far
+            stats['ewma'] = 0.8 * stats['ewma'] + 0.2 * latency
+            stats['baseline'] = min(stats['baseline'], stats['ewma'])
+            
+            if stats['ewma'] > stats['baseline'] * self.latency_tolerance:
+                self._decrease(host, f"latency {stats['ewma']:.2f}s")
+            else:
+                rate = self._bucket(host).rate
+                # One step per `rate` responses, i.e. roughly per second
+                self._set_rate(host, rate + self.increase_step / max(rate, 1.0))
+    
+    def record_timeout(self, host: str):
+        """Treat a timeout as a congestion signal."""
+        with self._condition:
+            self._decrease(host, "timeout")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value.
+    
+    Args:
+        value: Header value, either delay-seconds or an HTTP date
+        
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# Failures worth another attempt later; other 4xx responses are permanent
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class RetryQueue:
+    """
+    URLs whose fetch failed, waiting for another attempt.
+    
+    Each failure pushes the next attempt out exponentially
+    (base_delay * 2^(attempts-1), capped at max_delay) with random jitter,
+    so retries of a flaky host don't all arrive at the same moment. A URL
+    gets at most `max_attempts` attempts in total.
+    """
+    
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        jitter: float = 0.5
+    ):
+        """
+        Initialize the queue.
+        
+        Args:
+            max_attempts: Attempts per URL, including the first one
+            base_delay: Seconds before the first retry
+            max_delay: Longest wait between two attempts
+            jitter: Random spread of each delay (0.5 means +/-50%)
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._heap: List[Tuple[float, int, str, int, int]] = []
+        self._order = itertools.count()
+    
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt after `attempts` failed ones."""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+    
+    def schedule(self, url: str, depth: int, attempts: int, delay: Optional[float] = None) -> Optional[float]:
+        """
+        Queue another attempt for a URL.
+        
+        Args:
+            url: URL that failed
+            depth: Crawl depth of the URL
+            attempts: Attempts made so far
+            delay: Seconds to wait (default: exponential backoff)
+            
+        Returns:
+            Seconds until the retry, or None if the URL is out of attempts
+        """
+        if attempts >= self.max_attempts:
+            return None
+        if delay is None:
+            delay = self.backoff(attempts)
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), url, depth, attempts))
+        return delay
+    
+    def pop_ready(self) -> Optional[Tuple[str, int, int]]:
+        """Return (url, depth, attempts) of a retry that is due, or None."""
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            _, _, url, depth, attempts = heapq.heappop(self._heap)
+            return url, depth, attempts
+        return None
+    
+    def wait_time(self) -> float:
+        """Seconds until the next retry is due."""
+        if not self._heap:
+            return 0.0
+        return max(0.0, self._heap[0][0] - time.monotonic())
+    
+    def snapshot(self) -> List[Dict]:
+        """Queued retries as JSON-serializable dictionaries."""
+        return [{'url': url, 'depth': depth, 'attempts': attempts}
+                for _, _, url, depth, attempts in sorted(self._heap)]
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class HTTPCache:
+    """
+    On-disk HTTP revalidation cache backed by SQLite.
+    
+    Each normalized URL maps to the validators the server sent (ETag and
+    Last-Modified), the raw body and the page data extracted from it, so a
+    304 Not Modified response can reuse the earlier extraction as-is, or
+    extract the cached body again if the extraction code or settings changed.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            path: SQLite file to store the cache in
+        """
+        self.path = path
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            ' url TEXT PRIMARY KEY,'
+            ' etag TEXT,'
+            ' last_modified TEXT,'
+            ' body BLOB,'
+            ' result TEXT,'
+            ' fingerprint TEXT,'
+            ' fetched_at REAL,'
+            ' content_type TEXT)'
+        )
+        # Caches written before the content type was stored
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(pages)')]
+        if 'content_type' not in columns:
+            self._conn.execute('ALTER TABLE pages ADD COLUMN content_type TEXT')
+        self._conn.commit()
+    
+    def get(self, url: str) -> Optional[Dict]:
+        """
+        Look up a cached page.
+        
+        Args:
+            url: Normalized URL
+            
+        Returns:
+            Dictionary with etag, last_modified, body, content_type, result,
+            fingerprint and fetched_at, or None if the URL is not cached
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT etag, last_modified, body, result, fingerprint, fetched_at, content_type '
+                'FROM pages WHERE url = ?',
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'body': row[2],
+            'result': json.loads(row[3]),
+            'fingerprint': row[4],
+            'fetched_at': row[5],
+            'content_type': row[6] or 'text/html'
+        }
+    
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str],
+            body: bytes, content_type: str, result: Dict, fingerprint: str):
+        """
+        Store (or replace) a page in the cache.
+        
+        Args:
+            url: Normalized URL
+            etag: ETag response header, if any
+            last_modified: Last-Modified response header, if any
+            body: Raw response body
+            content_type: Content-Type response header
+            result: Page data extracted from the body
+            fingerprint: Extraction settings the result was produced with
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages (url, etag, last_modified, body, result, fingerprint, fetched_at, '
+                'content_type) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, body, json.dumps(result, ensure_ascii=False),
+                 fingerprint, time.time(), content_type)
+            )
+            self._conn.commit()
+    
+    def touch(self, url: str):
+        """
+        Mark a cached page as confirmed unchanged just now (after a 304).
+        
+        Args:
+            url: Normalized URL
+        """
+        with self._lock:
+            self._conn.execute('UPDATE pages SET fetched_at = ? WHERE url = ?', (time.time(), url))
+            self._conn.commit()
+    
+    def record_hit(self):
+        """Count a successful revalidation."""
+        with self._lock:
+            self.hits += 1
+    
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extraction results keyed by page content, backed by SQLite.
+    
+    The key hashes the extractor fingerprint, the page URL (links are
+    resolved against it) and the raw body. A page that comes back
+    byte-identical is not parsed again, and a change to the extraction code
+    or settings misses the cache instead of returning stale data.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            path: SQLite file to store the cache in
+        """
+        self.path = path
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS extractions ('
+            ' key TEXT PRIMARY KEY,'
+            ' result TEXT,'
+            ' stored_at REAL)'
+        )
+        self._conn.commit()
+    
+    @staticmethod
+    def key(fingerprint: str, url: str, body: bytes) -> str:
+        """
+        Cache key of a page.
+        
+        Args:
+            fingerprint: Extractor fingerprint the result is produced with
+            url: Normalized URL of the page
+            body: Raw response body
+            
+        Returns:
+            Hex digest identifying the extraction
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(fingerprint.encode('utf-8') + b'\0' + url.encode('utf-8') + b'\0')
+        digest.update(body)
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up an extraction result.
+        
+        Args:
+            key: Cache key from ExtractionCache.key()
+            
+        Returns:
+            The stored page data, or None if it is not cached
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT result FROM extractions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+    
+    def put(self, key: str, result: Dict):
+        """
+        Store an extraction result.
+        
+        Args:
+            key: Cache key from ExtractionCache.key()
+            result: Page data extracted from the body
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO extractions VALUES (?, ?, ?)',
+                (key, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+    
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+
+def code_hash(objects: List[object]) -> str:
+    """
+    Hash the compiled code of classes and functions.
+    
+    A class contributes every method and constant it defines. The hash
+    changes whenever the code does, but not when it only moves in the file.
+    Module-level constants the code reads are not covered; bump
+    EXTRACTOR_VERSION when changing those.
+    
+    Returns:
+        Hex digest of the code
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    
+    def add(value):
+        if isinstance(value, type):
+            digest.update(value.__qualname__.encode('utf-8'))
+            for name, member in sorted(vars(value).items()):
+                if name not in ('__dict__', '__weakref__', '__module__', '__doc__'):
+                    digest.update(name.encode('utf-8'))
+                    add(member)
+        elif isinstance(value, (staticmethod, classmethod)):
+            add(value.__func__)
+        elif isinstance(value, property):
+            for accessor in (value.fget, value.fset, value.fdel):
+                add(accessor)
+        elif isinstance(value, types.FunctionType):
+            add(value.__code__)
+        elif isinstance(value, types.CodeType):
+            digest.update(value.co_code)
+            digest.update(repr(value.co_names).encode('utf-8'))
+            for const in value.co_consts:
+                add(const)
+        elif isinstance(value, (tuple, list)):
+            for item in value:
+                add(item)
+        elif isinstance(value, dict):
+            for key in sorted(value, key=repr):
+                add(key)
+                add(value[key])
+        elif isinstance(value, (set, frozenset)):
+            add(sorted(value, key=repr))
+        elif value is None or isinstance(value, (str, bytes, int, float)):
+            digest.update(repr(value).encode('utf-8'))
+        else:
+            digest.update(type(value).__qualname__.encode('utf-8'))
+    
+    for obj in objects:
+        add(obj)
+    return digest.hexdigest()
+
+
+class CrawlCheckpoint:
+    """
+    Durable crawl state stored in SQLite so an interrupted crawl can resume.
+    
+    Scraped pages and visited URLs are append-only and written
+    incrementally; the frontier is replaced as a whole on every save. Each
+    save is a single transaction, so a crash mid-save leaves the previous
+    checkpoint intact.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the checkpoint database.
+        
+        Args:
+            path: SQLite file to store the checkpoint in
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS pages (seq INTEGER PRIMARY KEY, data TEXT)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS frontier (position INTEGER PRIMARY KEY, url TEXT, depth INTEGER)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+    
+    def reset(self):
+        """Discard any previously saved state."""
+        with self._conn:
+            for table in ('pages', 'visited', 'frontier', 'meta'):
+                self._conn.execute(f'DELETE FROM {table}')
+    
+    def save(self, frontier: List[Tuple[str, int]], new_visited: List[str],
+             new_pages: List[Dict], meta: Dict):
+        """
+        Write a checkpoint in one transaction.
+        
+        Args:
+            frontier: Every (url, depth) still waiting to be crawled
+            new_visited: Visited URLs added since the previous save
+            new_pages: Pages scraped since the previous save
+            meta: JSON-serializable crawl metadata (counters, settings, ...)
+        """
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO pages (data) VALUES (?)',
+                ((json.dumps(page, ensure_ascii=False),) for page in new_pages)
+            )
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO visited VALUES (?)',
+                ((url,) for url in new_visited)
+            )
+            self._conn.execute('DELETE FROM frontier')
+            self._conn.executemany(
+                'INSERT INTO frontier VALUES (?, ?, ?)',
+                ((position, url, depth) for position, (url, depth) in enumerate(frontier))
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                ((key, json.dumps(value)) for key, value in meta.items())
+            )
+    
+    def load(self) -> Optional[Dict]:
+        """
+        Read the saved state.
+        
+        Returns:
+            Dictionary with 'frontier', 'visited', 'pages' and 'meta', or None
+            if nothing has been saved yet. 'visited' is an iterator so large
+            crawls can stream it into a compact visited set.
+        """
+        meta = {key: json.loads(value) for key, value in self._conn.execute('SELECT key, value FROM meta')}
+        if not meta:
+            return None
+        return {
+            'frontier': [(url, depth) for url, depth in
+                         self._conn.execute('SELECT url, depth FROM frontier ORDER BY position')],
+            'visited': (url for (url,) in self._conn.execute('SELECT url FROM visited')),
+            'pages': [json.loads(data) for (data,) in self._conn.execute('SELECT data FROM pages ORDER BY seq')],
+            'meta': meta
+        }
+    
+    def close(self):
+        """Close the database."""
+        self._conn.close()
+    
+    def delete(self):
+        """Close the database and remove the checkpoint file."""
+        self.close()
+        for suffix in ('', '-journal', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+
+class HashedURLSet:
+    """
+    Set of URLs stored as 64-bit hashes in an open-addressing array.
+    
+    Uses 16-32 bytes per URL instead of the 100+ bytes of a set of strings.
+    Two different URLs collide with probability ~n/2^64, i.e. never in
+    practice. URLs cannot be listed back out of the set.
+    """
+    
+    def __init__(self, expected_urls: int = 1024):
+        """
+        Initialize an empty set.
+        
+        Args:
+            expected_urls: Number of URLs to size the table for (it grows as needed)
+        """
+        capacity = 8
+        while capacity < expected_urls * 2:
+            capacity *= 2
+        self._slots = array('Q', bytes(8 * capacity))
+        self._mask = capacity - 1
+        self._count = 0
+    
+    @staticmethod
+    def _hash(url: str) -> int:
+        """64-bit hash of a URL; 0 is reserved for empty slots."""
+        value = int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+        return value or 1
+    
+    def _find(self, value: int) -> int:
+        """Index of the slot holding `value`, or of the empty slot where it belongs."""
+        slots = self._slots
+        index = value & self._mask
+        while slots[index] and slots[index] != value:
+            index = (index + 1) & self._mask
+        return index
+    
+    def _grow(self):
+        """Double the table and re-insert every hash."""
+        old = self._slots
+        self._slots = array('Q', bytes(16 * len(old)))
+        self._mask = len(self._slots) - 1
+        for value in old:
+            if value:
+                self._slots[self._find(value)] = value
+    
+    def add(self, url: str):
+        """Add a URL to the set."""
+        value = self._hash(url)
+        index = self._find(value)
+        if not self._slots[index]:
+            self._slots[index] = value
+            self._count += 1
+            if self._count * 2 > len(self._slots):
+                self._grow()
+    
+    def __contains__(self, url: str) -> bool:
+        return bool(self._slots[self._find(self._hash(url))])
+    
+    def __len__(self) -> int:
+        return self._count
+
+
+class BloomURLSet:
+    """
+    Bloom filter of URLs with a configurable false-positive rate.
+    
+    Needs about 1.2 bytes per URL at a 1% false-positive rate (1.8 bytes at
+    0.1%). A false positive makes the crawler treat an unseen URL as already
+    visited, so that page is skipped. URLs cannot be listed back out of the
+    filter.
+    """
+    
+    def __init__(self, expected_urls: int = 1000000, false_positive_rate: float = 0.001):
+        """
+        Initialize an empty filter.
+        
+        Args:
+            expected_urls: Number of URLs the false-positive rate is guaranteed for
+            false_positive_rate: Probability that an unseen URL is reported as present
+        """
+        expected_urls = max(1, expected_urls)
+        self.size = max(64, int(math.ceil(-expected_urls * math.log(false_positive_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / expected_urls * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+    
+    def _positions(self, url: str) -> List[int]:
+        """Bit positions for a URL (double hashing of a 128-bit digest)."""
+        digest = int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest(), 'little')
+        h1 = digest >> 64
+        h2 = (digest & 0xFFFFFFFFFFFFFFFF) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+    
+    def add(self, url: str):
+        """Add a URL to the filter."""
+        bits = self._bits
+        new = False
+        for position in self._positions(url):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        if new:
+            self._count += 1
+    
+    def __contains__(self, url: str) -> bool:
+        bits = self._bits
+        for position in self._positions(url):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+    
+    def __len__(self) -> int:
+        """Approximate number of URLs added (duplicates and false positives are not counted)."""
+        return self._count
+
+
+VISITED_SET_KINDS = ('exact', 'hashed', 'bloom')
+
+
+def make_url_set(kind: str = 'exact', expected_urls: int = 1000000, false_positive_rate: float = 0.001):
+    """
+    Create an empty URL set of the requested kind.
+    
+    Args:
+        kind: 'exact' (set of strings), 'hashed' (64-bit hashes) or 'bloom' (Bloom filter)
+        expected_urls: Expected number of URLs (sizes the hashed table and Bloom filter)
+        false_positive_rate: Bloom filter false-positive rate
+        
+    Returns:
+        An object supporting add(), `in` and len()
+    """
+    if kind == 'exact':
+        return set()
+    if kind == 'hashed':
+        return HashedURLSet(expected_urls)
+    if kind == 'bloom':
+        return BloomURLSet(expected_urls, false_positive_rate)
+    raise ValueError(f"Unknown visited set kind: {kind}")
+
+
+class CrawlFrontier:
+    """
+    Priority queue of URLs waiting to be crawled.
+    
+    Every URL is queued at most once: a set of everything ever queued gives
+    O(1) duplicate detection, and finding an already-queued URL again only
+    bumps its inlink count (and lowers its depth if the new path is shorter).
+    
+    Strategies (lower score is crawled first, ties in discovery order):
+        bfs       - by depth; identical order to a FIFO breadth-first crawl
+        inlinks   - most linked-to pages first
+        weighted  - depth, minus log2(1 + inlinks), URL pattern weights
+                    and sitemap priority
+    A callable priority(url, depth, inlinks, hint) can be passed instead.
+    URLs pushed as deferred come after all others, whatever their score.
+    """
+    
+    STRATEGIES = ('bfs', 'inlinks', 'weighted')
+    
+    def __init__(
+        self,
+        priority: Union[str, Callable] = 'bfs',
+        pattern_weights: Optional[Dict[str, float]] = None,
+        max_size: Optional[int] = None,
+        seen_factory: Callable = set
+    ):
+        """
+        Initialize an empty frontier.
+        
+        Args:
+            priority: Strategy name or a custom scoring function
+            pattern_weights: Regex -> weight; matching URLs are crawled earlier by 'weighted'
+            max_size: Maximum number of queued URLs (None for unlimited); new URLs beyond it are dropped
+            seen_factory: Creates the set of every URL ever queued (see make_url_set)
+        """
+        if not callable(priority) and priority not in self.STRATEGIES:
+            raise ValueError(f"Unknown priority strategy: {priority}")
+        self.priority = priority
+        self.pattern_weights = [(re.compile(pattern), weight)
+                                for pattern, weight in (pattern_weights or {}).items()]
+        self.max_size = max_size
+        self.dropped = 0
+        
+        # Re-prioritized URLs leave superseded heap items behind; the heap is rebuilt
+        # before those outnumber the queued URLs, so it stays below twice max_size
+        self._heap: List[Tuple] = []  # (deferred, score, order, version, url)
+        self._entries: Dict[str, Dict] = {}  # queued url -> depth, inlinks, hint, deferred, order, version, score
+        self._seen_factory = seen_factory
+        self._seen = seen_factory()  # every URL ever queued
+        self._order = itertools.count()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+    
+    def __contains__(self, url: str) -> bool:
+        """True if the URL has ever been queued (including already popped ones)."""
+        return url in self._seen
+    
+    def _score(self, url: str, entry: Dict):
+        """Sort key for a queued URL under the configured strategy."""
+        if callable(self.priority):
+            return self.priority(url, entry['depth'], entry['inlinks'], entry['hint'])
+        if self.priority == 'bfs':
+            return entry['depth']
+        if self.priority == 'inlinks':
+            return -entry['inlinks']
+        
+        score = entry['depth'] - math.log2(1 + entry['inlinks']) - (entry['hint'] or 0.0)
+        for pattern, weight in self.pattern_weights:
+            if pattern.search(url):
+                score -= weight
+        return score
+    
+    def _push_entry(self, url: str, entry: Dict):
+        """Add a (new version of an) entry to the heap, unless its position is unchanged."""
+        score = self._score(url, entry)
+        if entry['version'] and score == entry['score']:
+            return
+        entry['version'] += 1
+        entry['score'] = score
+        heapq.heappush(self._heap, (entry['deferred'], score, entry['order'], entry['version'], url))
+        
+        # Superseded versions stay in the heap until popped; rebuild once they outnumber live entries
+        if len(self._heap) > 2 * len(self._entries):
+            self._heap = [(queued['deferred'], queued['score'], queued['order'], queued['version'], queued_url)
+                          for queued_url, queued in self._entries.items()]
+            heapq.heapify(self._heap)
+    
+    def clear(self):
+        """Forget every queued and seen URL."""
+        self._heap = []
+        self._entries = {}
+        self._seen = self._seen_factory()
+    
+    def mark_seen(self, url: str):
+        """Record a URL as already handled so it is never queued."""
+        self._seen.add(url)
+    
+    def push(self, url: str, depth: int, hint: Optional[float] = None, deferred: bool = False) -> bool:
+        """
+        Queue a URL unless it has been queued before.
+        
+        Args:
+            url: Normalized URL
+            depth: Crawl depth the URL was found at
+            hint: Optional external priority in [0, 1] (e.g. sitemap <priority>)
+            deferred: Crawl the URL only after every URL not deferred
+            
+        Returns:
+            True if the URL was newly queued
+        """
+        entry = self._entries.get(url)
+        if entry is not None:
+            # Already queued: another inlink, possibly a shorter path
+            entry['inlinks'] += 1
+            changed = self.priority != 'bfs'
+            if depth < entry['depth']:
+                entry['depth'] = depth
+                changed = True
+            if hint is not None and hint != entry['hint']:
+                entry['hint'] = hint
+                changed = True
+            if changed:
+                self._push_entry(url, entry)
+            return False
+        
+        if url in self._seen:
+            return False
+        
+        if self.max_size is not None and len(self._entries) >= self.max_size:
+            self.dropped += 1
+            return False
+        
+        self._seen.add(url)
+        entry = {'depth': depth, 'inlinks': 1, 'hint': hint, 'deferred': deferred, 'order': next(self._order),
+                 'version': 0, 'score': None}
+        self._entries[url] = entry
+        self._push_entry(url, entry)
+        return True
+    
+    def pop(self) -> Tuple[str, int]:
+        """
+        Remove and return the highest-priority URL.
+        
+        Returns:
+            (url, depth) tuple
+        """
+        while self._heap:
+            _, _, _, version, url = heapq.heappop(self._heap)
+            entry = self._entries.get(url)
+            # Skip heap items superseded by a re-prioritized version
+            if entry is None or entry['version'] != version:
+                continue
+            del self._entries[url]
+            return url, entry['depth']
+        raise IndexError('pop from an empty frontier')
+    
+    def snapshot(self) -> List[Tuple[str, int]]:
+        """
+        List queued URLs in the order they would be popped.
+        
+        Returns:
+            List of (url, depth) tuples
+        """
+        ordered = sorted(
+            (entry['deferred'], self._score(url, entry), entry['order'], url, entry['depth'])
+            for url, entry in self._entries.items()
+        )
+        return [(url, depth) for _, _, _, url, depth in ordered]
+
+
+class RobotsRules:
+    """
+    Compiled robots.txt rules for one host and one user agent.
+    
+    Follows RFC 9309: the most specific user-agent group applies (falling
+    back to `*`), `*` and `$` wildcards are supported, and the longest
+    matching rule wins, with Allow winning ties.
+    """
+    
+    def __init__(self, text: str = '', user_agent: str = 'WebsiteCrawler', allow_all: bool = True):
+        """
+        Parse robots.txt content.
+        
+        Args:
+            text: robots.txt body
+            user_agent: Product token to select the rule group for
+            allow_all: Default decision when no rule matches
+        """
+        self.allow_all = allow_all
+        self.crawl_delay: Optional[float] = None
+        self.sitemaps: List[str] = []
+        self._rules: List[Tuple[int, bool, 're.Pattern']] = []  # (length, allow, pattern)
+        
+        groups: Dict[str, Dict] = {}
+        current_agents: List[str] = []
+        in_agent_lines = False
+        
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            key, _, value = line.partition(':')
+            key, value = key.strip().lower(), value.strip()
+            if not key:
+                continue
+            
+            if key == 'sitemap':
+                if value:
+                    self.sitemaps.append(value)
+            elif key == 'user-agent':
+                if not in_agent_lines:
+                    current_agents = []
+                current_agents.append(value.lower())
+                in_agent_lines = True
+            elif key in ('allow', 'disallow', 'crawl-delay'):
+                in_agent_lines = False
+                for agent in current_agents:
+                    group = groups.setdefault(agent, {'rules': [], 'crawl_delay': None})
+                    if key == 'crawl-delay':
+                        try:
+                            group['crawl_delay'] = float(value)
+                        except ValueError:
+                            pass
+                    elif value:
+                        group['rules'].append((key == 'allow', value))
+        
+        token = user_agent.lower()
+        group = groups.get(token, groups.get('*'))
+        if group:
+            self.crawl_delay = group['crawl_delay']
+            self._rules = [(len(path), allow, self._compile(path)) for allow, path in group['rules']]
+            # Longest rules first so the first match is the deciding one
+            self._rules.sort(key=lambda rule: (-rule[0], not rule[1]))
+    
+    @staticmethod
+    def _compile(path: str) -> 're.Pattern':
+        """Turn a robots.txt path pattern into an anchored regex."""
+        anchored = path.endswith('$')
+        if anchored:
+            path = path[:-1]
+        pattern = '.*'.join(re.escape(part) for part in path.split('*'))
+        return re.compile(pattern + ('$' if anchored else ''))
+    
+    def allowed(self, path: str) -> bool:
+        """
+        Check a path (including its query string) against the rules.
+        
+        Args:
+            path: URL path such as '/blog/post?id=1'
+            
+        Returns:
+            True if crawling the path is allowed
+        """
+        for _, allow, pattern in self._rules:
+            if pattern.match(path):
+                return allow
+        return self.allow_all
+
+
+class RobotsCache:
+    """
+    Fetches robots.txt once per host and keeps the compiled rules for `ttl` seconds.
+    
+    A missing robots.txt (4xx) allows everything. A server error or an
+    unreachable host disallows everything, as RFC 9309 requires, but is only
+    cached briefly so the crawler checks again soon.
+    """
+    
+    ERROR_TTL = 60.0
+    
+    def __init__(self, fetch: Callable, user_agent: str = 'WebsiteCrawler', ttl: float = 3600.0,
+                 on_rules: Optional[Callable] = None):
+        """
+        Initialize the cache.
+        
+        Args:
+            fetch: Function taking a URL and returning a requests.Response
+            user_agent: Product token used to select the rule group
+            ttl: Seconds a fetched robots.txt stays valid
+            on_rules: Optional callback(host, rules) run whenever rules are (re)loaded
+        """
+        self.fetch = fetch
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.on_rules = on_rules
+        self.blocked = 0
+        self._cache: Dict[str, Tuple[float, RobotsRules]] = {}
+        self._lock = threading.Lock()
+    
+    def rules(self, scheme: str, host: str) -> RobotsRules:
+        """
+        Return the rules for a host, fetching robots.txt when needed.
+        
+        Args:
+            scheme: 'http' or 'https'
+            host: Network location (netloc)
+            
+        Returns:
+            Compiled RobotsRules
+        """
+        key = f"{scheme}://{host}"
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            
+            ttl = self.ttl
+            try:
+                response = self.fetch(f"{key}/robots.txt")
+                if response.status_code >= 500:
+                    rules, ttl = RobotsRules(allow_all=False), self.ERROR_TTL
+                elif response.status_code >= 400:
+                    rules = RobotsRules()
+                else:
+                    rules = RobotsRules(response.text, self.user_agent)
+            except requests.exceptions.RequestException:
+                rules, ttl = RobotsRules(allow_all=False), self.ERROR_TTL
+            
+            self._cache[key] = (time.monotonic() + ttl, rules)
+        
+        if self.on_rules:
+            self.on_rules(host, rules)
+        return rules
+    
+    def allowed(self, url: str) -> bool:
+        """
+        Check whether robots.txt allows crawling a URL.
+        
+        Args:
+            url: Absolute URL
+            
+        Returns:
+            True if the URL may be fetched
+        """
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        if self.rules(parsed.scheme, parsed.netloc).allowed(path):
+            return True
+        self.blocked += 1
+        return False
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a sitemap <lastmod> value (W3C datetime) into a Unix timestamp.
+    
+    Args:
+        value: Date such as '2024-05-01' or '2024-05-01T10:00:00+02:00'
+        
+    Returns:
+        Seconds since the epoch, or None if missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class SitemapReader:
+    """
+    Streams <url> entries out of a site's sitemaps.
+    
+    Sitemaps are found through robots.txt `Sitemap:` lines, falling back to
+    /sitemap.xml. Sitemap indexes are followed recursively and gzip
+    sitemaps are decompressed on the fly. Parsing is incremental
+    (iterparse on the response stream, clearing elements as it goes), so a
+    50,000-URL sitemap never sits in memory as a whole.
+    """
+    
+    def __init__(self, crawler: 'WebsiteCrawler', max_sitemaps: int = 1000):
+        """
+        Initialize the reader.
+        
+        Args:
+            crawler: Crawler whose fetch() (and politeness settings) is used for downloads
+            max_sitemaps: Upper bound on sitemap files read, protecting against index loops
+        """
+        self.crawler = crawler
+        self.max_sitemaps = max_sitemaps
+        self.sitemaps_read = 0
+    
+    def discover(self) -> List[str]:
+        """
+        Find the site's sitemap URLs.
+        
+        Returns:
+            Sitemap URLs from robots.txt, or the default /sitemap.xml
+        """
+        sitemaps = self.crawler.robots.rules(self.crawler.scheme, self.crawler.domain).sitemaps
+        return list(sitemaps) or [f"{self.crawler.scheme}://{self.crawler.domain}/sitemap.xml"]
+    
+    @staticmethod
+    def _open_stream(response: requests.Response):
+        """Readable byte stream of a (possibly gzip-compressed) sitemap body."""
+        response.raw.decode_content = True  # undo Content-Encoding
+        stream = io.BufferedReader(response.raw)
+        if stream.peek(2)[:2] == b'\x1f\x8b':  # .xml.gz file
+            return gzip.GzipFile(fileobj=stream)
+        return stream
+    
+    def _parse(self, url: str, pending: List[str]):
+        """Yield <url> entries of one sitemap, queuing nested sitemaps into `pending`."""
+        response = self.crawler.fetch(url, stream=True)
+        try:
+            if response.status_code != 200:
+                print(f"⚠️  Sitemap not available (HTTP {response.status_code}): {url}")
+                return
+            
+            root = None
+            for event, element in ElementTree.iterparse(self._open_stream(response), events=('start', 'end')):
+                if root is None:
+                    root = element
+                if event != 'end':
+                    continue
+                
+                tag = element.tag.rsplit('}', 1)[-1]
+                if tag not in ('url', 'sitemap'):
+                    continue
+                
+                fields = {child.tag.rsplit('}', 1)[-1]: (child.text or '').strip() for child in element}
+                if fields.get('loc'):
+                    if tag == 'sitemap':
+                        pending.append(fields['loc'])
+                    else:
+                        try:
+                            priority = float(fields['priority']) if fields.get('priority') else None
+                        except ValueError:
+                            priority = None
+                        yield {
+                            'url': fields['loc'],
+                            'lastmod': parse_lastmod(fields.get('lastmod')),
+                            'priority': priority
+                        }
+                
+                # Drop processed entries so memory stays flat
+                root.clear()
+        except ElementTree.ParseError as e:
+            print(f"⚠️  Invalid sitemap XML: {url} - {str(e)}")
+        finally:
+            response.close()
+    
+    def entries(self):
+        """
+        Yield every page entry of every sitemap (nested indexes included).
+        
+        Yields:
+            Dictionaries with 'url', 'lastmod' (timestamp or None) and
+            'priority' (0.0-1.0 or None)
+        """
+        pending = self.discover()
+        seen = set()
+        
+        while pending and self.sitemaps_read < self.max_sitemaps:
+            sitemap_url = pending.pop(0)
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            self.sitemaps_read += 1
+            
+            try:
+                yield from self._parse(sitemap_url, pending)
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️  Could not read sitemap: {sitemap_url} - {str(e)}")
+
+
+def decode_declared(body: bytes, content_type: str) -> Optional[str]:
+    """
+    Decode a body with the charset named in its Content-Type header.
+    
+    Returns:
+        The decoded text, or None if no (known) charset is declared
+    """
+    match = CHARSET_PATTERN.search(content_type or '')
+    if not match:
+        return None
+    try:
+        return body.decode(match.group(1), errors='replace')
+    except LookupError:
+        return None
+
+
+# Byte-order marks and the codecs that decode (and drop) them
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def sniff_charset(head: bytes) -> Optional[str]:
+    """
+    Find a page's charset from its first bytes: a byte-order mark or a <meta> declaration.
+    
+    Returns:
+        The charset name, or None if the page does not say
+    """
+    for bom, charset in BYTE_ORDER_MARKS:
+        if head.startswith(bom):
+            return charset
+    return EncodingDetector.find_declared_encoding(head[:CHARSET_SNIFF_BYTES], is_html=True,
+                                                   search_entire_document=True)
+
+
+class CharsetResolver:
+    """
+    Decodes each page body once, before it is parsed.
+    
+    The charset comes from the Content-Type header, else from a byte-order
+    mark or <meta> declaration near the top of the page. Undeclared pages
+    are tried as UTF-8, then as the legacy charset last used on the same host.
+    Only pages that fail both go through heuristic detection, whose result
+    is remembered for the host.
+    """
+    
+    SOURCES = ('header', 'document', 'utf-8', 'host', 'detected')
+    
+    def __init__(self):
+        """Initialize the resolver."""
+        self._host_charsets: Dict[str, str] = {}
+        self.counts = dict.fromkeys(self.SOURCES, 0)
+    
+    @staticmethod
+    def _decode(body: bytes, charset: Optional[str], errors: str = 'strict') -> Optional[str]:
+        """Decode with a charset, or None if it is unknown or (strictly) does not fit."""
+        if not charset:
+            return None
+        try:
+            return body.decode(charset, errors=errors)
+        except (LookupError, UnicodeDecodeError):
+            return None
+    
+    def decode(self, url: str, body: bytes, content_type: str = '') -> str:
+        """
+        Decode a page body.
+        
+        Args:
+            url: URL the page was fetched from
+            body: Raw page body
+            content_type: Content-Type response header
+            
+        Returns:
+            The decoded page
+        """
+        match = CHARSET_PATTERN.search(content_type or '')
+        candidates = (
+            ('header', match and match.group(1), 'replace'),
+            ('document', sniff_charset(body[:CHARSET_SNIFF_BYTES]), 'strict'),
+            ('utf-8', 'utf-8', 'strict'),
+        )
+        for source, charset, errors in candidates:
+            text = self._decode(body, charset, errors)
+            if text is not None:
+                self.remember(url, source, charset)
+                return text
+        return body.decode(self.fallback(url, body), errors='replace')
+    
+    def fallback(self, url: str, sample: bytes) -> str:
+        """
+        Charset for a page that declares none and is not UTF-8.
+        
+        Args:
+            url: URL the page was fetched from
+            sample: Page bytes that are not valid UTF-8 (the whole body, or the rest of a stream)
+            
+        Returns:
+            The legacy charset last used on the host if the sample fits it,
+            else the detected charset
+        """
+        charset = self._host_charsets.get(urlparse(url).netloc)
+        if self._decode(sample, charset) is not None:
+            source = 'host'
+        else:
+            source, charset = 'detected', UnicodeDammit(sample, is_html=True).original_encoding or 'utf-8'
+        self.remember(url, source, charset)
+        return charset
+    
+    def remember(self, url: str, source: str, charset: str):
+        """
+        Count where a page's charset came from, and remember a legacy charset for its host.
+        
+        Args:
+            url: URL the page was fetched from
+            source: One of SOURCES
+            charset: Charset the page was decoded with
+        """
+        # Unicode charsets are self-describing or tried anyway; remember legacy ones
+        if not codecs.lookup(charset).name.startswith('utf'):
+            self._host_charsets[urlparse(url).netloc] = charset
+        self.counts[source] += 1
+
+
+class IncrementalPageDecoder:
+    """
+    Decodes a page body chunk by chunk, for parsers fed as the body arrives.
+    
+    The charset comes from the Content-Type header, else from a byte-order
+    mark or <meta> declaration in the first few kilobytes, else UTF-8 is
+    assumed. If such a page turns out not to be UTF-8, the rest of it is
+    held back and decoded at the end, with the charset a CharsetResolver
+    falls back to (the host's, else a detected one); the text before it was
+    plain ASCII or UTF-8, and reads the same. Every charset choice is
+    reported to the resolver, which learns legacy charsets per host as it
+    does for whole bodies.
+    """
+    
+    # Bytes held back to look for a byte-order mark or <meta charset>
+    SNIFF_BYTES = CHARSET_SNIFF_BYTES
+    
+    def __init__(self, content_type: str = '', url: str = '', charsets: Optional[CharsetResolver] = None):
+        """
+        Initialize the decoder.
+        
+        Args:
+            content_type: Content-Type response header
+            url: URL of the page
+            charsets: Resolver with the per-host charsets of the crawl (default: a new one)
+        """
+        self.url = url
+        self.charsets = charsets or CharsetResolver()
+        self._assumed_utf8 = False
+        self._decoder = None
+        self._head = b''
+        self._rest = None
+        match = CHARSET_PATTERN.search(content_type or '')
+        if match:
+            self._decoder = self._make_decoder(match.group(1))
+            if self._decoder is not None:
+                self.charsets.remember(url, 'header', match.group(1))
+    
+    @staticmethod
+    def _make_decoder(charset: Optional[str]):
+        """Incremental decoder for a charset, or None if it is unknown."""
+        try:
+            return codecs.getincrementaldecoder(charset)(errors='replace') if charset else None
+        except LookupError:
+            return None
+    
+    def decode(self, chunk: bytes, final: bool = False) -> str:
+        """
+        Decode the next chunk of the body.
+        
+        Args:
+            chunk: Raw bytes
+            final: Whether this is the last chunk
+            
+        Returns:
+            The text decoded so far (empty while the charset is still being sniffed)
+        """
+        if self._decoder is None:
+            self._head += chunk
+            if len(self._head) < self.SNIFF_BYTES and not final:
+                return ''
+            chunk, self._head = self._head, b''
+            charset = sniff_charset(chunk)
+            self._decoder = self._make_decoder(charset)
+            if self._decoder is not None:
+                self.charsets.remember(self.url, 'document', charset)
+            else:
+                self._decoder = codecs.getincrementaldecoder('utf-8')()
+                self._assumed_utf8 = True
+        if not self._assumed_utf8:
+            return self._decoder.decode(chunk, final)
+        
+        if self._rest is None:
+            pending = self._decoder.getstate()[0] + chunk
+            try:
+                text = self._decoder.decode(chunk, final)
+                if final:
+                    self.charsets.remember(self.url, 'utf-8', 'utf-8')
+                return text
+            except UnicodeDecodeError as e:
+                text, self._rest = pending[:e.start].decode('utf-8'), pending[e.start:]
+        else:
+            text = ''
+            self._rest += chunk
+        if not final:
+            return text
+        return text + self._rest.decode(self.charsets.fallback(self.url, self._rest), errors='replace')
+
+
+class FetchResponse:
+    """
+    In-memory response returned by the offline fetchers.
+    
+    Provides the parts of requests.Response the crawler uses, so offline
+    and network responses are interchangeable.
+    """
+    
+    def __init__(self, url: str, status_code: int = 200, headers: Optional[Dict[str, str]] = None,
+                 content: bytes = b''):
+        self.url = url
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self.content = content
+        self.raw = io.BytesIO(content)
+    
+    @property
+    def text(self) -> str:
+        text = decode_declared(self.content, self.headers.get('Content-Type', ''))
+        return text if text is not None else self.content.decode('utf-8', errors='replace')
+    
+    def iter_content(self, chunk_size: int = 1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+    
+    def close(self):
+        pass
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class Fetcher:
+    """
+    Source of pages for the crawler.
+    
+    A fetcher offers the part of the requests.Session API the crawler uses:
+    get(url, headers=None, **kwargs) returns a response with url,
+    status_code, headers, content, text, raw, iter_content(), close() and
+    raise_for_status(). Fetchers with `polite = False` serve pages without
+    touching a server, so the crawler skips rate limiting for them.
+    Fetchers with `sequenced = True` also take a `sequence` keyword with
+    the crawl position of the page being fetched (see RecordingFetcher).
+    """
+    
+    polite = True
+    sequenced = False
+    
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        raise NotImplementedError
+    
+    def mount(self, prefix: str, adapter):
+        """Install a connection pool adapter (only meaningful for network fetchers)."""
+    
+    def close(self):
+        """Release any resources held by the fetcher."""
+
+
+class RequestsFetcher(Fetcher):
+    """Fetches pages over HTTP(S) with a pooled requests.Session."""
+    
+    def __init__(self, user_agent: str = USER_AGENT):
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+    
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        return self.session.get(url, headers=headers, **kwargs)
+    
+    def mount(self, prefix: str, adapter):
+        self.session.mount(prefix, adapter)
+    
+    def close(self):
+        self.session.close()
+
+
+class LocalDirectoryFetcher(Fetcher):
+    """
+    Serves a directory of files (e.g. the generated website/ folder) as a site.
+    
+    The URL path is looked up below `root`: /about.html is served from
+    about.html, /about from about.html or about/index.html, and / from
+    index.html. Anything else is a 404.
+    """
+    
+    polite = False
+    INDEX_FILES = ('index.html', 'index.htm')
+    
+    def __init__(self, root: str, base_url: str):
+        """
+        Initialize the fetcher.
+        
+        Args:
+            root: Directory holding the site's files
+            base_url: URL the directory is served under (only its host is used)
+        """
+        self.root = os.path.abspath(root)
+        self.netloc = urlparse(base_url).netloc
+    
+    def resolve(self, url: str) -> Optional[str]:
+        """Path of the file serving a URL, or None if there is none."""
+        parsed = urlparse(url)
+        if parsed.netloc != self.netloc:
+            return None
+        
+        path = os.path.normpath(os.path.join(self.root, unquote(parsed.path).lstrip('/')))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None  # ../ escaping the directory
+        
+        if os.path.isdir(path):
+            candidates = [os.path.join(path, name) for name in self.INDEX_FILES]
+        else:
+            candidates = [path, path + '.html']
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+    
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        path = self.resolve(url)
+        if path is None:
+            return FetchResponse(url, 404, {'Content-Type': 'text/plain'}, b'Not Found')
+        
+        with open(path, 'rb') as f:
+            content = f.read()
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        return FetchResponse(url, 200, {'Content-Type': content_type, 'Content-Length': str(len(content))}, content)
+
+
+class RecordingFetcher(Fetcher):
+    """
+    Wraps another fetcher and records every response for later replay.
+    
+    Paths ending in .warc or .warc.gz get a standard WARC archive (see
+    WARCWriter). Any other path gets one JSON object per line (url, final
+    URL, status, headers and base64 body). Both can be served again with
+    ReplayFetcher. Bodies are read in full so they can be recorded, which
+    means oversized pages are downloaded completely while recording.
+    
+    Page fetches carry the position the crawler commits them at, so the
+    pages of a concurrent crawl can be put back in crawl order even though
+    their downloads finish (and are recorded) in any order.
+    """
+    
+    sequenced = True
+    
+    # The recorded body is already decoded, so these no longer apply
+    DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+    
+    def __init__(self, inner: Fetcher, path: str):
+        """
+        Initialize the fetcher.
+        
+        Args:
+            inner: Fetcher that actually retrieves the pages
+            path: Recording file to write (overwritten)
+        """
+        self.inner = inner
+        self.polite = getattr(inner, 'polite', True)
+        self.path = path
+        self._warc = WARCWriter(path) if is_warc_path(path) else None
+        self._file = None if self._warc else open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+    
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, sequence: Optional[int] = None, **kwargs):
+        response = self.inner.get(url, headers=headers, **kwargs)
+        try:
+            content = response.content
+        finally:
+            response.close()
+        response_headers = {name: value for name, value in response.headers.items()
+                            if name.lower() not in self.DROPPED_HEADERS}
+        
+        if self._warc:
+            # Redirect hops first, so the archive shows how the final URL was reached
+            exchange = [(hop.url, hop.status_code, dict(hop.headers), b'')
+                        for hop in getattr(response, 'history', [])]
+            exchange.append((response.url, response.status_code, response_headers, content))
+            self._warc.write_responses(exchange, sequence)
+        else:
+            record = {
+                'url': url,
+                'final_url': response.url,
+                'status': response.status_code,
+                'headers': response_headers,
+                'body': base64.b64encode(content).decode('ascii'),
+                'sequence': sequence
+            }
+            with self._lock:
+                self._file.write(json.dumps(record) + '\n')
+                self._file.flush()
+        return FetchResponse(response.url, response.status_code, response_headers, content)
+    
+    def mount(self, prefix: str, adapter):
+        self.inner.mount(prefix, adapter)
+    
+    def close(self):
+        self.inner.close()
+        if self._warc:
+            self._warc.close()
+        else:
+            with self._lock:
+                self._file.close()
+
+
+class ReplayFetcher(Fetcher):
+    """
+    Serves previously recorded responses without any network access.
+    
+    URLs that were never recorded are answered with a 404. When a URL was
+    recorded more than once, the last response wins. Recorded redirects
+    are followed.
+    """
+    
+    polite = False
+    MAX_REDIRECTS = 10
+    
+    def __init__(self, records: Dict[str, Dict]):
+        """
+        Initialize the fetcher.
+        
+        Args:
+            records: Requested URL -> {'final_url', 'status', 'headers', 'body' (bytes)}
+        """
+        self.records = records
+    
+    @classmethod
+    def load(cls, path: str) -> 'ReplayFetcher':
+        """Load a recording written by RecordingFetcher (JSON lines or WARC)."""
+        records = {}
+        if is_warc_path(path):
+            for record in read_warc(path):
+                records[record['url']] = dict(record, final_url=record['url'])
+            return cls(records)
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record['body'] = base64.b64decode(record['body'])
+                records[record['url']] = record
+        return cls(records)
+    
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        record = self.records.get(url)
+        for _ in range(self.MAX_REDIRECTS):
+            location = record and 300 <= record['status'] < 400 and record['headers'].get('Location')
+            if not location:
+                break
+            url = urljoin(url, location)
+            record = self.records.get(url)
+        
+        if record is None:
+            return FetchResponse(url, 404, {'Content-Type': 'text/plain'}, b'Not recorded')
+        return FetchResponse(record.get('final_url') or url, record['status'], record['headers'], record['body'])
+
+
+def is_warc_path(path: str) -> bool:
+    """Whether a recording path names a WARC archive."""
+    return path.endswith(('.warc', '.warc.gz'))
+
+
+class WARCWriter:
+    """
+    Writes HTTP responses to a WARC/1.1 archive.
+    
+    With a .gz path every record is its own gzip member, the usual layout
+    of .warc.gz files. Bodies are stored as the crawler received them,
+    i.e. after Content-Encoding has been undone.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Initialize the writer.
+        
+        Args:
+            path: Archive to write (overwritten)
+        """
+        self.path = path
+        self.compress = path.endswith('.gz')
+        self._file = open(path, 'wb')
+        self._lock = threading.Lock()
+        info = b'software: WebsiteCrawler/1.0\r\nformat: WARC File Format 1.1\r\n'
+        self._file.write(self._record('warcinfo', None, 'application/warc-fields', info))
+    
+    def _record(self, warc_type: str, url: Optional[str], content_type: str, payload: bytes,
+                sequence: Optional[int] = None) -> bytes:
+        """Serialize one WARC record."""
+        lines = [
+            'WARC/1.1',
+            f'WARC-Type: {warc_type}',
+            f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+            f'WARC-Date: {datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}'
+        ]
+        if url:
+            lines.append(f'WARC-Target-URI: {url}')
+        if sequence is not None:
+            lines.append(f'Crawl-Sequence: {sequence}')
+        lines.append(f'Content-Type: {content_type}')
+        lines.append(f'Content-Length: {len(payload)}')
+        record = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + payload + b'\r\n\r\n'
+        return gzip.compress(record) if self.compress else record
+    
+    def write_responses(self, responses: List[Tuple[str, int, Dict[str, str], bytes]],
+                        sequence: Optional[int] = None):
+        """
+        Append (url, status, headers, body) responses as adjacent records.
+        
+        Redirect hops and their final response are passed together so they
+        stay next to each other when several threads record at once.
+        
+        Args:
+            responses: One page fetch, redirect hops first
+            sequence: Crawl position of the page, stored as a Crawl-Sequence field
+        """
+        records = []
+        for url, status, headers, body in responses:
+            head = f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+            head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+            payload = (head + '\r\n').encode('latin-1', errors='replace') + body
+            records.append(self._record('response', url, 'application/http; msgtype=response', payload, sequence))
+        with self._lock:
+            self._file.write(b''.join(records))
+            self._file.flush()
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_warc(path: str):
+    """
+    Read the response records of a WARC archive (plain or gzip-compressed).
+    
+    Args:
+        path: .warc or .warc.gz file
+        
+    Yields:
+        Dictionaries with url, status, headers, body and crawl sequence
+        (None if not recorded), in archive order
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            if not line.startswith(b'WARC/'):
+                raise ValueError(f"Not a WARC record: {line[:40]!r}")
+            
+            fields = {}
+            for line in iter(f.readline, b''):
+                if not line.strip():
+                    break
+                name, _, value = line.decode('utf-8').partition(':')
+                fields[name.strip().lower()] = value.strip()
+            payload = f.read(int(fields.get('content-length', 0)))
+            if fields.get('warc-type') != 'response':
+                continue
+            
+            head, _, body = payload.partition(b'\r\n\r\n')
+            status_line, *header_lines = head.decode('latin-1').split('\r\n')
+            headers = {}
+            for header_line in header_lines:
+                name, _, value = header_line.partition(':')
+                headers[name.strip()] = value.strip()
+            yield {
+                'url': fields.get('warc-target-uri'),
+                'status': int(status_line.split()[1]),
+                'headers': requests.structures.CaseInsensitiveDict(headers),
+                'body': body,
+                'sequence': int(fields['crawl-sequence']) if 'crawl-sequence' in fields else None
+            }
+
+
+# BeautifulSoup tree builders. html.parser is always available and is the
+# reference the extractor was tuned on; lxml is several times faster;
+# html5lib parses like a browser but is the slowest
+PARSER_BACKENDS = ('lxml', 'html.parser', 'html5lib')
+REFERENCE_PARSER = 'html.parser'
+
+# Tried in this order by parser='auto'
+AUTO_PARSERS = ('lxml', REFERENCE_PARSER)
+
+
+def parser_available(name: str) -> bool:
+    """Whether a BeautifulSoup parser backend is installed."""
+    try:
+        BeautifulSoup('', name)
+    except FeatureNotFound:
+        return False
+    return True
+
+
+def resolve_parser(requested: str = 'auto') -> str:
+    """
+    Pick the parser backend to use.
+    
+    Args:
+        requested: 'auto' for the fastest installed backend, or a name from PARSER_BACKENDS
+        
+    Returns:
+        An installed backend name (html.parser if the requested one is missing)
+    """
+    if requested == 'auto':
+        return next(name for name in AUTO_PARSERS if parser_available(name))
+    if requested not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser '{requested}', expected 'auto' or one of {', '.join(PARSER_BACKENDS)}")
+    if parser_available(requested):
+        return requested
+    print(f"⚠️  Parser '{requested}' is not installed (pip install {requested}), using {REFERENCE_PARSER}")
+    return REFERENCE_PARSER
+
+
+# Elements whose whole subtree is boilerplate
+BOILERPLATE_TAGS = frozenset([
+    'script', 'style', 'meta', 'link', 'noscript',
+    'header', 'footer', 'nav', 'aside',
+    'iframe', 'embed', 'object'
+])
+
+# Navigation/menu classes and IDs; word boundaries avoid false positives
+# (e.g. "with-sidebar" is not "sidebar")
+NAVIGATION_PATTERN = re.compile(
+    r'\bnav\b|\bmenu\b|\bsidebar\b|\bheader\b|\bfooter\b'
+    r'|\bbreadcrumb|\bpagination\b|\bsocial\b|\bwidget\b'
+)
+
+# Elements that become paragraphs of the clean content
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+BLOCK_TAGS = frozenset(HEADING_TAGS + ('p', 'ul', 'ol', 'blockquote', 'div'))
+
+# A div containing any of these is a container, not a paragraph
+CONTAINER_CHILD_TAGS = frozenset(HEADING_TAGS + ('div', 'p'))
+
+# String types that count as text (no comments, scripts, templates, ...)
+TEXT_STRING_TYPES = (NavigableString, CData)
+
+
+class PageVisitor:
+    """
+    One extractor in a PageWalker traversal.
+    
+    The walker calls start() and end() for every element in document
+    order. Visitors read text through the walker's text lists: record
+    len(walker.texts) when an element starts and slice up to the length
+    when it ends. Text of boilerplate (navigation, scripts, footers, ...)
+    is in walker.texts but not in walker.content_texts, and
+    walker.removed tells whether the current element is boilerplate.
+    walker.content_length() measures a span of content text in O(1).
+    """
+    
+    # Key of this visitor's result in the walk output
+    name = None
+    
+    def start(self, walker: 'PageWalker', tag: Tag):
+        pass
+    
+    def end(self, walker: 'PageWalker', tag: Tag):
+        pass
+    
+    def result(self, walker: 'PageWalker'):
+        return None
+
+
+class PageWalker:
+    """
+    Extracts everything the crawler needs from a parsed page in a single traversal.
+    
+    Boilerplate subtrees are flagged on the way down instead of being
+    removed from a copy of the tree, so the page is parsed once and
+    walked once, however many visitors take part.
+    """
+    
+    def __init__(self, visitors: List[PageVisitor]):
+        """
+        Initialize the walker.
+        
+        Args:
+            visitors: Extractors to run during the traversal
+        """
+        self.visitors = visitors
+        self._reset_text()
+    
+    def _reset_text(self):
+        """Forget the text and boilerplate state of the previous page."""
+        self.texts: List[str] = []
+        self.content_texts: List[str] = []
+        # content_offsets[i] is the combined length of content_texts[:i]
+        self.content_offsets: List[int] = [0]
+        self._removed_depth: Optional[int] = None
+    
+    @property
+    def removed(self) -> bool:
+        """Whether the current element lies in a boilerplate subtree."""
+        return self._removed_depth is not None
+    
+    @staticmethod
+    def is_boilerplate(tag: Tag) -> bool:
+        """Whether an element (and everything in it) is navigation or other chrome."""
+        if tag.name in BOILERPLATE_TAGS:
+            return True
+        classes = tag.get('class')
+        elem_id = tag.get('id')
+        if not classes and not elem_id:
+            return False
+        combined = f"{' '.join(classes).lower() if classes else ''} {elem_id.lower() if elem_id else ''}"
+        # Wrappers ("content-wrapper", "with-sidebar") hold the page itself
+        return (NAVIGATION_PATTERN.search(combined) is not None
+                and 'wrapper' not in combined and 'with-' not in combined)
+    
+    def walk(self, soup: BeautifulSoup) -> Dict[str, object]:
+        """
+        Traverse the page and collect every visitor's result.
+        
+        Args:
+            soup: Parsed page
+            
+        Returns:
+            Visitor name -> result
+        """
+        self._reset_text()
+        visitors = self.visitors
+        open_tags: List[Tag] = []
+        # Adjacent sibling strings (split by a stray end tag) form one content text
+        pending: List[NavigableString] = []
+        
+        for node in soup.descendants:
+            is_text = type(node) in TEXT_STRING_TYPES
+            if pending and not (is_text and node.previous_sibling is pending[-1]
+                                and type(node) is type(pending[-1])):
+                self._add_content_text(''.join(pending))
+                pending = []
+            
+            # Close the elements this node is not inside of
+            parent = node.parent
+            while open_tags and open_tags[-1] is not parent:
+                self._end(open_tags.pop(), len(open_tags))
+            
+            if is_text:
+                text = node.strip()
+                if text:
+                    self.texts.append(text)
+                if self._removed_depth is None:
+                    pending.append(node)
+            elif isinstance(node, Tag):
+                if self._removed_depth is None and self.is_boilerplate(node):
+                    self._removed_depth = len(open_tags)
+                open_tags.append(node)
+                for visitor in visitors:
+                    visitor.start(self, node)
+        
+        if pending:
+            self._add_content_text(''.join(pending))
+        while open_tags:
+            self._end(open_tags.pop(), len(open_tags))
+        
+        return {visitor.name: visitor.result(self) for visitor in visitors}
+    
+    def _add_content_text(self, text: str):
+        """Record a run of non-boilerplate text."""
+        text = text.strip()
+        if text:
+            self.content_texts.append(text)
+            self.content_offsets.append(self.content_offsets[-1] + len(text))
+    
+    def content_length(self, start: int, end: int) -> int:
+        """Length of ' '.join(content_texts[start:end]), without building it."""
+        if end <= start:
+            return 0
+        return self.content_offsets[end] - self.content_offsets[start] + (end - start - 1)
+    
+    def _end(self, tag: Tag, depth: int):
+        """Dispatch the end of an element at the given stack depth."""
+        for visitor in self.visitors:
+            visitor.end(self, tag)
+        if self._removed_depth == depth:
+            self._removed_depth = None
+
+
+class TitleVisitor(PageVisitor):
+    """Page title: the first <h1>, else <title>, else 'No Title'."""
+    
+    name = 'title'
+    
+    def __init__(self):
+        self._h1 = None
+        self._title = None
+    
+    def start(self, walker, tag):
+        if tag.name == 'h1' and self._h1 is None:
+            self._h1 = [tag, len(walker.texts), None]
+        elif tag.name == 'title' and self._title is None:
+            self._title = [tag, len(walker.texts), None]
+    
+    def end(self, walker, tag):
+        for span in (self._h1, self._title):
+            if span and span[0] is tag:
+                span[2] = len(walker.texts)
+    
+    def result(self, walker):
+        span = self._h1 or self._title
+        if span is None:
+            return 'No Title'
+        return ''.join(walker.texts[span[1]:span[2]])
+
+
+class HeadingsVisitor(PageVisitor):
+    """h1-h3 headings with more than 3 characters, grouped by level."""
+    
+    name = 'headings'
+    LEVELS = {'h1': 1, 'h2': 2, 'h3': 3}
+    
+    def __init__(self):
+        self._open = []
+        self._headings = []
+    
+    def start(self, walker, tag):
+        level = self.LEVELS.get(tag.name)
+        if level:
+            entry = {'level': level, 'text': None}
+            self._headings.append(entry)
+            self._open.append((entry, len(walker.texts)))
+    
+    def end(self, walker, tag):
+        if tag.name in self.LEVELS:
+            entry, start = self._open.pop()
+            entry['text'] = ''.join(walker.texts[start:])
+    
+    def result(self, walker):
+        # Stable sort keeps document order within each level
+        return sorted((entry for entry in self._headings if len(entry['text']) > 3),
+                      key=lambda entry: entry['level'])
+
+
+class LinksVisitor(PageVisitor):
+    """Unique, normalized internal links in document order."""
+    
+    name = 'links'
+    
+    def __init__(self, crawler: 'WebsiteCrawler', current_url: str):
+        """
+        Initialize the visitor.
+        
+        Args:
+            crawler: Crawler whose normalize_url/is_valid_url decide which links count
+            current_url: Page URL for resolving relative links
+        """
+        self.crawler = crawler
+        self.current_url = current_url
+        self._links = []
+        self._seen = set()
+    
+    def start(self, walker, tag):
+        if tag.name != 'a':
+            return
+        href = tag.get('href')
+        if href is None:
+            return
+        href = href.strip()
+        if not href or href.startswith('#'):
+            return
+        
+        normalized = self.crawler.normalize_url(urljoin(self.current_url, href))
+        if normalized not in self._seen and self.crawler.is_valid_url(normalized):
+            self._seen.add(normalized)
+            self._links.append(normalized)
+    
+    def result(self, walker):
+        return self._links
+
+
+class CanonicalVisitor(PageVisitor):
+    """The page's <link rel="canonical"> URL, normalized, if it is an internal URL."""
+    
+    name = 'canonical'
+    
+    def __init__(self, crawler: 'WebsiteCrawler', current_url: str):
+        """
+        Initialize the visitor.
+        
+        Args:
+            crawler: Crawler whose normalize_url and domain decide which URLs count
+            current_url: Page URL for resolving a relative canonical URL
+        """
+        self.crawler = crawler
+        self.current_url = current_url
+        self._canonical = None
+    
+    def start(self, walker, tag):
+        if tag.name != 'link' or self._canonical is not None:
+            return
+        rel = tag.get('rel') or ()
+        if isinstance(rel, str):
+            rel = rel.split()
+        if 'canonical' not in (value.lower() for value in rel):
+            return
+        href = (tag.get('href') or '').strip()
+        if not href:
+            return
+        
+        # The first declaration wins, as it does for search engines
+        canonical = self.crawler.normalize_url(urljoin(self.current_url, href))
+        if urlparse(canonical).netloc == self.crawler.domain:
+            self._canonical = canonical
+    
+    def result(self, walker):
+        return self._canonical
+
+
+class ContentVisitor(PageVisitor):
+    """
+    Clean (Markdown-style) and raw text of the page's main content area.
+    
+    The main area is the first <main>, else the first <article>, else
+    <body>, else the whole page. Headings, paragraphs, lists, quotes and
+    leaf divs inside it become paragraphs. Boilerplate is skipped.
+    """
+    
+    name = 'content'
+    ROOT_TAGS = ('main', 'article', 'body')
+    
+    # Shorter blocks are dropped as likely navigation remnants
+    MIN_CHARS = 15
+    
+    def __init__(self, min_chars: int = MIN_CHARS):
+        """
+        Initialize the visitor.
+        
+        Args:
+            min_chars: Blocks need more than this many characters to be kept
+        """
+        self.min_chars = min_chars
+        # Block records: [name, text start, text end, is container div, list item spans]
+        self._blocks = []
+        # Per open element: [block record or None, contains a container child]
+        self._frames = []
+        # Root tag -> [tag, text start, text end, first block, end block]
+        self._roots = {}
+    
+    def start(self, walker, tag):
+        if walker.removed:
+            self._frames.append(None)
+            return
+        
+        start = len(walker.content_texts)
+        name = tag.name
+        if name in self.ROOT_TAGS and name not in self._roots:
+            self._roots[name] = [tag, start, None, len(self._blocks), None]
+        
+        block = None
+        if name in BLOCK_TAGS:
+            block = [name, start, None, False, []]
+            self._blocks.append(block)
+        elif name == 'li' and self._frames and self._frames[-1] and self._frames[-1][0] \
+                and self._frames[-1][0][0] in ('ul', 'ol'):
+            # Direct list item of a list block
+            self._frames[-1][0][4].append([start, None])
+        self._frames.append([block, False])
+    
+    def end(self, walker, tag):
+        frame = self._frames.pop()
+        if frame is None:
+            return
+        
+        end = len(walker.content_texts)
+        block, has_container_child = frame
+        name = tag.name
+        if block:
+            block[2] = end
+            block[3] = name == 'div' and has_container_child
+        elif name == 'li' and self._frames and self._frames[-1] and self._frames[-1][0] \
+                and self._frames[-1][0][0] in ('ul', 'ol'):
+            self._frames[-1][0][4][-1][1] = end
+        
+        root = self._roots.get(name)
+        if root and root[0] is tag:
+            root[2] = end
+            root[4] = len(self._blocks)
+        
+        if self._frames and self._frames[-1] and (name in CONTAINER_CHILD_TAGS or has_container_child):
+            self._frames[-1][1] = True
+    
+    def result(self, walker):
+        texts = walker.content_texts
+        root = self._roots.get('main') or self._roots.get('article') or self._roots.get('body')
+        if root:
+            text_span, blocks = (root[1], root[2]), self._blocks[root[3]:root[4]]
+        else:
+            text_span, blocks = (0, len(texts)), self._blocks
+        
+        # Extract structured text with preserved formatting. Lengths come
+        # from prefix sums, so only blocks that are kept get their text built
+        clean_parts = []
+        for name, start, end, is_container, items in blocks:
+            # Skip if element is just a container with other block elements
+            if is_container:
+                continue
+            if walker.content_length(start, end) > self.min_chars:  # Filter out very short snippets
+                text = ' '.join(texts[start:end])
+                # Add markdown-style formatting
+                if name in HEADING_TAGS:
+                    clean_parts.append(f"{'#' * int(name[1])} {text}")
+                elif name in ('ul', 'ol'):
+                    for item_start, item_end in items:
+                        item_text = ' '.join(texts[item_start:item_end])
+                        if item_text:
+                            clean_parts.append(f"• {item_text}")
+                elif name == 'blockquote':
+                    clean_parts.append(f"> {text}")
+                else:
+                    clean_parts.append(text)
+        
+        # Remove duplicate consecutive lines (common in nav/footer remnants)
+        deduplicated_lines = []
+        prev_line = None
+        for line in '\n\n'.join(clean_parts).split('\n'):
+            line = line.strip()
+            if line and line != prev_line:
+                deduplicated_lines.append(line)
+                prev_line = line
+        clean_text = '\n'.join(deduplicated_lines)
+        
+        # Normalize excessive whitespace
+        clean_text = re.sub(r'\n{3,}', '\n\n', clean_text)
+        clean_text = re.sub(r'[ \t]+', ' ', clean_text)
+        clean_text = clean_text.strip()
+        
+        # Also extract raw text (simpler version for fallback)
+        raw_text = re.sub(r'\s+', ' ', ' '.join(texts[text_span[0]:text_span[1]])).strip()
+        
+        return {
+            'clean': clean_text,
+            'raw': raw_text
+        }
+
+
+class StreamElement:
+    """
+    An element as visitors see it during a streaming walk.
+    
+    Only the tag name and attributes are known; there is no tree to
+    navigate. Multi-valued attributes such as class are lists, as in
+    BeautifulSoup.
+    """
+    
+    __slots__ = ('name', 'attrs')
+    
+    def __init__(self, name: str, attrs: Dict[str, Union[str, List[str]]]):
+        self.name = name
+        self.attrs = attrs
+    
+    def get(self, key: str, default=None):
+        """Attribute value, or default if the element does not have it."""
+        return self.attrs.get(key, default)
+
+
+# Tree-building rules of BeautifulSoup's html.parser builder (void
+# elements, string containers, whitespace-preserving tags, ...)
+HTML_PARSER_RULES = HTMLParserTreeBuilder()
+
+# Whitespace BeautifulSoup collapses in whitespace-only strings
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+class StreamingPageWalker(PageWalker, HTMLParser):
+    """
+    Runs the page visitors straight off the tokenizer, without building a tree.
+    
+    Decoded markup is fed in chunks as it arrives from the network. A
+    stack of open elements replays the html.parser tree builder: end
+    tags close everything up to the matching open element, void
+    elements close at once and stray end tags are ignored. The visitors
+    therefore see the same elements and text as PageWalker.walk() on a
+    BeautifulSoup 'html.parser' tree. Nothing of the markup itself is
+    kept: only the open elements, the collected text and the visitors'
+    small per-block records, a fraction of what a parse tree needs.
+    
+    Usage:
+        walker = StreamingPageWalker(visitors)
+        for chunk in chunks:
+            walker.feed(chunk)
+        results = walker.close()
+    """
+    
+    def __init__(self, visitors: List[PageVisitor]):
+        """
+        Initialize the walker.
+        
+        Args:
+            visitors: Extractors to run while the page streams in
+        """
+        PageWalker.__init__(self, visitors)
+        HTMLParser.__init__(self, convert_charrefs=False)
+    
+    def reset(self):
+        """Prepare for a new page."""
+        HTMLParser.reset(self)
+        self._reset_text()
+        self._open: List[StreamElement] = []
+        self._open_counts: Dict[str, int] = {}
+        # Open elements whose strings are not page text (script, style, template, ...)
+        self._containers: List[type] = []
+        self._preserve_depth = 0
+        # Void elements closed on their start tag, whose end tag is ignored
+        self._closed_void: List[str] = []
+        # Character data of the string being read
+        self._data: List[str] = []
+        # Adjacent content strings that make up one content text
+        self._pending: List[str] = []
+        self._pending_type: Optional[type] = None
+    
+    def close(self) -> Dict[str, object]:
+        """
+        Finish the page and collect every visitor's result.
+        
+        Returns:
+            Visitor name -> result
+        """
+        HTMLParser.close(self)
+        self._end_data()
+        while self._open:
+            self._pop()
+        self._flush_content_text()
+        return {visitor.name: visitor.result(self) for visitor in self.visitors}
+    
+    def handle_starttag(self, tag, attrs):
+        self._start_element(tag, attrs)
+        if tag in HTML_PARSER_RULES.empty_element_tags:
+            self._close_element(tag)
+            self._closed_void.append(tag)
+    
+    def handle_startendtag(self, tag, attrs):
+        self._start_element(tag, attrs)
+        self._close_element(tag)
+    
+    def handle_endtag(self, tag):
+        if tag in self._closed_void:
+            # </br> after <br>: the element is already closed
+            self._closed_void.remove(tag)
+        else:
+            self._close_element(tag)
+    
+    def handle_data(self, data):
+        self._data.append(data)
+    
+    def handle_charref(self, name):
+        self._data.append(unescape(f'&#{name};'))
+    
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._data.append(character if character is not None else f'&{name}')
+    
+    def handle_comment(self, data):
+        self._add_other_string(data)
+    
+    def handle_decl(self, decl):
+        self._add_other_string(decl)
+    
+    def handle_pi(self, data):
+        self._add_other_string(data)
+    
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self._end_data()
+            self._data.append(data[len('CDATA['):])
+            self._end_data(CData)
+        else:
+            self._add_other_string(data)
+    
+    def _start_element(self, name: str, attrs: List[Tuple[str, Optional[str]]]):
+        """Open an element and announce it to the visitors."""
+        self._end_data()
+        self._flush_content_text()
+        
+        values = {}
+        for key, value in attrs:
+            # Later duplicates replace earlier ones
+            values[key] = '' if value is None else value
+        list_attributes = HTML_PARSER_RULES.cdata_list_attributes
+        for key in list_attributes.get('*', set()) | list_attributes.get(name, set()):
+            if key in values:
+                values[key] = values[key].split()
+        element = StreamElement(name, values)
+        
+        if self._removed_depth is None and self.is_boilerplate(element):
+            self._removed_depth = len(self._open)
+        self._open.append(element)
+        self._open_counts[name] = self._open_counts.get(name, 0) + 1
+        if name in HTML_PARSER_RULES.string_containers:
+            self._containers.append(HTML_PARSER_RULES.string_containers[name])
+        if name in HTML_PARSER_RULES.preserve_whitespace_tags:
+            self._preserve_depth += 1
+        for visitor in self.visitors:
+            visitor.start(self, element)
+    
+    def _close_element(self, name: str):
+        """Close the most recent open element with this name and everything inside it."""
+        self._end_data()
+        if not self._open_counts.get(name):
+            return
+        while self._pop().name != name:
+            pass
+    
+    def _pop(self) -> StreamElement:
+        """Close the innermost open element."""
+        self._flush_content_text()
+        element = self._open.pop()
+        name = element.name
+        self._open_counts[name] -= 1
+        if name in HTML_PARSER_RULES.string_containers:
+            self._containers.pop()
+        if name in HTML_PARSER_RULES.preserve_whitespace_tags:
+            self._preserve_depth -= 1
+        self._end(element, len(self._open))
+        return element
+    
+    def _add_other_string(self, data: str):
+        """Record a comment, doctype or similar: a node that is not page text."""
+        self._end_data()
+        self._data.append(data)
+        self._end_data(None)
+    
+    def _end_data(self, string_type: Optional[type] = NavigableString):
+        """
+        Turn the buffered character data into one string, as BeautifulSoup does.
+        
+        Args:
+            string_type: NavigableString for character data, CData, or None for non-text
+        """
+        if not self._data:
+            return
+        data = ''.join(self._data)
+        self._data = []
+        if not self._preserve_depth and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        if string_type is NavigableString and self._containers:
+            string_type = self._containers[-1]
+        
+        # Only strings of the same type with nothing in between form one content text
+        if self._pending and string_type is not self._pending_type:
+            self._flush_content_text()
+        if string_type not in TEXT_STRING_TYPES:
+            return
+        
+        text = data.strip()
+        if text:
+            self.texts.append(text)
+        if self._removed_depth is None:
+            self._pending.append(data)
+            self._pending_type = string_type
+    
+    def _flush_content_text(self):
+        """Record the pending run of adjacent content strings."""
+        if self._pending:
+            self._add_content_text(''.join(self._pending))
+            self._pending = []
+            self._pending_type = None
+
+
+class BoilerplateModel:
+    """
+    Learns which content blocks a site repeats across its pages.
+    
+    Every line of a page's clean content is one block (a heading,
+    paragraph, list item or quote). Blocks are hashed per host, ignoring
+    case and whitespace. A block seen on at least `min_share` of the
+    host's pages so far, and on no fewer than `min_pages` of them, is
+    template chrome (cookie banners, calls to action, "recent posts"
+    lists) and is removed from later pages with a set lookup. The share
+    keeps content a few pages legitimately have in common on large sites.
+    """
+    
+    # Repeated short snippets are caught by the model, so pages can keep
+    # blocks this short instead of ContentVisitor.MIN_CHARS
+    MIN_BLOCK_CHARS = 3
+    
+    def __init__(self, min_pages: int = 3, min_share: float = 0.5):
+        """
+        Initialize an empty model.
+        
+        Args:
+            min_pages: Pages a block must appear on at least to count as boilerplate
+            min_share: Share of the host's pages a block must appear on to count as boilerplate
+        """
+        self.min_pages = min_pages
+        self.min_share = min_share
+        self.removed = 0
+        # host -> pages learned from
+        self._pages: Dict[str, int] = {}
+        # host -> block hash -> pages seen on (until it becomes boilerplate)
+        self._counts: Dict[str, Dict[int, int]] = {}
+        # host -> hashes of boilerplate blocks
+        self._boilerplate: Dict[str, set] = {}
+    
+    @staticmethod
+    def block_hash(line: str) -> int:
+        """64-bit hash of a block, ignoring case and whitespace."""
+        key = ''.join(line.lower().split())
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    
+    def learn(self, host: str, content: str) -> List[int]:
+        """
+        Count the blocks of a newly scraped page.
+        
+        Args:
+            host: Host the page belongs to
+            content: The page's clean content
+            
+        Returns:
+            Hash of every line of the content
+        """
+        pages = self._pages[host] = self._pages.get(host, 0) + 1
+        if not content:
+            return []
+        hashes = [self.block_hash(line) for line in content.split('\n')]
+        counts = self._counts.setdefault(host, {})
+        boilerplate = self._boilerplate.setdefault(host, set())
+        threshold = max(self.min_pages, self.min_share * pages)
+        for value in set(hashes) - boilerplate:
+            seen = counts.get(value, 0) + 1
+            if seen >= threshold:
+                boilerplate.add(value)
+                del counts[value]
+            else:
+                counts[value] = seen
+        return hashes
+    
+    def strip(self, host: str, content: str, hashes: Optional[List[int]] = None) -> str:
+        """
+        Remove the boilerplate blocks from a page's content.
+        
+        Args:
+            host: Host the page belongs to
+            content: The page's clean content
+            hashes: Line hashes from learn(), to avoid hashing twice
+            
+        Returns:
+            The content without boilerplate lines
+        """
+        boilerplate = self._boilerplate.get(host)
+        if not boilerplate or not content:
+            return content
+        lines = content.split('\n')
+        if hashes is None:
+            hashes = [self.block_hash(line) for line in lines]
+        
+        kept = []
+        for line, value in zip(lines, hashes):
+            if value in boilerplate:
+                self.removed += 1
+            elif not kept or line != kept[-1]:
+                # Removing a block can leave duplicate lines next to each other
+                kept.append(line)
+        return '\n'.join(kept)
+    
+    def is_boilerplate(self, host: str, line: str) -> bool:
+        """Whether a single block is known boilerplate."""
+        return self.block_hash(line) in self._boilerplate.get(host, ())
+    
+    def snapshot(self) -> Dict[str, List[int]]:
+        """Boilerplate hashes per host, for checkpoints."""
+        return {host: sorted(hashes) for host, hashes in self._boilerplate.items() if hashes}
+    
+    def restore(self, snapshot: Dict[str, List[int]]):
+        """Load boilerplate hashes saved with snapshot()."""
+        for host, hashes in snapshot.items():
+            self._boilerplate.setdefault(host, set()).update(hashes)
+    
+    def __len__(self) -> int:
+        return sum(len(hashes) for hashes in self._boilerplate.values())
+
+
+# Query parameters that only identify a visitor, session or ad click
+TRACKING_PARAMS = (
+    'utm_*', 'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'ref_src',
+    'sid', 'sessionid', 'session_id', 'phpsessid', 'jsessionid', 'aspsessionid*', 'cfid', 'cftoken'
+)
+
+# Directory index documents folded into their directory URL
+INDEX_FILES = ('index.html', 'index.htm', 'index.php', 'index.asp', 'default.asp', 'default.aspx')
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+# A percent-escape, and the characters that never need one (RFC 3986 "unreserved")
+PERCENT_ESCAPE_PATTERN = re.compile(r'%[0-9A-Fa-f]{2}')
+UNRESERVED_CHARACTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+
+def query_pattern(host: str, path: str) -> str:
+    """
+    Group of pages whose query parameters are assumed to mean the same.
+    
+    The group is the host plus the page's directory, with numbers
+    generalized: /shop/shoes/42 and /shop/shoes/43 share 'host/shop/shoes/'.
+    """
+    return host + re.sub(r'\d+', '<n>', path[:path.rfind('/') + 1])
+
+
+class QueryParamLearner:
+    """
+    Learns which query parameters do not change a page's content.
+    
+    Whenever two fetched URLs differ in a single parameter, the content
+    hashes of the two pages are compared, per query_pattern(). One
+    difference marks the parameter as relevant for the pattern for good.
+    `samples` identical pairs and no difference mark it irrelevant, and
+    the URL canonicalizer drops it from every further link.
+    """
+    
+    def __init__(self, samples: int = 3, on_learn: Optional[Callable] = None):
+        """
+        Initialize the learner.
+        
+        Args:
+            samples: Identical variant pairs needed before a parameter is ignored
+            on_learn: Callback(pattern, name) run when a parameter is found irrelevant
+        """
+        self.samples = samples
+        self.on_learn = on_learn
+        self.relevant = set()
+        self.irrelevant: Dict[str, frozenset] = {}
+        self._hashes: Dict[str, bytes] = {}
+        self._first_variants: Dict[Tuple[str, str], bytes] = {}
+        self._identical: Dict[Tuple[str, str], int] = {}
+    
+    @staticmethod
+    def content_hash(page_data: Dict) -> bytes:
+        """Hash of what a page shows: its title and content."""
+        text = f"{page_data.get('title', '')}\0{page_data.get('content', '')}"
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    
+    def ignored(self, pattern: str) -> frozenset:
+        """Parameter names learned to be irrelevant for a pattern."""
+        return self.irrelevant.get(pattern, frozenset())
+    
+    def observe(self, url: str, content_hash: bytes):
+        """
+        Record a fetched page and compare it with its single-parameter variants.
+        
+        Args:
+            url: Canonical URL of the page
+            content_hash: content_hash() of the page
+        """
+        self._hashes[url] = content_hash
+        parsed = urlparse(url)
+        if not parsed.query:
+            return
+        
+        pattern = query_pattern(parsed.netloc, parsed.path)
+        pairs = parsed.query.split('&')
+        for index, pair in enumerate(pairs):
+            name = unquote(pair.split('=', 1)[0].replace('+', ' ')).lower()
+            if (pattern, name) in self.relevant or name in self.ignored(pattern):
+                continue
+            
+            # Compare with the page without the parameter, else with the first variant seen
+            rest = urlunparse(parsed._replace(query='&'.join(pairs[:index] + pairs[index + 1:])))
+            reference = self._hashes.get(rest)
+            if reference is None:
+                if (rest, name) not in self._first_variants:
+                    self._first_variants[(rest, name)] = content_hash
+                    continue
+                reference = self._first_variants[(rest, name)]
+            
+            if reference != content_hash:
+                self.relevant.add((pattern, name))
+                self._identical.pop((pattern, name), None)
+                continue
+            identical = self._identical.get((pattern, name), 0) + 1
+            self._identical[(pattern, name)] = identical
+            if identical >= self.samples:
+                self.irrelevant[pattern] = self.ignored(pattern) | {name}
+                self._identical.pop((pattern, name))
+                if self.on_learn:
+                    self.on_learn(pattern, name)
+    
+    def snapshot(self) -> Dict:
+        """JSON-serializable decisions, for checkpoints."""
+        return {
+            'relevant': sorted(self.relevant),
+            'irrelevant': {pattern: sorted(names) for pattern, names in self.irrelevant.items()}
+        }
+    
+    def restore(self, snapshot: Dict):
+        """Restore decisions saved with snapshot()."""
+        self.relevant = {tuple(entry) for entry in snapshot.get('relevant', [])}
+        self.irrelevant = {pattern: frozenset(names) for pattern, names in snapshot.get('irrelevant', {}).items()}
+
+
+# A year and month starting a path segment or query value (2026/05, 2026-05-17), or a year= parameter;
+# separators and boundaries are required so numeric IDs like /product/205012 are not taken for dates
+DATE_PATTERN = re.compile(
+    r'(?:^|[/=])((?:19|20)\d\d)[/-](?:0[1-9]|1[0-2])(?=[/&;-]|$)'
+    r'|[?&;]year=((?:19|20)\d\d)(?=[&;]|$)',
+    re.IGNORECASE
+)
+
+
+class TrapDetector:
+    """
+    Spots crawler traps among newly discovered links.
+    
+    Event calendars with endless "next month" links, relative-link loops
+    (/a/b/a/b/...) and faceted navigation produce unbounded URL spaces.
+    Links that look like one are dropped:
+        repeating path - a segment occurs MAX_SEGMENT_REPEATS times, or a
+                         run of segments repeats back to back
+        path depth     - more than `max_segments` path segments
+        date runaway   - a date (see DATE_PATTERN) in the path or query before
+                         EARLIEST_YEAR or more than YEARS_AHEAD years ahead
+    Beyond `pattern_cap` URLs of one pattern (path and query parameter
+    names, numbers generalized) links are deferred instead: they are only
+    crawled once everything else has been.
+    """
+    
+    MAX_SEGMENT_REPEATS = 3
+    EARLIEST_YEAR = 1990
+    YEARS_AHEAD = 2
+    
+    # URLs kept per trap reason for the report
+    EXAMPLES = 3
+    
+    def __init__(self, max_segments: int = 12, pattern_cap: int = 200, now: Optional[float] = None):
+        """
+        Initialize the detector.
+        
+        Args:
+            max_segments: Deepest allowed path, in segments (0 for no limit)
+            pattern_cap: URLs per pattern queued normally (0 for no cap)
+            now: Timestamp the date window is based on (default: current time)
+        """
+        self.max_segments = max_segments
+        self.pattern_cap = pattern_cap
+        self.latest_year = time.gmtime(now).tm_year + self.YEARS_AHEAD
+        self.cut: Dict[str, int] = {}
+        self.examples: Dict[str, List[str]] = {}
+        self.deferred: Dict[str, int] = {}
+        self._pattern_counts: Dict[str, int] = {}
+    
+    @staticmethod
+    def pattern(url: str) -> str:
+        """URL pattern the page cap applies to, e.g. 'host/events/<n>/<n>?view'."""
+        parsed = urlparse(url)
+        pattern = parsed.netloc + re.sub(r'\d+', '<n>', parsed.path)
+        if parsed.query:
+            pattern += '?' + '&'.join(sorted({pair.split('=', 1)[0] for pair in parsed.query.split('&') if pair}))
+        return pattern
+    
+    def trap(self, url: str) -> Optional[str]:
+        """
+        Check a URL against the trap heuristics.
+        
+        Returns:
+            The trap's reason, or None if the URL looks like real content
+        """
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.split('/') if segment]
+        if self.max_segments and len(segments) > self.max_segments:
+            return 'path depth'
+        if self._repeats(segments):
+            return 'repeating path'
+        for match in DATE_PATTERN.finditer(parsed.path + ('?' + parsed.query if parsed.query else '')):
+            year = int(match.group(1) or match.group(2))
+            if not self.EARLIEST_YEAR <= year <= self.latest_year:
+                return 'date runaway'
+        return None
+    
+    def _repeats(self, segments: List[str]) -> bool:
+        """True if path segments repeat the way link loops make them."""
+        counts = {}
+        for segment in segments:
+            counts[segment] = counts.get(segment, 0) + 1
+            if counts[segment] >= self.MAX_SEGMENT_REPEATS:
+                return True
+        for size in range(2, len(segments) // 2 + 1):
+            for start in range(len(segments) - 2 * size + 1):
+                if segments[start:start + size] == segments[start + size:start + 2 * size]:
+                    return True
+        return False
+    
+    def cut_link(self, url: str) -> Optional[str]:
+        """
+        Check a newly discovered link and count it if it is dropped.
+        
+        Returns:
+            The trap's reason if the link should be dropped, else None
+        """
+        reason = self.trap(url)
+        if reason:
+            self.cut[reason] = self.cut.get(reason, 0) + 1
+            examples = self.examples.setdefault(reason, [])
+            if len(examples) < self.EXAMPLES:
+                examples.append(url)
+        return reason
+    
+    def defer_link(self, url: str) -> bool:
+        """
+        Count a newly queued link against its pattern's cap.
+        
+        Returns:
+            True if the pattern is over its cap and the link should be deferred
+        """
+        if not self.pattern_cap:
+            return False
+        pattern = self.pattern(url)
+        count = self._pattern_counts.get(pattern, 0) + 1
+        self._pattern_counts[pattern] = count
+        if count <= self.pattern_cap:
+            return False
+        self.deferred[pattern] = self.deferred.get(pattern, 0) + 1
+        return True
+    
+    def snapshot(self) -> Dict:
+        """JSON-serializable state, for checkpoints."""
+        return {
+            'cut': self.cut,
+            'examples': self.examples,
+            'deferred': self.deferred,
+            'pattern_counts': self._pattern_counts
+        }
+    
+    def restore(self, snapshot: Dict):
+        """Restore state saved with snapshot()."""
+        self.cut = snapshot.get('cut', {})
+        self.examples = snapshot.get('examples', {})
+        self.deferred = snapshot.get('deferred', {})
+        self._pattern_counts = snapshot.get('pattern_counts', {})
+
+
+class URLCanonicalizer:
+    """
+    Maps the spellings of a URL that name the same page to one canonical form.
+    
+    Scheme and host are lowercased, default ports and fragments dropped,
+    percent-escapes normalized, "." and ".." segments resolved and trailing
+    slashes removed (except on the root). Query strings are dropped, or,
+    with keep_query, stripped of tracking and session parameters and
+    sorted by key. Results are memoized, so the repeated canonicalization
+    of a popular link costs a dictionary lookup. With a QueryParamLearner
+    set as `learner`, the parameters it found irrelevant are dropped too.
+    """
+    
+    def __init__(self, keep_query: bool = False, strip_params: Tuple[str, ...] = TRACKING_PARAMS,
+                 fold_index_files: bool = False, cache_size: int = 65536):
+        """
+        Initialize the canonicalizer.
+        
+        Args:
+            keep_query: Keep query strings (minus strip_params) instead of dropping them
+            strip_params: Query parameter names to remove; '*' wildcards allowed, case-insensitive
+            fold_index_files: Treat /dir/index.html and similar as /dir
+            cache_size: Canonical forms remembered (least recently used are forgotten)
+        """
+        self.keep_query = keep_query
+        self.strip_params = tuple(strip_params)
+        self.fold_index_files = fold_index_files
+        self._strip_pattern = re.compile('|'.join(fnmatch.translate(name.lower()) for name in self.strip_params)
+                                         or r'(?!)')
+        self.canonicalize = functools.lru_cache(maxsize=cache_size)(self._canonicalize)
+        self.learner: Optional[QueryParamLearner] = None
+    
+    @staticmethod
+    def _normalize_escapes(text: str) -> str:
+        """Uppercase percent-escapes and decode the ones for unreserved characters."""
+        def fix(match):
+            character = chr(int(match.group(0)[1:], 16))
+            return character if character in UNRESERVED_CHARACTERS else match.group(0).upper()
+        return PERCENT_ESCAPE_PATTERN.sub(fix, text) if '%' in text else text
+    
+    @staticmethod
+    def _remove_dot_segments(path: str) -> str:
+        """Resolve "." and ".." path segments."""
+        output = []
+        for segment in path.split('/'):
+            if segment == '..':
+                if len(output) > 1:
+                    output.pop()
+            elif segment != '.':
+                output.append(segment)
+        if path.endswith(('/.', '/..')):
+            output.append('')
+        return '/'.join(output)
+    
+    def _canonical_query(self, query: str, ignored: frozenset = frozenset()) -> str:
+        """Drop stripped and ignored parameters and sort the rest by key, keeping their encoding."""
+        pairs = []
+        for pair in query.split('&'):
+            key = pair.split('=', 1)[0]
+            name = unquote(key.replace('+', ' ')).lower()
+            if pair and not self._strip_pattern.match(name) and name not in ignored:
+                pairs.append((key, pair))
+        pairs.sort(key=lambda item: item[0])
+        return '&'.join(self._normalize_escapes(pair) for _, pair in pairs)
+    
+    def _canonicalize(self, url: str) -> str:
+        """Canonical form of a URL (use canonicalize(), which is memoized)."""
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        
+        # Lowercase the host, keep any user info, drop the default port
+        userinfo, _, hostport = parsed.netloc.rpartition('@')
+        hostport = hostport.lower()
+        host, colon, port = hostport.rpartition(':')
+        if not colon or ']' in port:
+            host, port = hostport, ''
+        host = host.rstrip('.')
+        netloc = host if not port or port == DEFAULT_PORTS.get(scheme) else f'{host}:{port}'
+        if userinfo:
+            netloc = f'{userinfo}@{netloc}'
+        
+        path = self._remove_dot_segments(self._normalize_escapes(parsed.path)) or '/'
+        if self.fold_index_files:
+            directory, _, filename = path.rpartition('/')
+            if filename.lower() in INDEX_FILES:
+                path = directory + '/'
+        if path.endswith('/') and len(path) > 1:
+            path = path.rstrip('/') or '/'
+        
+        query, params = '', ''
+        if self.keep_query:
+            if parsed.query:
+                ignored = self.learner.ignored(query_pattern(netloc, path)) if self.learner else frozenset()
+                query = self._canonical_query(parsed.query, ignored)
+            params = ';'.join(param for param in parsed.params.split(';')
+                              if param and not self._strip_pattern.match(param.split('=', 1)[0].lower()))
+        return urlunparse((scheme, netloc, path, params, query, ''))
+
+
+class RawPage(NamedTuple):
+    """A downloaded page that has not been parsed yet."""
+    
+    url: str
+    body: bytes
+    content_type: str
+    status_code: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    final_url: str
+    
+    def job(self) -> Tuple[str, bytes, str, int]:
+        """The (url, body, content_type, status_code) a parse worker job is made of."""
+        return (self.final_url, self.body, self.content_type, self.status_code)
 
 
 class WebsiteCrawler:
@@ -22,443 +3171,1407 @@ class WebsiteCrawler:
     from all pages within a given domain.
     """
     
-    def __init__(
-        self,
-        base_url: str,
-        rate_limit: float = 1.5,
-        max_depth: int = None,
-        include_query_params: bool = False,
-        timeout: int = 10,
-        generate_summaries: bool = False
-    ):
+    def __init__(
+        self,
+        base_url: str,
+        rate_limit: float = 1.5,
+        max_depth: int = None,
+        include_query_params: bool = False,
+        strip_params: Tuple[str, ...] = TRACKING_PARAMS,
+        fold_index_files: bool = False,
+        query_param_samples: int = 3,
+        trap_detection: bool = True,
+        max_path_segments: int = 12,
+        trap_pattern_cap: int = 200,
+        timeout: int = 10,
+        generate_summaries: bool = False,
+        requests_per_second: Optional[float] = None,
+        burst: int = 1,
+        max_in_flight: Optional[int] = None,
+        adaptive: bool = False,
+        max_requests_per_second: float = 10.0,
+        max_throttle_retries: int = 3,
+        max_retry_after: float = 300.0,
+        http_cache: Optional[str] = None,
+        extraction_cache: Optional[str] = None,
+        checkpoint: Optional[str] = None,
+        checkpoint_interval: int = 50,
+        priority: Union[str, Callable] = 'bfs',
+        url_weights: Optional[Dict[str, float]] = None,
+        max_queue_size: Optional[int] = None,
+        visited_set: str = 'exact',
+        expected_urls: int = 1000000,
+        false_positive_rate: float = 0.001,
+        use_sitemaps: bool = False,
+        respect_robots: bool = True,
+        robots_ttl: float = 3600.0,
+        max_page_bytes: int = 10 * 1024 * 1024,
+        max_attempts: int = 3,
+        retry_backoff: float = 2.0,
+        fetcher: Optional[Fetcher] = None,
+        parser: str = 'auto',
+        parser_check_pages: int = 5,
+        streaming: bool = False,
+        boilerplate_pages: Optional[int] = None,
+        boilerplate_share: float = 0.5
+    ):
+        """
+        Initialize the crawler.
+        
+        Args:
+            base_url: Starting URL to crawl
+            rate_limit: Minimum seconds between requests to the same host (default: 1.5)
+            max_depth: Maximum crawl depth (None for unlimited)
+            include_query_params: Whether to treat URLs with different query params as unique
+            strip_params: Query parameters ignored even with include_query_params ('*' wildcards allowed)
+            fold_index_files: Treat /dir/index.html (and index.php, default.aspx, ...) as /dir
+            query_param_samples: With include_query_params, identical variants needed before a
+                parameter is ignored for similar pages (0 to never ignore one)
+            trap_detection: Drop or defer discovered links that look like crawler traps
+            max_path_segments: With trap_detection, deepest path followed (0 for no limit)
+            trap_pattern_cap: With trap_detection, links per URL pattern queued before
+                further ones are deferred (0 for no cap)
+            timeout: Request timeout in seconds
+            generate_summaries: Whether to generate automatic summaries for each page
+            requests_per_second: Per-host request rate; overrides rate_limit when given
+            burst: Requests a host may receive back-to-back after being idle
+            max_in_flight: Maximum concurrent requests per host (None for unlimited)
+            adaptive: Tune each host's rate automatically from latency and 429/503 responses
+            max_requests_per_second: Ceiling for the adaptive rate
+            max_throttle_retries: How often a 429/503 response is retried before giving up
+            max_retry_after: Longest Retry-After (seconds) the crawler is willing to wait
+            http_cache: SQLite file for ETag/Last-Modified revalidation on recrawls (None to disable)
+            extraction_cache: SQLite file reusing extraction results of byte-identical pages (None to disable)
+            checkpoint: SQLite file for periodic crawl checkpoints (None to disable)
+            checkpoint_interval: Save a checkpoint every this many scraped pages
+            priority: Frontier strategy ('bfs', 'inlinks', 'weighted') or a scoring function
+            url_weights: Regex -> weight for the 'weighted' strategy (higher is crawled earlier)
+            max_queue_size: Maximum number of queued URLs (None for unlimited)
+            visited_set: 'exact', or 'hashed'/'bloom' for compact million-URL crawls
+            expected_urls: Expected number of URLs, used to size compact visited sets
+            false_positive_rate: False-positive rate of the 'bloom' visited set
+            use_sitemaps: Seed the frontier from robots.txt/sitemap.xml sitemaps
+            respect_robots: Skip URLs disallowed by robots.txt and honor its Crawl-delay
+            robots_ttl: Seconds before a host's robots.txt is fetched again
+            max_page_bytes: Pages larger than this are abandoned mid-download (default: 10 MB)
+            max_attempts: Attempts per URL before a transient failure is given up on
+            retry_backoff: Seconds before the first retry; doubles with every further attempt
+            fetcher: Where pages come from (default: the network, via RequestsFetcher)
+            parser: BeautifulSoup backend: 'auto' (fastest installed), 'lxml', 'html.parser' or 'html5lib'
+            parser_check_pages: Pages also parsed with html.parser to confirm the backend extracts the same
+            streaming: Extract pages while they download, without building a parse tree
+            boilerplate_pages: Remove content blocks repeated on at least this many pages of a host (None to disable)
+            boilerplate_share: Share of a host's pages scraped so far that such a block must also appear on
+        """
+        self.base_url = base_url
+        self.rate_limit = rate_limit
+        self.max_depth = max_depth
+        self.include_query_params = include_query_params
+        self.timeout = timeout
+        self.generate_summaries = generate_summaries
+        self.max_throttle_retries = max_throttle_retries
+        self.max_retry_after = max_retry_after
+        self.max_page_bytes = max_page_bytes
+        
+        # Parser backend; a non-reference backend is checked against html.parser first.
+        # Streaming extraction replays html.parser's tree building, so it counts as html.parser
+        self.streaming = streaming
+        self.parser = REFERENCE_PARSER if streaming else resolve_parser(parser)
+        self._parser_checks_left = parser_check_pages if self.parser != REFERENCE_PARSER else 0
+        self._parser_lock = threading.Lock()
+        # Crawler like a parse worker's, for pages parsed again after a parser switch (see _worker_page)
+        self._reparser = None
+        
+        # Page bodies are decoded once, before parsing, with per-host charset memory
+        self.charsets = CharsetResolver()
+        
+        # Canonical URL forms, memoized since every link is normalized several times
+        self.strip_params = tuple(strip_params)
+        self.fold_index_files = fold_index_files
+        self.canonicalizer = URLCanonicalizer(include_query_params, self.strip_params, fold_index_files)
+        
+        # Query parameters that turn out not to change page content are dropped from later links
+        self.query_params = None
+        if include_query_params and query_param_samples > 0:
+            self.query_params = QueryParamLearner(query_param_samples, on_learn=self._ignore_query_param)
+            self.canonicalizer.learner = self.query_params
+        
+        # Calendars, link loops and faceted URLs are cut before they flood the frontier
+        self.traps = TrapDetector(max_path_segments, trap_pattern_cap) if trap_detection else None
+        
+        # Parse base URL to get domain
+        parsed = urlparse(self.canonicalizer.canonicalize(base_url))
+        self.domain = parsed.netloc
+        self.scheme = parsed.scheme
+        
+        # Track visited URLs and the frontier of URLs still to crawl
+        self._make_url_set = lambda: make_url_set(visited_set, expected_urls, false_positive_rate)
+        self.visited_urls = self._make_url_set()
+        self.frontier = CrawlFrontier(priority, url_weights, max_queue_size, self._make_url_set)
+        self.frontier.push(base_url, 0)
+        self.pages_data: List[Dict] = []
+        self.page_count = 0
+        
+        # Crawl position of each task about to be fetched, for fetchers that record it
+        self._task_order = itertools.count()
+        self._sequences: Dict[str, int] = {}
+        
+        # Redirected and duplicate canonical URLs -> URL of the page stored for them
+        self.redirects: Dict[str, str] = {}
+        self.duplicates = 0
+        self._records: Dict[str, Tuple[bytes, str]] = {}
+        # Declared canonical URL not stored yet -> stored page that declared it
+        self._canonical_claims: Dict[str, str] = {}
+        
+        # Page source (a pooled HTTP session unless told otherwise)
+        self.fetcher = fetcher or RequestsFetcher()
+        
+        # Per-host politeness (rate_limit is the default spacing between requests)
+        if requests_per_second is None and rate_limit and rate_limit > 0:
+            requests_per_second = 1.0 / rate_limit
+        if adaptive:
+            self.scheduler = AdaptivePolitenessScheduler(
+                requests_per_second=requests_per_second or max_requests_per_second,
+                burst=burst,
+                max_in_flight=max_in_flight,
+                max_rate=max_requests_per_second
+            )
+        else:
+            self.scheduler = PolitenessScheduler(
+                requests_per_second=requests_per_second,
+                burst=burst,
+                max_in_flight=max_in_flight
+            )
+        
+        # Conditional-GET cache for recrawls
+        self.http_cache = HTTPCache(http_cache) if http_cache else None
+        
+        # Extraction results of byte-identical pages; not used in streaming mode, which parses while downloading
+        self.extraction_cache = ExtractionCache(extraction_cache) if extraction_cache and not streaming else None
+        self._code_hash = None
+        
+        # robots.txt rules, fetched once per host (also the source of sitemap URLs)
+        self.respect_robots = respect_robots
+        self.robots = RobotsCache(
+            self.fetch,
+            user_agent='WebsiteCrawler',
+            ttl=robots_ttl,
+            on_rules=self._apply_crawl_delay if respect_robots else None
+        )
+        
+        # Sitemap seeding; lastmod per URL lets recrawls skip unchanged pages
+        self.use_sitemaps = use_sitemaps
+        self.sitemap_lastmod: Dict[str, float] = {}
+        self.sitemap_skips = 0
+        
+        # Site template blocks learned from the pages scraped so far
+        self.boilerplate = BoilerplateModel(boilerplate_pages, boilerplate_share) if boilerplate_pages else None
+        
+        # Transient failures are retried with backoff; the rest end up in `failed`
+        self.retries = RetryQueue(max_attempts=max_attempts, base_delay=retry_backoff)
+        self.failed: List[Dict] = []
+        self._failures: Dict[str, Tuple[str, bool, Optional[float]]] = {}  # url -> reason, retryable, Retry-After
+        
+        # Checkpointing (pages/visited written since the last save are tracked separately)
+        self.checkpoint = CrawlCheckpoint(checkpoint) if checkpoint else None
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self._resumed = False
+        self._current: Optional[Tuple[str, int, int]] = None
+        self._pages_checkpointed = 0
+        self._visited_since_checkpoint: List[str] = []
+    
+    def normalize_url(self, url: str) -> str:
+        """
+        Normalize URL to the canonical form used for deduplication.
+        
+        Args:
+            url: URL to normalize
+            
+        Returns:
+            Normalized URL string (see URLCanonicalizer)
+        """
+        return self.canonicalizer.canonicalize(url)
+    
+    def _ignore_query_param(self, pattern: str, name: str):
+        """Start dropping a query parameter found not to change content."""
+        print(f"🧪 Ignoring query parameter '{name}' on {pattern} (variants show the same content)")
+        self.canonicalizer.canonicalize.cache_clear()
+    
+    def is_valid_url(self, url: str) -> bool:
+        """
+        Check if URL is valid, belongs to the same domain and is allowed by robots.txt.
+        
+        Args:
+            url: URL to validate
+            
+        Returns:
+            True if URL should be crawled
+        """
+        try:
+            parsed = urlparse(url)
+            
+            # Must have same domain
+            if parsed.netloc != self.domain:
+                return False
+            
+            # Must be http or https
+            if parsed.scheme not in ['http', 'https']:
+                return False
+            
+            # Skip common non-HTML file extensions
+            skip_extensions = [
+                '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp',
+                '.zip', '.tar', '.gz', '.mp4', '.mp3', '.avi', '.mov',
+                '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+                '.css', '.js', '.xml', '.json', '.csv'
+            ]
+            
+            path_lower = parsed.path.lower()
+            if any(path_lower.endswith(ext) for ext in skip_extensions):
+                return False
+            
+            # Must be allowed by robots.txt
+            if self.respect_robots and not self.robots.allowed(url):
+                return False
+            
+            return True
+            
+        except Exception:
+            return False
+    
+    def extract_links(self, soup: BeautifulSoup, current_url: str) -> List[str]:
+        """
+        Extract all internal links from a page.
+        
+        Args:
+            soup: BeautifulSoup object of the page
+            current_url: Current page URL for resolving relative links
+            
+        Returns:
+            List of unique absolute URLs in document order
+        """
+        return PageWalker([LinksVisitor(self, current_url)]).walk(soup)['links']
+    
+    def extract_content(self, soup: BeautifulSoup) -> Dict[str, str]:
+        """
+        Extract clean text content from a page, removing navigation and repeated elements.
+        
+        Args:
+            soup: BeautifulSoup object of the page
+            
+        Returns:
+            Dictionary with 'raw' and 'clean' content versions
+        """
+        return PageWalker([ContentVisitor()]).walk(soup)['content']
+    
+    def page_visitors(self, url: str) -> List[PageVisitor]:
         """
-        Initialize the crawler.
+        Extractors run over every page during its single traversal.
+        
+        Subclasses can append their own PageVisitor; its result is stored
+        in the page data under the visitor's name.
         
         Args:
-            base_url: Starting URL to crawl
-            rate_limit: Seconds to wait between requests (default: 1.5)
-            max_depth: Maximum crawl depth (None for unlimited)
-            include_query_params: Whether to treat URLs with different query params as unique
-            timeout: Request timeout in seconds
-            generate_summaries: Whether to generate automatic summaries for each page
+            url: URL of the page being parsed
         """
-        self.base_url = base_url
-        self.rate_limit = rate_limit
-        self.max_depth = max_depth
-        self.include_query_params = include_query_params
-        self.timeout = timeout
-        self.generate_summaries = generate_summaries
+        min_chars = BoilerplateModel.MIN_BLOCK_CHARS if self.boilerplate is not None else ContentVisitor.MIN_CHARS
+        return [TitleVisitor(), HeadingsVisitor(), ContentVisitor(min_chars), LinksVisitor(self, url),
+                CanonicalVisitor(self, url)]
+    
+    def _extraction_fingerprint(self) -> str:
+        """
+        Identify the settings that influence extracted page data.
         
-        # Parse base URL to get domain
-        parsed = urlparse(base_url)
-        self.domain = parsed.netloc
-        self.scheme = parsed.scheme
+        Cached results produced under different settings are not reused.
+        """
+        return json.dumps({
+            'version': EXTRACTOR_VERSION,
+            'code': self._extraction_code_hash(),
+            'generate_summaries': self.generate_summaries,
+            'include_query_params': self.include_query_params,
+            'strip_params': self.strip_params,
+            'fold_index_files': self.fold_index_files,
+            'parser': self.parser,
+            'boilerplate': self.boilerplate is not None
+        }, sort_keys=True)
+    
+    def _extraction_code_hash(self) -> str:
+        """Hash of the code that turns a page body into page data, subclass overrides included."""
+        if self._code_hash is None:
+            crawler_class = type(self)
+            code = [PageWalker, StreamingPageWalker, CharsetResolver, PageVisitor, URLCanonicalizer]
+            code += [type(visitor) for visitor in self.page_visitors(self.base_url)]
+            code += [getattr(crawler_class, name) for name in
+                     ('normalize_url', 'is_valid_url', 'page_visitors', 'parse_page', '_page_data', 'generate_summary')]
+            self._code_hash = code_hash(code)
+        return self._code_hash
+    
+    def _extraction_key(self, url: str, body: bytes) -> str:
+        """Extraction cache key of a downloaded page."""
+        return ExtractionCache.key(self._extraction_fingerprint(), self.normalize_url(url), body)
+    
+    def generate_summary(self, content: str, max_sentences: int = 2) -> str:
+        """
+        Generate a simple extractive summary from content.
         
-        # Track visited URLs and queue for BFS
-        self.visited_urls: Set[str] = set()
-        self.queue = deque([(base_url, 0)])  # (url, depth)
-        self.pages_data: List[Dict] = []
+        Args:
+            content: Text content to summarize
+            max_sentences: Maximum number of sentences to include
+            
+        Returns:
+            Summary string
+        """
+        if not content:
+            return ""
         
-        # Session for connection pooling
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (compatible; WebsiteCrawler/1.0; +ethical-scraping)'
-        })
+        # Split into sentences (simple approach)
+        sentences = re.split(r'[.!?]+\s+', content)
+        
+        # Filter out very short sentences and clean
+        sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
+        
+        if not sentences:
+            # Fallback: take first 150 characters
+            return content[:150].strip() + "..."
+        
+        # Take the first N meaningful sentences
+        summary_sentences = sentences[:max_sentences]
+        summary = '. '.join(summary_sentences)
+        
+        # Ensure it ends with proper punctuation
+        if summary and summary[-1] not in '.!?':
+            summary += '.'
+        
+        return summary
     
-    def normalize_url(self, url: str) -> str:
+    def _apply_crawl_delay(self, host: str, rules: RobotsRules):
+        """Cap a host's request rate at its robots.txt Crawl-delay."""
+        if rules.crawl_delay and rules.crawl_delay > 0:
+            self.scheduler.limit_rate(host, 1.0 / rules.crawl_delay)
+    
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None, stream: bool = False,
+              sequence: Optional[int] = None) -> requests.Response:
         """
-        Normalize URL by removing fragments and optionally query parameters.
+        Fetch a URL through the fetcher as soon as the politeness scheduler allows it.
+        
+        Throttling responses (429/503) are retried after the server's
+        Retry-After delay, or an exponential backoff if none is given. The
+        host is paused for that delay even when no retry follows here (the
+        last attempt, or a delay over max_retry_after); the throttling
+        response is then returned and the page goes to the retry queue.
         
         Args:
-            url: URL to normalize
+            url: URL to fetch
+            headers: Extra request headers (e.g. conditional-GET validators)
+            stream: Leave the body unread so the caller can stream it
+            sequence: Crawl position of the page, passed on to sequenced fetchers
             
         Returns:
-            Normalized URL string
+            The HTTP response (redirects already followed)
         """
-        parsed = urlparse(url)
+        host = urlparse(url).netloc
+        extra = {'sequence': sequence} if sequence is not None else {}
         
-        # Remove fragment
-        if not self.include_query_params:
-            # Remove query params too
-            normalized = urlunparse((
-                parsed.scheme,
-                parsed.netloc,
-                parsed.path,
-                '',  # params
-                '',  # query
-                ''   # fragment
-            ))
-        else:
-            normalized = urlunparse((
-                parsed.scheme,
-                parsed.netloc,
-                parsed.path,
-                parsed.params,
-                parsed.query,
-                ''  # fragment
-            ))
+        # Offline fetchers don't load any server, so they run at full speed
+        if not getattr(self.fetcher, 'polite', True):
+            return self.fetcher.get(url, headers=headers, timeout=self.timeout,
+                                    allow_redirects=True, stream=stream, **extra)
         
-        # Remove trailing slash for consistency (except for root)
-        if normalized.endswith('/') and len(parsed.path) > 1:
-            normalized = normalized[:-1]
+        for attempt in range(self.max_throttle_retries + 1):
+            self.scheduler.acquire(host)
+            started = time.monotonic()
+            try:
+                response = self.fetcher.get(url, headers=headers, timeout=self.timeout,
+                                            allow_redirects=True, stream=stream, **extra)
+            except requests.exceptions.Timeout:
+                self.scheduler.record_timeout(host)
+                raise
+            finally:
+                self.scheduler.release(host)
             
-        return normalized
+            self.scheduler.record_response(host, time.monotonic() - started, response.status_code)
+            
+            if response.status_code not in AdaptivePolitenessScheduler.THROTTLE_STATUS_CODES:
+                break
+            
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = 2.0 ** attempt
+            self.scheduler.pause(host, delay)
+            if attempt == self.max_throttle_retries or delay > self.max_retry_after:
+                print(f"⏳ HTTP {response.status_code}, pausing {host} for {delay:.1f}s: {url}")
+                break
+            
+            print(f"⏳ HTTP {response.status_code}, retrying in {delay:.1f}s: {url}")
+            response.close()
+        
+        return response
     
-    def is_valid_url(self, url: str) -> bool:
+    def read_body(self, response: requests.Response, url: str,
+                  walker: Optional[StreamingPageWalker] = None) -> Optional[bytes]:
         """
-        Check if URL is valid and belongs to the same domain.
+        Download a streamed response body, giving up as soon as it exceeds the size cap.
+        
+        With a walker, decoded chunks are fed to it as they arrive, and the
+        raw body is only kept if the HTTP cache needs it.
         
         Args:
-            url: URL to validate
+            response: Response fetched with stream=True
+            url: URL of the page (for messages)
+            walker: Streaming extractor to feed (None to return the body for parsing)
             
         Returns:
-            True if URL should be crawled
+            Raw bytes, or None if the page is too large
         """
-        try:
-            parsed = urlparse(url)
+        declared = response.headers.get('Content-Length', '')
+        if declared.isdigit() and int(declared) > self.max_page_bytes:
+            print(f"⚠️  Skipping oversized page ({int(declared) // 1024} KB): {url}")
+            return None
+        
+        stream_decoder = None
+        if walker is not None:
+            stream_decoder = IncrementalPageDecoder(response.headers.get('Content-Type', ''), url, self.charsets)
+        
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > self.max_page_bytes:
+                print(f"⚠️  Abandoned page larger than {self.max_page_bytes // 1024} KB: {url}")
+                return None
+            if walker is not None:
+                walker.feed(stream_decoder.decode(chunk))
+                if not self.http_cache:
+                    continue
+            chunks.append(chunk)
+        
+        if walker is not None:
+            walker.feed(stream_decoder.decode(b'', final=True))
+        return b''.join(chunks)
+    
+    def parse_page(self, url: str, raw_body: bytes, text: Optional[str] = None, status_code: int = 200) -> Dict:
+        """
+        Extract title, content, summary, headings and links from a downloaded page.
+        
+        This is the network-free half of scrape_page, also used to re-extract
+        pages from a WARC archive.
+        
+        Args:
+            url: URL the page was fetched from
+            raw_body: Page body as downloaded
+            text: Decoded body (default: decoded here by self.charsets)
+            status_code: HTTP status of the response
             
-            # Must have same domain
-            if parsed.netloc != self.domain:
-                return False
+        Returns:
+            Dictionary with page data
+        """
+        if text is None:
+            text = self.charsets.decode(url, raw_body) if isinstance(raw_body, bytes) else raw_body
+        
+        if self.streaming:
+            walker = StreamingPageWalker(self.page_visitors(url))
+            walker.feed(text)
+            return self._page_data(url, walker.close(), status_code)
+        
+        parser = self.parser
+        soup = BeautifulSoup(text, parser)
+        
+        # Title, headings, content and links in one traversal
+        extracted = PageWalker(self.page_visitors(url)).walk(soup)
+        if parser != REFERENCE_PARSER and self._take_parser_check():
+            extracted = self._check_parser(url, text, parser, extracted)
+        return self._page_data(url, extracted, status_code)
+    
+    def _page_data(self, url: str, extracted: Dict, status_code: int) -> Dict:
+        """
+        Assemble a page's data from the extraction results.
+        
+        Args:
+            url: URL the page was fetched from
+            extracted: Visitor name -> result, from a PageWalker or StreamingPageWalker
+            status_code: HTTP status of the response
             
-            # Must be http or https
-            if parsed.scheme not in ['http', 'https']:
+        Returns:
+            Dictionary with page data
+        """
+        content = extracted.pop('content')['clean']
+        
+        # Generate summary if requested
+        summary = None
+        if self.generate_summaries and content:
+            summary = self.generate_summary(content)
+        
+        page_data = {
+            'url': url,
+            'title': extracted.pop('title'),
+            'content': content,
+            'links': extracted.pop('links'),
+            'status_code': status_code
+        }
+        
+        # Add optional fields
+        headings = extracted.pop('headings')
+        if summary:
+            page_data['summary'] = summary
+        if headings:
+            page_data['headings'] = headings
+        
+        # Results of any additional visitors
+        for name, value in extracted.items():
+            if value is not None:
+                page_data[name] = value
+        
+        return page_data
+    
+    def _take_parser_check(self) -> bool:
+        """Whether the next parsed page should be checked against the reference parser."""
+        with self._parser_lock:
+            if self._parser_checks_left <= 0:
                 return False
+            self._parser_checks_left -= 1
+            return True
+    
+    def _check_parser(self, url: str, markup: Union[str, bytes], parser: str, extracted: Dict) -> Dict:
+        """
+        Compare a page's extraction with the html.parser result.
+        
+        On any difference in title, content or headings the crawler switches
+        to html.parser for good, and this page uses the reference result.
+        
+        Returns:
+            The extraction result to use for the page
+        """
+        reference = PageWalker(self.page_visitors(url)).walk(BeautifulSoup(markup, REFERENCE_PARSER))
+        different = [key for key in ('title', 'content', 'headings') if extracted[key] != reference[key]]
+        if not different:
+            return extracted
+        
+        with self._parser_lock:
+            if self.parser == parser:
+                print(f"⚠️  Parser '{parser}' extracts a different {different[0]} than {REFERENCE_PARSER} on {url}; "
+                      f"switching to {REFERENCE_PARSER}")
+                self.parser = REFERENCE_PARSER
+                self._parser_checks_left = 0
+        return reference
+    
+    def scrape_page(self, url: str, parse: bool = True) -> Union[Dict, RawPage, None]:
+        """
+        Scrape a single page and extract content.
+        
+        Args:
+            url: URL to scrape
+            parse: Extract the page here; with False a downloaded page is
+                returned as a RawPage so a parse worker can extract it
             
-            # Skip common non-HTML file extensions
-            skip_extensions = [
-                '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp',
-                '.zip', '.tar', '.gz', '.mp4', '.mp3', '.avi', '.mov',
-                '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
-                '.css', '.js', '.xml', '.json', '.csv'
-            ]
+        Returns:
+            Dictionary with page data, a RawPage, or None if error
+        """
+        sequence = self._sequences.pop(url, None)
+        try:
+            # Revalidate against the cached copy when there is one
+            cache_key = self.normalize_url(url)
+            cached = self.http_cache.get(cache_key) if self.http_cache else None
+            # A result extracted with other code or settings is not reused, but its body is
+            current = cached is not None and cached['fingerprint'] == self._extraction_fingerprint()
             
-            path_lower = parsed.path.lower()
-            if any(path_lower.endswith(ext) for ext in skip_extensions):
-                return False
+            # The sitemap says the page has not changed since we cached it
+            lastmod = self.sitemap_lastmod.get(cache_key)
+            if current and lastmod is not None and lastmod <= cached['fetched_at']:
+                self.sitemap_skips += 1
+                return cached['result']
             
-            return True
+            conditional_headers = {}
+            if cached and cached['etag']:
+                conditional_headers['If-None-Match'] = cached['etag']
+            if cached and cached['last_modified']:
+                conditional_headers['If-Modified-Since'] = cached['last_modified']
             
-        except Exception:
+            # Stream so headers can be checked before the body is downloaded
+            response = self.fetch(url, headers=conditional_headers or None, stream=True, sequence=sequence)
+            walker = None
+            try:
+                if response.status_code == 304 and cached:
+                    self.http_cache.record_hit()
+                    if current:
+                        self.http_cache.touch(cache_key)
+                        return cached['result']
+                    
+                    # Unchanged, but extracted with other code or settings: extract the cached body again
+                    raw_body, content_type = cached['body'], cached['content_type']
+                    final_url, status_code = cached['result']['url'], cached['result']['status_code']
+                    etag, last_modified = cached['etag'], cached['last_modified']
+                else:
+                    response.raise_for_status()
+                    
+                    # Check if content type is HTML
+                    content_type = response.headers.get('Content-Type', '')
+                    if 'text/html' not in content_type:
+                        return None
+                    
+                    # Links resolve against (and the page is stored under) where a redirect led
+                    final_url = self.final_url(url, response.url)
+                    status_code = response.status_code
+                    etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    
+                    # In streaming mode the page is extracted while it downloads
+                    walker = StreamingPageWalker(self.page_visitors(final_url)) if self.streaming else None
+                    raw_body = self.read_body(response, url, walker)
+            finally:
+                response.close()
+            
+            if raw_body is None:
+                return None
+            page = RawPage(url, raw_body, content_type, status_code, etag, last_modified, final_url)
+            
+            # A byte-identical page was extracted before with the same code and settings
+            extraction_key = self._extraction_key(final_url, raw_body) if self.extraction_cache else None
+            page_data = self.extraction_cache.get(extraction_key) if extraction_key else None
+            if page_data is not None:
+                extraction_key = None
+            elif walker is not None:
+                page_data = self._page_data(final_url, walker.close(), status_code)
+            elif not parse:
+                return page
+            else:
+                text = self.charsets.decode(final_url, raw_body, content_type)
+                page_data = self.parse_page(final_url, raw_body, text, status_code)
+            
+            self._cache_page(page, page_data, extraction_key)
+            return page_data
+            
+        except requests.exceptions.Timeout:
+            print(f"⚠️  Timeout: {url}")
+            self._failures[url] = ("Timeout", True, None)
+            return None
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code
+            print(f"⚠️  HTTP Error {status}: {url}")
+            # A throttled page is not retried before the server said it may be
+            retry_after = None
+            if status in AdaptivePolitenessScheduler.THROTTLE_STATUS_CODES:
+                retry_after = parse_retry_after(e.response.headers.get('Retry-After'))
+            self._failures[url] = (f"HTTP {status}", status in RETRYABLE_STATUS_CODES, retry_after)
+            return None
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️  Error: {url} - {str(e)}")
+            self._failures[url] = (str(e), True, None)
+            return None
+        except Exception as e:
+            print(f"⚠️  Unexpected error: {url} - {str(e)}")
+            import traceback
+            traceback.print_exc()
+            self._failures[url] = (f"Unexpected error: {e}", False, None)
+            return None
+    
+    def final_url(self, url: str, response_url: Optional[str]) -> str:
+        """
+        URL a fetched page is stored under.
+        
+        Args:
+            url: Requested URL
+            response_url: URL of the response, after any redirects
+            
+        Returns:
+            The response URL if a redirect led to another page of the site,
+            else the requested URL
+        """
+        if response_url:
+            final = self.normalize_url(response_url)
+            if final != self.normalize_url(url) and urlparse(final).netloc == self.domain:
+                return response_url
+        return url
+    
+    def _cache_page(self, page: RawPage, page_data: Dict, extraction_key: Optional[str] = None):
+        """
+        Store a downloaded page and its extraction result in the caches.
+        
+        Args:
+            page: The page as it was downloaded
+            page_data: Page data extracted from it
+            extraction_key: Extraction cache key, if the result is not cached yet
+        """
+        if extraction_key:
+            self.extraction_cache.put(extraction_key, page_data)
+        if self.http_cache:
+            self.http_cache.put(
+                self.normalize_url(page.url),
+                page.etag,
+                page.last_modified,
+                page.body,
+                page.content_type,
+                page_data,
+                self._extraction_fingerprint()
+            )
+    
+    def _claim_url(self, url: str, depth: int) -> bool:
+        """
+        Decide whether a dequeued URL should be scraped, marking it visited.
+        
+        Args:
+            url: URL taken from the queue
+            depth: Crawl depth the URL was discovered at
+            
+        Returns:
+            True if the URL is within the depth limit and not yet visited
+        """
+        # Check depth limit
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        
+        # Skip if already visited
+        normalized = self.normalize_url(url)
+        if normalized in self.visited_urls:
             return False
+        
+        # The start URL and resumed frontiers never went through is_valid_url
+        if self.respect_robots and not self.robots.allowed(url):
+            print(f"🤖 Disallowed by robots.txt: {url}")
+            return False
+        
+        self.visited_urls.add(normalized)
+        if self.checkpoint:
+            self._visited_since_checkpoint.append(normalized)
+        return True
     
-    def extract_links(self, soup: BeautifulSoup, current_url: str) -> List[str]:
+    def _record_page(self, page_data: Dict, depth: int, url: Optional[str] = None):
+        """
+        Store a scraped page and queue its new links one level deeper.
+        
+        Args:
+            page_data: Dictionary returned by scrape_page
+            depth: Crawl depth of the scraped page
+            url: URL that was requested for the page (default: the page's URL)
+        """
+        # Save page data (remove links from stored data)
+        links = page_data.pop('links', [])
+        if not self._merge_aliases(page_data, url or page_data['url']):
+            return
+        if self.query_params is not None:
+            self.query_params.observe(self.normalize_url(page_data['url']), QueryParamLearner.content_hash(page_data))
+        if self.boilerplate is not None:
+            self._strip_boilerplate(page_data, learn=True)
+        self.pages_data.append(page_data)
+        
+        # Add new links to the frontier (it ignores anything already queued)
+        for link in links:
+            self._queue_link(self.normalize_url(link), depth + 1)
+    
+    def _queue_link(self, url: str, depth: int):
+        """
+        Queue a discovered link, unless it looks like a crawler trap.
+        
+        Args:
+            url: Normalized URL
+            depth: Crawl depth the link was found at
+        """
+        if self.traps is None or url in self.frontier:
+            self.frontier.push(url, depth)
+            return
+        
+        reason = self.traps.cut_link(url)
+        if reason:
+            # Never looked at again, so each trap URL is counted once
+            self.frontier.mark_seen(url)
+            if self.traps.cut[reason] == 1:
+                print(f"🪤 Skipping links that look like a crawler trap ({reason}): {url}")
+            return
+        
+        deferred = self.traps.defer_link(url)
+        if deferred and self.traps.deferred[TrapDetector.pattern(url)] == 1:
+            print(f"🪤 Deferring further links like {url} ({self.traps.pattern_cap} of the same pattern queued)")
+        self.frontier.push(url, depth, deferred=deferred)
+    
+    def _merge_aliases(self, page_data: Dict, url: str) -> bool:
+        """
+        Map a redirected or canonicalized page onto the one record kept for it.
+        
+        A redirect target counts as visited, so it is not fetched again. A
+        page is a duplicate if its final URL is already stored, or if it declares
+        a rel="canonical" URL that is stored with the same title and
+        content; duplicates only add their URL to the redirect map. A
+        canonical URL pointing at different content is ignored, since such
+        declarations are often wrong. If the canonical page is fetched after
+        a copy that declared it, the stored copy takes the canonical URL and
+        the copy's URL becomes the alias.
+        
+        Args:
+            page_data: Scraped page (its 'canonical' entry is removed)
+            url: URL that was requested for the page
+            
+        Returns:
+            True if the page should be stored
+        """
+        canonical = page_data.pop('canonical', None)
+        page_url = page_data['url']
+        normalized = self.normalize_url(page_url)
+        
+        # Concurrent crawls can fetch a redirect target before the redirect is committed
+        record = self._records.get(normalized)
+        if page_url != url:
+            self.redirects[url] = record[1] if record else page_url
+            if normalized not in self.visited_urls:
+                self.visited_urls.add(normalized)
+                if self.checkpoint:
+                    self._visited_since_checkpoint.append(normalized)
+            self.frontier.mark_seen(normalized)
+        if record:
+            self.duplicates += 1
+            return False
+        
+        content_hash = QueryParamLearner.content_hash(page_data)
+        record = self._records.get(canonical) if canonical and canonical != normalized else None
+        if record and record[0] == content_hash:
+            self.redirects[page_url] = record[1]
+            self._records[normalized] = record
+            self.duplicates += 1
+            return False
+        
+        claimant = self._canonical_claims.pop(normalized, None)
+        record = self._records.get(claimant) if claimant else None
+        if record and record[0] == content_hash:
+            self._rename_record(record[1], page_url)
+            self.duplicates += 1
+            return False
+        
+        if canonical and canonical != normalized and canonical not in self._records:
+            self._canonical_claims.setdefault(canonical, normalized)
+        self._records[normalized] = (content_hash, page_url)
+        return True
+    
+    def _rename_record(self, old_url: str, new_url: str):
+        """
+        Store a kept page under another URL, keeping its old URL as an alias.
+        
+        Args:
+            old_url: URL the page is stored under
+            new_url: URL to store it under instead
+        """
+        for page_data in self.pages_data:
+            if page_data['url'] == old_url:
+                page_data['url'] = new_url
+        for normalized, (content_hash, url) in self._records.items():
+            if url == old_url:
+                self._records[normalized] = (content_hash, new_url)
+        self._records[self.normalize_url(new_url)] = self._records[self.normalize_url(old_url)]
+        for alias, url in self.redirects.items():
+            if url == old_url:
+                self.redirects[alias] = new_url
+        self.redirects[old_url] = new_url
+    
+    def _index_records(self):
+        """Rebuild the stored-page index used by _merge_aliases from pages_data."""
+        self._records = {self.normalize_url(page_data['url']): (QueryParamLearner.content_hash(page_data), page_data['url'])
+                         for page_data in self.pages_data}
+    
+    def _strip_boilerplate(self, page_data: Dict, learn: bool = False):
+        """
+        Remove known boilerplate blocks from a page's content and headings.
+        
+        Args:
+            page_data: Page to clean (changed in place)
+            learn: Count the page's blocks first (for newly scraped pages)
+        """
+        host = urlparse(page_data['url']).netloc
+        content = page_data['content']
+        hashes = self.boilerplate.learn(host, content) if learn else None
+        stripped = self.boilerplate.strip(host, content, hashes)
+        if stripped != content:
+            page_data['content'] = stripped
+            if self.generate_summaries:
+                summary = self.generate_summary(stripped) if stripped else None
+                if summary:
+                    page_data['summary'] = summary
+                else:
+                    page_data.pop('summary', None)
+        
+        if page_data.get('headings'):
+            headings = [heading for heading in page_data['headings']
+                        if not self.boilerplate.is_boilerplate(host, f"{'#' * heading['level']} {heading['text']}")]
+            if headings:
+                page_data['headings'] = headings
+            else:
+                del page_data['headings']
+    
+    def remove_boilerplate(self):
+        """
+        Strip boilerplate from every page scraped so far.
+        
+        Pages scraped before a block was recognized as boilerplate still
+        contain it; this sweep (run at the end of a crawl) catches them.
+        """
+        if self.boilerplate is None:
+            return
+        for page_data in self.pages_data:
+            self._strip_boilerplate(page_data)
+    
+    def _next_task(self) -> Optional[Tuple[str, int, int]]:
+        """
+        Pick the next URL to scrape: a due retry first, otherwise the frontier.
+        
+        Returns:
+            (url, depth, attempts so far), or None if nothing is ready yet
+        """
+        retry = self.retries.pop_ready()
+        if retry:
+            return retry
+        while self.frontier:
+            url, depth = self.frontier.pop()
+            if self._claim_url(url, depth):
+                return url, depth, 0
+        return None
+    
+    def _announce_task(self, url: str, depth: int, attempts: int):
+        """Count a newly scraped page and print its progress line."""
+        # Tasks are announced in the order their pages are committed
+        if getattr(self.fetcher, 'sequenced', False):
+            self._sequences[url] = next(self._task_order)
+        if attempts:
+            print(f"🔁 Retry {attempts + 1}/{self.retries.max_attempts} (depth {depth}): {url}")
+        else:
+            self.page_count += 1
+            print(f"📄 [{self.page_count}] Scraping (depth {depth}): {url}")
+    
+    def _record_failure(self, url: str, depth: int, attempts: int):
+        """
+        Schedule a retry for a failed page, or dead-letter it.
+        
+        Args:
+            url: URL whose scrape returned nothing
+            depth: Crawl depth of the URL
+            attempts: Attempts made so far, including the one that just failed
+        """
+        failure = self._failures.pop(url, None)
+        if failure is None:
+            # Skipped on purpose (non-HTML, oversized), not a failure
+            return
+        reason, retryable, retry_after = failure
+        
+        if retryable:
+            delay = max(self.retries.backoff(attempts), retry_after) if retry_after else None
+            delay = self.retries.schedule(url, depth, attempts, delay)
+            if delay is not None:
+                print(f"⏳ Retrying in {delay:.1f}s ({reason}): {url}")
+                return
+        
+        self.failed.append({'url': url, 'depth': depth, 'attempts': attempts, 'reason': reason})
+        print(f"☠️  Giving up after {attempts} attempt(s) ({reason}): {url}")
+    
+    def _describe_rate(self) -> str:
+        """Human-readable summary of the politeness settings."""
+        rps = self.scheduler.requests_per_second
+        if not rps or rps <= 0:
+            return "Rate limit=none"
+        description = f"Rate limit={rps:.2f} req/s per host, burst={self.scheduler.burst}"
+        if isinstance(self.scheduler, AdaptivePolitenessScheduler):
+            description = (f"Rate limit=adaptive {self.scheduler.min_rate:.2f}-{self.scheduler.max_rate:.2f} "
+                           f"req/s per host (starting at {rps:.2f}), burst={self.scheduler.burst}")
+        if self.scheduler.max_in_flight:
+            description += f", max in-flight={self.scheduler.max_in_flight}"
+        return description
+    
+    def crawl(self) -> List[Dict]:
         """
-        Extract all internal links from a page.
+        Perform the full crawl starting from base_url.
         
-        Args:
-            soup: BeautifulSoup object of the page
-            current_url: Current page URL for resolving relative links
-            
         Returns:
-            List of absolute URLs
+            List of dictionaries containing page data
         """
-        links = []
+        print(f"\n🚀 Starting crawl of: {self.base_url}")
+        print(f"⚙️  Settings: {self._describe_rate()}, Max depth={'unlimited' if self.max_depth is None else self.max_depth}")
+        print("-" * 70)
         
-        for anchor in soup.find_all('a', href=True):
-            href = anchor.get('href', '').strip()
-            
-            if not href or href.startswith('#'):
+        self._start_crawl()
+        
+        while self.frontier or self.retries:
+            task = self._next_task()
+            if task is None:
+                # Only retries are left and none is due yet
+                time.sleep(self.retries.wait_time())
                 continue
             
-            # Convert to absolute URL
-            absolute_url = urljoin(current_url, href)
+            current_url, depth, attempts = task
+            self._current = task
+            
+            # Progress update
+            self._announce_task(current_url, depth, attempts)
             
-            # Normalize and validate
-            normalized = self.normalize_url(absolute_url)
+            # Scrape the page
+            page_data = self.scrape_page(current_url)
             
-            if self.is_valid_url(normalized):
-                links.append(normalized)
+            if page_data:
+                self._record_page(page_data, depth, current_url)
+            else:
+                self._record_failure(current_url, depth, attempts + 1)
+            self._current = None
+            if not attempts:
+                self._maybe_checkpoint()
+        
+        self.remove_boilerplate()
+        print("-" * 70)
+        print(f"✅ Crawl complete! Scraped {len(self.pages_data)} pages successfully.")
+        self._print_crawl_stats()
         
-        return links
+        return self.pages_data
     
-    def extract_content(self, soup: BeautifulSoup) -> Dict[str, str]:
+    def _in_progress(self) -> List[Tuple[str, int, int]]:
+        """(url, depth, attempts) of every page being scraped but not yet recorded."""
+        return [self._current] if self._current else []
+    
+    def _pending_urls(self) -> List[Tuple[str, int]]:
+        """(url, depth) pairs claimed as visited but not yet recorded."""
+        return [(url, depth) for url, depth, attempts in self._in_progress() if not attempts]
+    
+    def _checkpoint_meta(self) -> Dict:
+        """Metadata stored alongside each checkpoint."""
+        # Retries that are running right now are saved as still queued
+        running = [{'url': url, 'depth': depth, 'attempts': attempts}
+                   for url, depth, attempts in self._in_progress() if attempts]
+        return {
+            'base_url': self.base_url,
+            'page_count': self.page_count,
+            'retries': running + self.retries.snapshot(),
+            'failed': self.failed,
+            'redirects': self.redirects,
+            'duplicates': self.duplicates,
+            'canonical_claims': self._canonical_claims,
+            'boilerplate': self.boilerplate.snapshot() if self.boilerplate is not None else {},
+            'query_params': self.query_params.snapshot() if self.query_params is not None else {},
+            'traps': self.traps.snapshot() if self.traps is not None else {}
+        }
+    
+    def _restore_checkpoint_meta(self, meta: Dict):
+        """Restore crawler state from checkpoint metadata."""
+        self.page_count = meta.get('page_count', 0)
+        for entry in meta.get('retries', []):
+            self.retries.schedule(entry['url'], entry['depth'], entry['attempts'], delay=0.0)
+        self.failed = meta.get('failed', [])
+        self.redirects = meta.get('redirects', {})
+        self.duplicates = meta.get('duplicates', 0)
+        self._canonical_claims = meta.get('canonical_claims', {})
+        # Stored pages are append-only, so pages renamed to their canonical URL are renamed again here
+        for page_data in self.pages_data:
+            page_data['url'] = self.redirects.get(page_data['url'], page_data['url'])
+        self._index_records()
+        if self.query_params is not None:
+            self.query_params.restore(meta.get('query_params', {}))
+        if self.traps is not None:
+            self.traps.restore(meta.get('traps', {}))
+        if self.boilerplate is not None:
+            # Block counts are rebuilt from the saved pages; known boilerplate is gone from those
+            self.boilerplate.restore(meta.get('boilerplate', {}))
+            for page_data in self.pages_data:
+                self.boilerplate.learn(urlparse(page_data['url']).netloc, page_data['content'])
+    
+    def _start_crawl(self):
+        """Prepare a fresh crawl: clear stale checkpoints and seed from sitemaps."""
+        if self._resumed:
+            return
+        if self.checkpoint:
+            self.checkpoint.reset()
+            self._pages_checkpointed = len(self.pages_data)
+        if self.use_sitemaps:
+            self.seed_from_sitemaps()
+    
+    def seed_from_sitemaps(self) -> int:
         """
-        Extract clean text content from a page, removing navigation and repeated elements.
+        Queue every in-scope sitemap URL at depth 1, using <priority> as a hint.
+        
+        With an HTTP cache, <lastmod> is remembered so pages unchanged since
+        they were cached are reused without a request.
         
-        Args:
-            soup: BeautifulSoup object of the page
-            
         Returns:
-            Dictionary with 'raw' and 'clean' content versions
+            Number of URLs added to the frontier
         """
-        # Create a copy to preserve original
-        content_soup = BeautifulSoup(str(soup), 'html.parser')
-        
-        # Remove unwanted elements
-        unwanted_tags = [
-            'script', 'style', 'meta', 'link', 'noscript',
-            'header', 'footer', 'nav', 'aside',
-            'iframe', 'embed', 'object'
-        ]
-        for tag in unwanted_tags:
-            for element in content_soup.find_all(tag):
-                element.decompose()
-        
-        # Remove elements with common navigation/menu classes and IDs
-        # Use word boundaries to avoid false positives (e.g., "with-sidebar" is not "sidebar")
-        navigation_patterns = [
-            r'\bnav\b', r'\bmenu\b', r'\bsidebar\b', r'\bheader\b', r'\bfooter\b',
-            r'\bbreadcrumb', r'\bpagination\b', r'\bsocial\b', r'\bwidget\b'
-        ]
+        reader = SitemapReader(self)
+        added = 0
         
-        for element in content_soup.find_all(True):
-            # Skip if not a tag element (e.g., NavigableString)
-            if not hasattr(element, 'attrs') or element.attrs is None:
+        for entry in reader.entries():
+            url = self.normalize_url(entry['url'])
+            if not self.is_valid_url(url):
                 continue
-            
-            # Check class and id attributes
-            classes = element.get('class', [])
-            elem_id = element.get('id', '')
-            
-            # Convert to strings for pattern matching
-            class_str = ' '.join(classes).lower() if classes else ''
-            id_str = elem_id.lower() if elem_id else ''
-            
-            # Remove if matches navigation patterns (with word boundaries)
-            import re as regex_module
-            combined_str = f"{class_str} {id_str}"
-            if any(regex_module.search(pattern, combined_str) for pattern in navigation_patterns):
-                # Don't remove if it's a wrapper (contains "-wrapper" or "with-")
-                if 'wrapper' not in combined_str and 'with-' not in combined_str:
-                    element.decompose()
-        
-        # Extract main content - prioritize main content areas
-        main_content = None
-        for tag in ['main', 'article', '[role="main"]']:
-            main_content = content_soup.find(tag)
-            if main_content:
-                break
+            if self.http_cache and entry['lastmod'] is not None:
+                self.sitemap_lastmod[url] = entry['lastmod']
+            if self.frontier.push(url, 1, hint=entry['priority']):
+                added += 1
         
-        # If no main content area found, use body or the whole soup
-        if not main_content:
-            main_content = content_soup.find('body') or content_soup
-        
-        # Extract structured text with preserved formatting
-        clean_parts = []
+        print(f"🗺️  Seeded {added} URLs from {reader.sitemaps_read} sitemap(s)")
+        return added
+    
+    def _maybe_checkpoint(self):
+        """Save a checkpoint every `checkpoint_interval` scraped pages."""
+        if self.checkpoint and self.page_count % self.checkpoint_interval == 0:
+            self.save_checkpoint()
+    
+    def save_checkpoint(self):
+        """
+        Durably save the frontier, visited set and collected pages.
         
-        # Extract headings and paragraphs in order
-        for element in main_content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'ul', 'ol', 'blockquote', 'div']):
-            text = element.get_text(separator=' ', strip=True)
-            # Skip if element is just a container with other block elements
-            if element.name == 'div' and element.find(['div', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                continue
-            if text and len(text) > 15:  # Filter out very short snippets
-                # Add markdown-style formatting
-                if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    level = int(element.name[1])
-                    clean_parts.append(f"{'#' * level} {text}")
-                elif element.name in ['ul', 'ol']:
-                    # Extract list items
-                    for li in element.find_all('li', recursive=False):
-                        li_text = li.get_text(separator=' ', strip=True)
-                        if li_text:
-                            clean_parts.append(f"• {li_text}")
-                elif element.name == 'blockquote':
-                    clean_parts.append(f"> {text}")
-                else:
-                    clean_parts.append(text)
+        Pages that are still being scraped go back into the saved frontier
+        (and stay out of the saved visited set), so they are fetched again
+        on resume.
+        """
+        if not self.checkpoint:
+            return
         
-        # Join and clean up
-        clean_text = '\n\n'.join(clean_parts)
+        pending = self._pending_urls()
+        pending_keys = {self.normalize_url(url) for url, _ in pending}
+        new_visited = [url for url in self._visited_since_checkpoint if url not in pending_keys]
         
-        # Remove duplicate consecutive lines (common in nav/footer remnants)
-        lines = clean_text.split('\n')
-        deduplicated_lines = []
-        prev_line = None
+        self.checkpoint.save(
+            frontier=pending + self.frontier.snapshot(),
+            new_visited=new_visited,
+            new_pages=self.pages_data[self._pages_checkpointed:],
+            meta=self._checkpoint_meta()
+        )
         
-        for line in lines:
-            line = line.strip()
-            if line and line != prev_line:
-                deduplicated_lines.append(line)
-                prev_line = line
+        self._visited_since_checkpoint = [url for url in self._visited_since_checkpoint if url in pending_keys]
+        self._pages_checkpointed = len(self.pages_data)
+    
+    def resume(self) -> bool:
+        """
+        Load the saved checkpoint so crawl() continues where it stopped.
         
-        clean_text = '\n'.join(deduplicated_lines)
+        Returns:
+            True if a checkpoint for this base URL was found and loaded
+        """
+        state = self.checkpoint.load() if self.checkpoint else None
+        if not state or state['meta'].get('base_url') != self.base_url:
+            return False
         
-        # Normalize excessive whitespace
-        clean_text = re.sub(r'\n{3,}', '\n\n', clean_text)
-        clean_text = re.sub(r'[ \t]+', ' ', clean_text)
-        clean_text = clean_text.strip()
+        self.visited_urls = self._make_url_set()
+        self.frontier.clear()
+        for url in state['visited']:
+            self.visited_urls.add(url)
+            self.frontier.mark_seen(url)
+        for url, depth in state['frontier']:
+            self.frontier.push(url, depth)
+        self.pages_data = state['pages']
+        self._restore_checkpoint_meta(state['meta'])
         
-        # Also extract raw text (simpler version for fallback)
-        raw_text = main_content.get_text(separator=' ', strip=True)
-        raw_text = re.sub(r'\s+', ' ', raw_text).strip()
+        self._pages_checkpointed = len(self.pages_data)
+        self._visited_since_checkpoint = []
+        self._resumed = True
         
-        return {
-            'clean': clean_text,
-            'raw': raw_text
-        }
+        print(f"⏯️  Resuming: {len(self.pages_data)} pages scraped, "
+              f"{len(self.visited_urls)} URLs visited, {len(self.frontier)} queued")
+        return True
     
-    def generate_summary(self, content: str, max_sentences: int = 2) -> str:
+    def retry_failed(self, pages: List[Dict], failed: List[Dict]):
         """
-        Generate a simple extractive summary from content.
+        Prepare crawl() to re-fetch only the failed URLs of an earlier run.
+        
+        The earlier pages are kept and count as visited, so recovered pages
+        only lead to links the earlier run never reached.
         
         Args:
-            content: Text content to summarize
-            max_sentences: Maximum number of sentences to include
-            
-        Returns:
-            Summary string
+            pages: pages_data of the earlier run (e.g. loaded from its JSON output)
+            failed: Dead-letter entries of the earlier run (see save_failed)
         """
-        if not content:
-            return ""
-        
-        # Split into sentences (simple approach)
-        sentences = re.split(r'[.!?]+\s+', content)
-        
-        # Filter out very short sentences and clean
-        sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
-        
-        if not sentences:
-            # Fallback: take first 150 characters
-            return content[:150].strip() + "..."
+        self.pages_data = list(pages)
+        self._index_records()
+        self.frontier.clear()
+        for url in [page['url'] for page in pages] + [entry['url'] for entry in failed]:
+            normalized = self.normalize_url(url)
+            self.visited_urls.add(normalized)
+            self.frontier.mark_seen(normalized)
         
-        # Take the first N meaningful sentences
-        summary_sentences = sentences[:max_sentences]
-        summary = '. '.join(summary_sentences)
+        # A fresh attempt budget for every URL, starting right away
+        for entry in failed:
+            self.retries.schedule(entry['url'], entry.get('depth', 0), 0, delay=0.0)
         
-        # Ensure it ends with proper punctuation
-        if summary and summary[-1] not in '.!?':
-            summary += '.'
+        # Nothing to seed: the crawl consists of the retries alone
+        self._resumed = True
+        print(f"🔁 Retrying {len(failed)} failed URLs on top of {len(pages)} scraped pages")
+    
+    def _print_crawl_stats(self):
+        """Report cache reuse and frontier overflow at the end of a crawl."""
+        if self.http_cache and self.http_cache.hits:
+            print(f"♻️  {self.http_cache.hits} unchanged pages reused from cache (304 Not Modified)")
+        if self.extraction_cache and self.extraction_cache.hits:
+            print(f"♻️  {self.extraction_cache.hits} byte-identical pages reused without parsing")
+        if self.sitemap_skips:
+            print(f"♻️  {self.sitemap_skips} pages skipped as unchanged according to sitemap lastmod")
+        if self.robots.blocked:
+            print(f"🤖 {self.robots.blocked} links skipped because robots.txt disallows them")
+        if self.charsets.counts['detected']:
+            print(f"🔤 {self.charsets.counts['detected']} pages declared no usable charset and needed detection")
+        if self.boilerplate is not None and self.boilerplate.removed:
+            print(f"🧹 {self.boilerplate.removed} repeated template blocks removed "
+                  f"({len(self.boilerplate)} distinct)")
+        if self.query_params is not None and self.query_params.irrelevant:
+            print(f"🧪 {sum(map(len, self.query_params.irrelevant.values()))} query parameters ignored as irrelevant:")
+            for pattern, names in sorted(self.query_params.irrelevant.items()):
+                print(f"   {pattern}: {', '.join(sorted(names))}")
+        if self.traps is not None and (self.traps.cut or self.traps.deferred):
+            print(f"🪤 {sum(self.traps.cut.values())} likely crawler-trap links dropped, "
+                  f"{sum(self.traps.deferred.values())} deferred:")
+            for reason, count in sorted(self.traps.cut.items()):
+                print(f"   {reason}: {count} (e.g. {self.traps.examples[reason][0]})")
+            for pattern, count in sorted(self.traps.deferred.items(), key=lambda item: -item[1]):
+                print(f"   {pattern}: {count} deferred beyond the first {self.traps.pattern_cap}")
+        if self.redirects:
+            print(f"🔀 {len(self.redirects)} redirected or canonical URLs mapped to stored pages "
+                  f"({self.duplicates} duplicates not stored)")
+        if self.frontier.dropped:
+            print(f"⚠️  {self.frontier.dropped} links dropped because the queue was full (--max-queue-size)")
+        if self.failed:
+            print(f"☠️  {len(self.failed)} pages failed permanently or after {self.retries.max_attempts} attempts")
+    
+    def close(self):
+        """Release network, cache and checkpoint resources."""
+        self.fetcher.close()
+        if self.http_cache:
+            self.http_cache.close()
+        if self.extraction_cache:
+            self.extraction_cache.close()
+        if self.checkpoint:
+            self.checkpoint.close()
+    
+    def _worker_options(self) -> Dict:
+        """Options for the crawler a parse worker process builds."""
+        return {
+            'base_url': self.base_url,
+            'include_query_params': self.include_query_params,
+            'strip_params': self.strip_params,
+            'fold_index_files': self.fold_index_files,
+            'generate_summaries': self.generate_summaries,
+            'parser': self.parser,
+            # Checks are counted here and handed out with the jobs (see _worker_job)
+            'parser_check_pages': 0,
+            'streaming': self.streaming,
+            'boilerplate_pages': self.boilerplate.min_pages if self.boilerplate is not None else None,
+            'boilerplate_share': self.boilerplate.min_share if self.boilerplate is not None else 0.5
+        }
+    
+    def _worker_job(self, url: str, body: bytes, content_type: str, status_code: int) -> Tuple:
+        """
+        A parse worker job for a downloaded page, naming the parser to use.
         
-        return summary
+        Parser checks are taken here, in crawl order, so there are
+        parser_check_pages of them in total rather than per worker.
+        """
+        check = self.parser != REFERENCE_PARSER and self._take_parser_check()
+        return (url, body, content_type, status_code, self.parser, check)
     
-    def scrape_page(self, url: str) -> Dict:
+    def _worker_page(self, job: Tuple, result: Tuple[Dict, str, str]) -> Dict:
         """
-        Scrape a single page and extract content.
+        Page data from a parse worker's result, taken in crawl order.
+        
+        When a worker's check found its parser extracting differently, the
+        crawler switches to html.parser for good, and with it the extraction
+        cache fingerprint. Later pages that were already parsed with the
+        dropped parser are parsed again here, as a single process would have.
+        That is done by a crawler set up like a worker's, so it does not
+        check robots.txt either.
         
         Args:
-            url: URL to scrape
-            
-        Returns:
-            Dictionary with page data or None if error
+            job: The job from _worker_job
+            result: (page data, parser used, parser to use from now on) from _parse_job
         """
-        try:
-            response = self.session.get(url, timeout=self.timeout, allow_redirects=True)
-            response.raise_for_status()
-            
-            # Check if content type is HTML
-            content_type = response.headers.get('Content-Type', '')
-            if 'text/html' not in content_type:
-                return None
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract title (prefer h1, fallback to title tag)
-            title = None
-            h1_tag = soup.find('h1')
-            if h1_tag:
-                title = h1_tag.get_text(strip=True)
-            else:
-                title_tag = soup.find('title')
-                title = title_tag.get_text(strip=True) if title_tag else 'No Title'
-            
-            # Extract main content
-            content_data = self.extract_content(soup)
-            content = content_data['clean']
-            
-            # Generate summary if requested
-            summary = None
-            if self.generate_summaries and content:
-                summary = self.generate_summary(content)
-            
-            # Extract headings for metadata
-            headings = []
-            for i in range(1, 4):  # Only h1-h3 for cleaner output
-                for heading in soup.find_all(f'h{i}'):
-                    heading_text = heading.get_text(strip=True)
-                    if heading_text and len(heading_text) > 3:
-                        headings.append({
-                            'level': i,
-                            'text': heading_text
-                        })
-            
-            # Extract links for crawling
-            links = self.extract_links(soup, url)
-            
-            page_data = {
-                'url': url,
-                'title': title,
-                'content': content,
-                'links': links,
-                'status_code': response.status_code
-            }
-            
-            # Add optional fields
-            if summary:
-                page_data['summary'] = summary
-            if headings:
-                page_data['headings'] = headings
-            
-            return page_data
-            
-        except requests.exceptions.Timeout:
-            print(f"⚠️  Timeout: {url}")
-            return None
-        except requests.exceptions.HTTPError as e:
-            print(f"⚠️  HTTP Error {e.response.status_code}: {url}")
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️  Error: {url} - {str(e)}")
-            return None
-        except Exception as e:
-            print(f"⚠️  Unexpected error: {url} - {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
+        page_data, used, parser = result
+        if parser != used:
+            with self._parser_lock:
+                self.parser = parser
+                self._parser_checks_left = 0
+        elif used != self.parser:
+            with self._parser_lock:
+                if self._reparser is None:
+                    self._reparser = type(self)(fetcher=ReplayFetcher({}), respect_robots=False,
+                                                **self._worker_options())
+                page_data = _parse_with(self._reparser, job[:4] + (self.parser, False))[0]
+        return page_data
     
-    def crawl(self) -> List[Dict]:
+    def reextract(self, warc_path: str, workers: Optional[int] = None) -> List[Dict]:
         """
-        Perform the full crawl starting from base_url.
+        Rebuild pages_data by re-running extraction over a recorded WARC archive.
         
+        No requests are made: every HTML page in the archive goes through
+        parse_page again, spread over `workers` processes. Pages come out
+        in crawl order (their Crawl-Sequence, else archive order), so the
+        result is the pages_data of the recorded crawl, sequential or
+        concurrent. Pages served from the HTTP cache are not in the archive.
+        The parser_check_pages checked pages are parsed first, so the rest
+        is parsed once, with the parser the checks settled on.
+        
+        Args:
+            warc_path: Archive written with a .warc/.warc.gz recording
+            workers: Number of parser processes (default: one per CPU core)
+            
         Returns:
             List of dictionaries containing page data
         """
-        print(f"\n🚀 Starting crawl of: {self.base_url}")
-        print(f"⚙️  Settings: Rate limit={self.rate_limit}s, Max depth={'unlimited' if self.max_depth is None else self.max_depth}")
-        print("-" * 70)
-        
-        page_count = 0
+        print(f"\n♻️  Re-extracting pages from: {warc_path}")
         
-        while self.queue:
-            current_url, depth = self.queue.popleft()
-            
-            # Check depth limit
-            if self.max_depth is not None and depth > self.max_depth:
+        pages = []
+        origin = None
+        for record in read_warc(warc_path):
+            # A page fetch is recorded as its redirect hops followed by the final response
+            if 300 <= record['status'] < 400:
+                origin = origin or record['url']
                 continue
+            url, origin = origin or record['url'], None
             
-            # Skip if already visited
-            normalized = self.normalize_url(current_url)
-            if normalized in self.visited_urls:
+            content_type = record['headers'].get('Content-Type', '')
+            if record['status'] < 400 and 'text/html' in content_type:
+                pages.append((url, record, content_type))
+        
+        # Downloads of a concurrent crawl are archived as they finish, not in crawl order
+        pages.sort(key=lambda page: -1 if page[1]['sequence'] is None else page[1]['sequence'])
+        
+        downloads = []
+        seen = set()
+        for url, record, content_type in pages:
+            normalized = self.normalize_url(url)
+            if urlparse(normalized).netloc != self.domain or len(record['body']) > self.max_page_bytes:
                 continue
-            
-            self.visited_urls.add(normalized)
-            page_count += 1
-            
-            # Polite delay
-            if page_count > 1:
-                time.sleep(self.rate_limit)
-            
-            # Progress update
-            print(f"📄 [{page_count}] Scraping (depth {depth}): {current_url}")
-            
-            # Scrape the page
-            page_data = self.scrape_page(current_url)
-            
-            if page_data:
-                # Save page data (remove links from stored data)
-                links = page_data.pop('links', [])
-                self.pages_data.append(page_data)
-                
-                # Add new links to queue
-                for link in links:
-                    normalized_link = self.normalize_url(link)
-                    if normalized_link not in self.visited_urls:
-                        self.queue.append((normalized_link, depth + 1))
+            if normalized in seen:
+                continue
+            seen.add(normalized)
+            downloads.append((url, self.final_url(url, record['url']), record['body'], content_type, record['status']))
         
-        print("-" * 70)
-        print(f"✅ Crawl complete! Scraped {len(self.pages_data)} pages successfully.")
+        options = self._worker_options()
+        workers = workers or os.cpu_count() or 1
+        started = time.monotonic()
+        pool = None
+        if workers == 1 or len(downloads) < 2:
+            _init_parse_worker(type(self), options)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_parse_worker,
+                                       initargs=(type(self), options))
+        
+        def parse(batch):
+            jobs = [(url, self._worker_job(*download)) for url, *download in batch]
+            if pool is None:
+                results = [_reextract_page(job) for url, job in jobs]
+            else:
+                results = list(pool.map(_reextract_page, [job for url, job in jobs],
+                                        chunksize=max(1, len(jobs) // (workers * 4))))
+            # In crawl order, so a failed check switches the parser for the rest (see _worker_page)
+            return [(url, self._worker_page(job, result) if result else None)
+                    for (url, job), result in zip(jobs, results)]
+        
+        try:
+            checked = self._parser_checks_left if self.parser != REFERENCE_PARSER else 0
+            extracted = parse(downloads[:checked])
+            extracted += parse(downloads[checked:])
+        finally:
+            if pool is not None:
+                pool.shutdown()
         
+        self.pages_data = []
+        for url, page_data in extracted:
+            if page_data is None:
+                continue
+            page_data.pop('links', None)
+            if self._merge_aliases(page_data, url):
+                self.pages_data.append(page_data)
+        if self.boilerplate is not None:
+            # Learn in crawl order, as a crawl would, then sweep
+            for page_data in self.pages_data:
+                self._strip_boilerplate(page_data, learn=True)
+            self.remove_boilerplate()
+        print(f"✅ Re-extracted {len(self.pages_data)} pages with {workers} worker(s) "
+              f"in {time.monotonic() - started:.1f}s")
         return self.pages_data
     
     def save_json(self, filename: str = 'site_content.json'):
@@ -467,6 +4580,26 @@ class WebsiteCrawler:
             json.dump(self.pages_data, f, indent=2, ensure_ascii=False)
         print(f"💾 Saved JSON data to: {filename}")
     
+    def save_failed(self, filename: str = 'site_content_failed.json'):
+        """Save the dead-lettered URLs with their failure reasons (removes a stale file if none)."""
+        if not self.failed:
+            if os.path.exists(filename):
+                os.remove(filename)
+            return
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.failed, f, indent=2, ensure_ascii=False)
+        print(f"💾 Saved {len(self.failed)} failed URLs to: {filename}")
+    
+    def save_redirects(self, filename: str = 'site_content_redirects.json'):
+        """Save the map of redirected and duplicate canonical URLs (removes a stale file if none)."""
+        if not self.redirects:
+            if os.path.exists(filename):
+                os.remove(filename)
+            return
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.redirects, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"💾 Saved {len(self.redirects)} URL aliases to: {filename}")
+    
     def save_markdown(self, filename: str = 'site_content.md'):
         """Save scraped data to a combined Markdown file."""
         with open(filename, 'w', encoding='utf-8') as f:
@@ -480,51 +4613,281 @@ class WebsiteCrawler:
                 f.write(f"## Page {i}: {page['title']}\n\n")
                 f.write(f"**URL:** {page['url']}\n\n")
                 
-                # Write summary if present
-                if page.get('summary'):
-                    f.write(f"**Summary:** {page['summary']}\n\n")
+                # Write summary if present
+                if page.get('summary'):
+                    f.write(f"**Summary:** {page['summary']}\n\n")
+                
+                # Write headings if present
+                if page.get('headings'):
+                    f.write("**Headings:**\n")
+                    for heading in page['headings']:
+                        indent = "  " * (heading['level'] - 1)
+                        f.write(f"{indent}- {heading['text']}\n")
+                    f.write("\n")
+                
+                f.write("**Content:**\n\n")
+                f.write(f"{page['content']}\n\n")
+                f.write("---\n\n")
+        
+        print(f"💾 Saved Markdown file to: {filename}")
+    
+    def save_individual_markdown_files(self, output_dir: str = 'scraped_pages'):
+        """Save each page as a separate Markdown file."""
+        import os
+        
+        # Create output directory
+        os.makedirs(output_dir, exist_ok=True)
+        
+        for i, page in enumerate(self.pages_data, 1):
+            # Create safe filename from title
+            safe_title = re.sub(r'[^\w\s-]', '', page['title'])
+            safe_title = re.sub(r'[-\s]+', '-', safe_title)
+            safe_title = safe_title.strip('-').lower()
+            
+            filename = f"{i:03d}_{safe_title[:50]}.md"
+            filepath = os.path.join(output_dir, filename)
+            
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(f"# {page['title']}\n\n")
+                f.write(f"**URL:** {page['url']}\n\n")
+                
+                if page.get('summary'):
+                    f.write(f"**Summary:** {page['summary']}\n\n")
+                
+                f.write("---\n\n")
+                f.write(page['content'])
+        
+        print(f"💾 Saved {len(self.pages_data)} individual Markdown files to: {output_dir}/")
+
+
+class AsyncWebsiteCrawler(WebsiteCrawler):
+    """
+    Concurrent crawler that fetches several pages at once using asyncio.
+    
+    Up to `concurrency` pages are fetched in parallel on a thread pool, but
+    results are committed strictly in queue order. Depth assignment, link
+    discovery and the resulting pages_data are therefore identical to a
+    sequential crawl of the same site.
+    
+    With `parse_workers`, the fetch threads only download pages and parsing
+    runs on a pool of worker processes, so parse-heavy sites use every core
+    instead of contending for the GIL.
+    """
+    
+    def __init__(self, base_url: str, concurrency: int = 8, parse_workers: int = 0, **kwargs):
+        """
+        Initialize the crawler.
+        
+        Args:
+            base_url: Starting URL to crawl
+            concurrency: Maximum number of pages fetched at the same time (default: 8)
+            parse_workers: Processes that parse downloaded pages; 0 parses on the
+                fetch threads (default: 0). Ignored in streaming mode, which
+                parses while downloading.
+            **kwargs: Any WebsiteCrawler option (rate_limit, max_depth, ...)
+        """
+        super().__init__(base_url, **kwargs)
+        self.concurrency = max(1, concurrency)
+        self.parse_workers = 0 if self.streaming else max(0, parse_workers)
+        
+        # One pooled connection per worker so parallel requests don't queue
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.concurrency,
+            pool_maxsize=self.concurrency
+        )
+        self.fetcher.mount('http://', adapter)
+        self.fetcher.mount('https://', adapter)
+        
+        # [url, depth, attempts, future, raw_page] for every started but uncommitted
+        # page; raw_page is set once the page has been handed to a parse worker
+        self._window = deque()
+        self._committed = 0
+    
+    def _in_progress(self) -> List[Tuple[str, int, int]]:
+        """(url, depth, attempts) of every started but uncommitted fetch."""
+        return [(url, depth, attempts) for url, depth, attempts, *_ in self._window]
+    
+    def crawl(self) -> List[Dict]:
+        """
+        Perform the full crawl starting from base_url with concurrent fetches.
+            
+        Returns:
+            List of dictionaries containing page data
+        """
+        print(f"\n🚀 Starting crawl of: {self.base_url}")
+        print(f"⚙️  Settings: {self._describe_rate()}, Concurrency={self.concurrency}, "
+              f"Parse workers={self.parse_workers or 'none'}, "
+              f"Max depth={'unlimited' if self.max_depth is None else self.max_depth}")
+        print("-" * 70)
+        
+        asyncio.run(self._crawl_async())
+        self.remove_boilerplate()
+        
+        print("-" * 70)
+        print(f"✅ Crawl complete! Scraped {len(self.pages_data)} pages successfully.")
+        self._print_crawl_stats()
+        
+        return self.pages_data
+    
+    async def _crawl_async(self):
+        """
+        Run the crawl loop, keeping up to `concurrency` fetches in flight.
+        
+        Started fetches are held in a window in the order they left the queue.
+        Only the finished prefix of the window is committed, so links are
+        queued in exactly the order a sequential crawl would queue them.
+        Checkpoints are taken after commits and treat the uncommitted window
+        as part of the frontier.
+        
+        With parse workers, a downloaded page stays in the window until one
+        of `2 * parse_workers` parse slots is free. No new fetch starts while
+        all slots are taken, so a slow parse stage throttles downloading
+        instead of piling up page bodies in memory.
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        pool = None
+        if self.parse_workers:
+            pool = ProcessPoolExecutor(max_workers=self.parse_workers, initializer=_init_parse_worker,
+                                       initargs=(type(self), self._worker_options()))
+        max_parsing = self.parse_workers * 2
+        window = self._window
+        window_size = self.concurrency * 4
+        self._start_crawl()
+        
+        def downloaded(entry) -> bool:
+            """True for a fetched page still waiting for a parse slot."""
+            return entry[4] is None and entry[3].done() and isinstance(entry[3].result(), RawPage)
+        
+        try:
+            while self.frontier or window or self.retries:
+                # Hand downloaded pages to free parse slots, oldest first
+                parsing = sum(1 for entry in window if entry[4] is not None and not entry[3].done())
+                for entry in window:
+                    if parsing >= max_parsing:
+                        break
+                    if downloaded(entry):
+                        entry[4] = entry[3].result()
+                        entry[3] = asyncio.wrap_future(pool.submit(_parse_job, self._worker_job(*entry[4].job())))
+                        parsing += 1
+                
+                in_flight = sum(1 for entry in window if entry[4] is None and not entry[3].done())
+                has_room = (in_flight < self.concurrency and len(window) < window_size
+                            and (pool is None or parsing < max_parsing))
                 
-                # Write headings if present
-                if page.get('headings'):
-                    f.write("**Headings:**\n")
-                    for heading in page['headings']:
-                        indent = "  " * (heading['level'] - 1)
-                        f.write(f"{indent}- {heading['text']}\n")
-                    f.write("\n")
+                # Start new fetches while there are free workers
+                while has_room:
+                    task = self._next_task()
+                    if task is None:
+                        break
+                    
+                    current_url, depth, attempts = task
+                    self._announce_task(current_url, depth, attempts)
+                    
+                    future = loop.run_in_executor(executor, self.scrape_page, current_url, pool is None)
+                    window.append([current_url, depth, attempts, future, None])
+                    in_flight += 1
+                    has_room = in_flight < self.concurrency and len(window) < window_size
                 
-                f.write("**Content:**\n\n")
-                f.write(f"{page['content']}\n\n")
-                f.write("---\n\n")
-        
-        print(f"💾 Saved Markdown file to: {filename}")
+                if not window:
+                    # Only retries are left and none is due yet
+                    await asyncio.sleep(self.retries.wait_time())
+                    continue
+                
+                # Wait for progress if the oldest page is still being fetched or parsed
+                if not window[0][3].done() or downloaded(window[0]):
+                    running = [entry[3] for entry in window if not entry[3].done()]
+                    # Wake up for a due retry as well, if there are free workers for it
+                    timeout = self.retries.wait_time() if self.retries and has_room else None
+                    await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                # Commit the finished prefix in order
+                while window and window[0][3].done() and not downloaded(window[0]):
+                    current_url, depth, attempts, future, raw_page = window.popleft()
+                    if raw_page is None:
+                        page_data = future.result()
+                    else:
+                        page_data = self._parsed_page(raw_page, future)
+                    if page_data:
+                        self._record_page(page_data, depth, current_url)
+                    else:
+                        self._record_failure(current_url, depth, attempts + 1)
+                    self._committed += 1
+                    if self.checkpoint and self._committed % self.checkpoint_interval == 0:
+                        self.save_checkpoint()
+        finally:
+            executor.shutdown(wait=True)
+            if pool is not None:
+                pool.shutdown(wait=True)
     
-    def save_individual_markdown_files(self, output_dir: str = 'scraped_pages'):
-        """Save each page as a separate Markdown file."""
-        import os
+    def _parsed_page(self, raw_page: RawPage, future: asyncio.Future) -> Optional[Dict]:
+        """
+        Collect a parse worker's result for a downloaded page.
         
-        # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
+        Workers do not check robots.txt, so their links are filtered here.
         
-        for i, page in enumerate(self.pages_data, 1):
-            # Create safe filename from title
-            safe_title = re.sub(r'[^\w\s-]', '', page['title'])
-            safe_title = re.sub(r'[-\s]+', '-', safe_title)
-            safe_title = safe_title.strip('-').lower()
-            
-            filename = f"{i:03d}_{safe_title[:50]}.md"
-            filepath = os.path.join(output_dir, filename)
+        Args:
+            raw_page: The page as it was downloaded
+            future: The finished parse job
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(f"# {page['title']}\n\n")
-                f.write(f"**URL:** {page['url']}\n\n")
-                
-                if page.get('summary'):
-                    f.write(f"**Summary:** {page['summary']}\n\n")
-                
-                f.write("---\n\n")
-                f.write(page['content'])
+        Returns:
+            Dictionary with page data or None if parsing failed
+        """
+        try:
+            page_data = self._worker_page(raw_page.job(), future.result())
+        except Exception as e:
+            print(f"⚠️  Unexpected error: {raw_page.url} - {str(e)}")
+            self._failures[raw_page.url] = (f"Unexpected error: {e}", False, None)
+            return None
+        if self.respect_robots:
+            page_data['links'] = [link for link in page_data['links'] if self.robots.allowed(link)]
+        extraction_key = self._extraction_key(raw_page.final_url, raw_page.body) if self.extraction_cache else None
+        self._cache_page(raw_page, page_data, extraction_key)
+        return page_data
+
+
+# Per-process crawler used by reextract() and parse_workers processes
+_worker_crawler = None
+
+
+def _init_parse_worker(crawler_class: type, options: Dict):
+    """Create the parser used by this worker process."""
+    global _worker_crawler
+    _worker_crawler = crawler_class(fetcher=ReplayFetcher({}), respect_robots=False, **options)
+
+
+def _parse_job(job: Tuple[str, bytes, str, int, str, bool]) -> Tuple[Dict, str, str]:
+    """
+    Parse one downloaded page (runs in a worker process).
+    
+    Args:
+        job: (url, body, content_type, status_code, parser, check against html.parser)
         
-        print(f"💾 Saved {len(self.pages_data)} individual Markdown files to: {output_dir}/")
+    Returns:
+        (page data, parser used, parser to use from now on)
+    """
+    return _parse_with(_worker_crawler, job)
+
+
+def _parse_with(crawler: WebsiteCrawler, job: Tuple[str, bytes, str, int, str, bool]) -> Tuple[Dict, str, str]:
+    """Parse one downloaded page with a crawler built like _init_parse_worker's (see _parse_job)."""
+    url, body, content_type, status_code, parser, check = job
+    crawler.parser = parser
+    crawler._parser_checks_left = 1 if check else 0
+    text = crawler.charsets.decode(url, body, content_type)
+    return crawler.parse_page(url, body, text, status_code), parser, crawler.parser
+
+
+def _reextract_page(job: Tuple[str, bytes, str, int, str, bool]) -> Optional[Tuple[Dict, str, str]]:
+    """Parse one archived page (runs in a worker process)."""
+    url = job[0]
+    try:
+        result = _parse_job(job)
+    except Exception as e:
+        print(f"⚠️  Could not re-extract: {url} - {str(e)}")
+        return None
+    result[0].pop('links', None)
+    return result
 
 
 def main():
@@ -546,8 +4909,52 @@ Examples:
   # Custom output with query params included
   python scrape_site.py https://example.com --output my_site --include-query-params
   
+  # Paginated shop: keep ?page=, ignore the sort order, fold /index.html into /
+  python scrape_site.py https://shop.example.com --include-query-params --strip-param sort --fold-index-files
+  
   # JSON only for programmatic use
   python scrape_site.py https://example.com --json-only
+  
+  # Fetch up to 8 pages in parallel at 4 requests/second
+  python scrape_site.py https://example.com --concurrency 8 --requests-per-second 4
+  
+  # Parse-heavy site: download on 8 threads, parse on 4 processes
+  python scrape_site.py https://example.com --concurrency 8 --parse-workers 4
+  
+  # Let the crawler find the fastest safe rate on its own
+  python scrape_site.py https://example.com --concurrency 8 --adaptive
+  
+  # Reach blog posts and heavily linked pages first
+  python scrape_site.py https://example.com --priority weighted --url-weight '/blog/=2'
+  
+  # Million-page crawl with a compact visited set
+  python scrape_site.py https://docs.example.com --visited-set bloom --expected-urls 2000000
+  
+  # Discover pages from sitemaps too; with a cache, unchanged lastmod skips the request
+  python scrape_site.py https://example.com --use-sitemaps --http-cache site_cache.sqlite
+  
+  # Continue a crawl that was interrupted (Ctrl-C, crash, restart)
+  python scrape_site.py https://example.com --resume
+  
+  # Weekly refresh that only re-downloads pages that changed
+  python scrape_site.py https://example.com --http-cache site_cache.sqlite
+  
+  # Server without ETags: skip parsing pages whose HTML did not change
+  python scrape_site.py https://example.com --extraction-cache extractions.sqlite
+  
+  # Re-fetch only the pages listed in site_content_failed.json
+  python scrape_site.py https://example.com --retry-failed
+  
+  # Crawl the generated site straight from disk, no server needed
+  python scrape_site.py https://susantish.com --source-dir website
+  
+  # Record a crawl once, then replay it offline at full speed
+  python scrape_site.py https://example.com --record example.jsonl
+  python scrape_site.py https://example.com --replay example.jsonl
+  
+  # Archive raw responses as WARC, then re-run extraction on all cores in seconds
+  python scrape_site.py https://example.com --record example.warc.gz
+  python scrape_site.py https://example.com --reextract example.warc.gz
         """
     )
     
@@ -560,7 +4967,41 @@ Examples:
         '--rate-limit',
         type=float,
         default=1.5,
-        help='Seconds to wait between requests (default: 1.5)'
+        help='Minimum seconds between requests to the same host (default: 1.5)'
+    )
+    
+    parser.add_argument(
+        '--requests-per-second',
+        type=float,
+        default=None,
+        help='Requests per second allowed per host (overrides --rate-limit)'
+    )
+    
+    parser.add_argument(
+        '--burst',
+        type=int,
+        default=1,
+        help='Requests a host may receive back-to-back after being idle (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=None,
+        help='Maximum concurrent requests per host (default: unlimited)'
+    )
+    
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='Tune the request rate automatically from server latency and 429/503 responses'
+    )
+    
+    parser.add_argument(
+        '--max-requests-per-second',
+        type=float,
+        default=10.0,
+        help='Upper bound for the adaptive request rate (default: 10)'
     )
     
     parser.add_argument(
@@ -570,12 +5011,60 @@ Examples:
         help='Maximum crawl depth (default: unlimited)'
     )
     
+    parser.add_argument(
+        '--no-trap-detection',
+        action='store_true',
+        help='Follow every link, even ones that look like crawler traps '
+             '(repeating paths, endless calendars, very deep paths)'
+    )
+    
+    parser.add_argument(
+        '--max-path-segments',
+        type=int,
+        default=12,
+        metavar='N',
+        help='Skip links whose path has more than N segments (default: 12, 0 for no limit)'
+    )
+    
+    parser.add_argument(
+        '--trap-pattern-cap',
+        type=int,
+        default=200,
+        metavar='N',
+        help='Crawl links beyond the first N of one URL pattern (path with numbers generalized '
+             'and query parameter names) only after everything else (default: 200, 0 for no cap)'
+    )
+    
     parser.add_argument(
         '--include-query-params',
         action='store_true',
         help='Treat URLs with different query parameters as unique pages'
     )
     
+    parser.add_argument(
+        '--strip-param',
+        action='append',
+        default=[],
+        metavar='NAME',
+        help='Query parameter to ignore with --include-query-params, on top of the built-in '
+             'utm_*/fbclid/session list; \'*\' wildcards allowed (repeatable)'
+    )
+    
+    parser.add_argument(
+        '--query-param-samples',
+        type=int,
+        default=3,
+        metavar='N',
+        help='With --include-query-params, ignore a parameter once N URL variants differing only in it '
+             'showed the same content, and none differed (default: 3, 0 to disable)'
+    )
+    
+    parser.add_argument(
+        '--fold-index-files',
+        action='store_true',
+        help='Treat /dir/index.html, index.php, default.aspx, ... as the same page as /dir'
+    )
+    
     parser.add_argument(
         '--timeout',
         type=int,
@@ -583,6 +5072,212 @@ Examples:
         help='Request timeout in seconds (default: 10)'
     )
     
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Number of pages to fetch in parallel (default: 1, sequential crawl)'
+    )
+    
+    parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=0,
+        metavar='N',
+        help='Parse pages on N worker processes while the fetch threads keep downloading '
+             '(default: 0, parse on the fetch threads)'
+    )
+    
+    parser.add_argument(
+        '--http-cache',
+        default=None,
+        metavar='FILE',
+        help='SQLite cache file; recrawls revalidate pages with ETag/Last-Modified and reuse unchanged ones'
+    )
+    
+    parser.add_argument(
+        '--extraction-cache',
+        default=None,
+        metavar='FILE',
+        help='SQLite cache file; pages that come back byte-identical reuse their extraction without parsing'
+    )
+    
+    parser.add_argument(
+        '--checkpoint-interval',
+        type=int,
+        default=50,
+        help='Save a resumable checkpoint every N pages (default: 50, 0 to disable)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue an interrupted crawl from its last checkpoint'
+    )
+    
+    parser.add_argument(
+        '--priority',
+        choices=CrawlFrontier.STRATEGIES,
+        default='bfs',
+        help='Order in which queued pages are crawled (default: bfs)'
+    )
+    
+    parser.add_argument(
+        '--url-weight',
+        action='append',
+        default=[],
+        metavar='REGEX=WEIGHT',
+        help='Crawl URLs matching REGEX earlier with --priority weighted (repeatable)'
+    )
+    
+    parser.add_argument(
+        '--max-queue-size',
+        type=int,
+        default=None,
+        help='Maximum number of queued URLs; further links are dropped (default: unlimited)'
+    )
+    
+    parser.add_argument(
+        '--visited-set',
+        choices=VISITED_SET_KINDS,
+        default='exact',
+        help='How visited URLs are remembered: exact strings, 64-bit hashes or a Bloom filter (default: exact)'
+    )
+    
+    parser.add_argument(
+        '--expected-urls',
+        type=int,
+        default=1000000,
+        help='Expected number of URLs, used to size hashed/bloom visited sets (default: 1000000)'
+    )
+    
+    parser.add_argument(
+        '--false-positive-rate',
+        type=float,
+        default=0.001,
+        help='Bloom filter false-positive rate (default: 0.001)'
+    )
+    
+    parser.add_argument(
+        '--use-sitemaps',
+        action='store_true',
+        help='Seed the crawl from robots.txt/sitemap.xml sitemaps (finds orphan pages)'
+    )
+    
+    parser.add_argument(
+        '--ignore-robots',
+        action='store_true',
+        help='Do not apply robots.txt rules or Crawl-delay (only for sites you own)'
+    )
+    
+    parser.add_argument(
+        '--robots-ttl',
+        type=float,
+        default=3600.0,
+        help='Seconds before robots.txt is fetched again (default: 3600)'
+    )
+    
+    parser.add_argument(
+        '--max-page-size',
+        type=float,
+        default=10.0,
+        help='Abandon pages larger than this many MB while downloading (default: 10)'
+    )
+    
+    parser.add_argument(
+        '--max-attempts',
+        type=int,
+        default=3,
+        help='Attempts per page before a timeout, connection error or 5xx is given up on (default: 3)'
+    )
+    
+    parser.add_argument(
+        '--retry-backoff',
+        type=float,
+        default=2.0,
+        help='Seconds before retrying a failed page; doubles with each attempt (default: 2)'
+    )
+    
+    parser.add_argument(
+        '--retry-failed',
+        action='store_true',
+        help='Only re-fetch the URLs in <output>_failed.json and add them to <output>.json'
+    )
+    
+    parser.add_argument(
+        '--source-dir',
+        default=None,
+        metavar='DIR',
+        help='Serve pages from a local directory instead of the network (e.g. website/)'
+    )
+    
+    parser.add_argument(
+        '--replay',
+        default=None,
+        metavar='FILE',
+        help='Serve pages from a recording made with --record instead of the network'
+    )
+    
+    parser.add_argument(
+        '--record',
+        default=None,
+        metavar='FILE',
+        help='Record every response to FILE for later --replay (.warc/.warc.gz for a WARC archive)'
+    )
+    
+    parser.add_argument(
+        '--reextract',
+        default=None,
+        metavar='WARC',
+        help='Rebuild the output from a WARC recording with the current extractor, without crawling'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Parser processes for --reextract (default: one per CPU core)'
+    )
+    
+    parser.add_argument(
+        '--parser',
+        choices=('auto',) + PARSER_BACKENDS,
+        default='auto',
+        help='HTML parser backend (default: auto, lxml when installed and html.parser otherwise)'
+    )
+    
+    parser.add_argument(
+        '--parser-check-pages',
+        type=int,
+        default=5,
+        help='Pages also parsed with html.parser to confirm the chosen backend extracts the same (default: 5)'
+    )
+    
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help='Extract pages while they download, without building a parse tree '
+             '(low memory on huge pages; same output as --parser html.parser)'
+    )
+    
+    parser.add_argument(
+        '--boilerplate-pages',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Remove content blocks repeated across the site, e.g. cookie banners and calls to action: '
+             'blocks on N or more pages and on --boilerplate-share of them (default: off; 3 is a good start)'
+    )
+    
+    parser.add_argument(
+        '--boilerplate-share',
+        type=float,
+        default=0.5,
+        metavar='F',
+        help='Share of the site\'s pages scraped so far that a block must appear on '
+             'to count as boilerplate (default: 0.5)'
+    )
+    
     parser.add_argument(
         '--output',
         default='site_content',
@@ -614,23 +5309,114 @@ Examples:
         print("❌ Error: URL must start with http:// or https://")
         return 1
     
+    if args.source_dir and args.replay:
+        print("❌ Error: --source-dir and --replay cannot be combined")
+        return 1
+    
+    url_weights = {}
+    for spec in args.url_weight:
+        pattern, _, weight = spec.rpartition('=')
+        try:
+            url_weights[pattern] = float(weight)
+        except ValueError:
+            print(f"❌ Error: --url-weight must look like REGEX=WEIGHT, got: {spec}")
+            return 1
+    
+    # Pick the page source
+    if args.source_dir:
+        fetcher = LocalDirectoryFetcher(args.source_dir, args.url)
+    elif args.replay:
+        try:
+            fetcher = ReplayFetcher.load(args.replay)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error: could not load recording {args.replay}: {e}")
+            return 1
+    else:
+        fetcher = RequestsFetcher()
+    if args.record:
+        fetcher = RecordingFetcher(fetcher, args.record)
+    
     # Create crawler
-    crawler = WebsiteCrawler(
+    crawler_options = dict(
         base_url=args.url,
         rate_limit=args.rate_limit,
         max_depth=args.max_depth,
         include_query_params=args.include_query_params,
+        strip_params=TRACKING_PARAMS + tuple(args.strip_param),
+        fold_index_files=args.fold_index_files,
+        query_param_samples=args.query_param_samples,
+        trap_detection=not args.no_trap_detection,
+        max_path_segments=args.max_path_segments,
+        trap_pattern_cap=args.trap_pattern_cap,
         timeout=args.timeout,
-        generate_summaries=args.generate_summaries
+        generate_summaries=args.generate_summaries,
+        requests_per_second=args.requests_per_second,
+        burst=args.burst,
+        max_in_flight=args.max_in_flight,
+        adaptive=args.adaptive,
+        max_requests_per_second=args.max_requests_per_second,
+        http_cache=args.http_cache,
+        extraction_cache=args.extraction_cache,
+        checkpoint=f"{args.output}_checkpoint.sqlite" if args.checkpoint_interval > 0 else None,
+        checkpoint_interval=args.checkpoint_interval,
+        priority=args.priority,
+        url_weights=url_weights,
+        max_queue_size=args.max_queue_size,
+        visited_set=args.visited_set,
+        expected_urls=args.expected_urls,
+        false_positive_rate=args.false_positive_rate,
+        use_sitemaps=args.use_sitemaps,
+        respect_robots=not args.ignore_robots,
+        robots_ttl=args.robots_ttl,
+        max_page_bytes=int(args.max_page_size * 1024 * 1024),
+        max_attempts=args.max_attempts,
+        retry_backoff=args.retry_backoff,
+        parser=args.parser,
+        parser_check_pages=args.parser_check_pages,
+        streaming=args.streaming,
+        boilerplate_pages=args.boilerplate_pages,
+        boilerplate_share=args.boilerplate_share,
+        fetcher=fetcher
     )
     
+    failed_filename = f"{args.output}_failed.json"
+    if args.retry_failed:
+        try:
+            with open(failed_filename, 'r', encoding='utf-8') as f:
+                failed = json.load(f)
+            with open(f"{args.output}.json", 'r', encoding='utf-8') as f:
+                previous_pages = json.load(f)
+        except FileNotFoundError as e:
+            print(f"❌ Error: --retry-failed needs the output of an earlier crawl ({e.filename} not found)")
+            return 1
+    if args.retry_failed or args.reextract:
+        # Short runs that don't crawl from scratch need no checkpoint of their own
+        crawler_options['checkpoint'] = None
+    
+    if args.concurrency > 1 or args.parse_workers > 0:
+        crawler = AsyncWebsiteCrawler(concurrency=args.concurrency, parse_workers=args.parse_workers,
+                                      **crawler_options)
+    else:
+        crawler = WebsiteCrawler(**crawler_options)
+    
+    if args.retry_failed:
+        crawler.retry_failed(previous_pages, failed)
+    elif args.resume and not crawler.resume():
+        print("⚠️  No checkpoint found for this URL, starting a fresh crawl.")
+    
     # Perform crawl
     try:
-        crawler.crawl()
+        if args.reextract:
+            crawler.reextract(args.reextract, args.workers)
+        else:
+            crawler.crawl()
         
         # Save results
         json_filename = f"{args.output}.json"
         crawler.save_json(json_filename)
+        crawler.save_redirects(f"{args.output}_redirects.json")
+        if not args.reextract:
+            crawler.save_failed(failed_filename)
         
         if not args.json_only:
             md_filename = f"{args.output}.md"
@@ -639,6 +5425,13 @@ Examples:
             if args.separate_files:
                 crawler.save_individual_markdown_files(f"{args.output}_pages")
         
+        if crawler.checkpoint:
+            crawler.checkpoint.delete()
+            crawler.checkpoint = None
+        
+        if crawler.failed:
+            print(f"🔁 Retry the failed pages later with: python scrape_site.py {args.url} --retry-failed "
+                  f"--output {args.output}")
         print(f"\n✨ All done! You can now use these files for content analysis and redesign.")
         return 0
         
@@ -646,11 +5439,18 @@ Examples:
         print("\n\n⚠️  Crawl interrupted by user.")
         if crawler.pages_data:
             print(f"Saving {len(crawler.pages_data)} pages scraped so far...")
+            crawler.remove_boilerplate()
             crawler.save_json(f"{args.output}_partial.json")
+        if crawler.checkpoint:
+            crawler.save_checkpoint()
+            print(f"💾 Checkpoint saved. Continue with: python scrape_site.py {args.url} --resume "
+                  f"--output {args.output}")
         return 1
     except Exception as e:
         print(f"\n❌ Fatal error: {str(e)}")
         return 1
+    finally:
+        crawler.close()
 
 
 if __name__ == "__main__":
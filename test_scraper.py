@@ -4,9 +4,146 @@ Simple test script for the web scraper.
 Tests basic functionality with a publicly accessible test site.
 """
 
+import gzip
+import io
 import sys
 import json
-from scrape_site import WebsiteCrawler
+from scrape_site import (
+    AdaptivePolitenessScheduler,
+    AsyncWebsiteCrawler,
+    BloomURLSet,
+    BoilerplateModel,
+    CharsetResolver,
+    CrawlFrontier,
+    HashedURLSet,
+    IncrementalPageDecoder,
+    LocalDirectoryFetcher,
+    PageVisitor,
+    PageWalker,
+    PolitenessScheduler,
+    QueryParamLearner,
+    RecordingFetcher,
+    ReplayFetcher,
+    RetryQueue,
+    RobotsRules,
+    StreamingPageWalker,
+    TrapDetector,
+    URLCanonicalizer,
+    WARCWriter,
+    WebsiteCrawler,
+    parse_retry_after,
+    read_warc,
+)
+
+
+# Small in-memory site used by the offline tests below
+TEST_SITE = {
+    'https://example.com': """
+        <html><head><title>Home</title></head><body><main>
+        <h1>Welcome to the test site</h1>
+        <p>This home page links to every section of the site.</p>
+        <a href="/about">About</a> <a href="/services">Services</a> <a href="/blog">Blog</a>
+        </main></body></html>
+    """,
+    'https://example.com/about': """
+        <html><body><main><h1>About this practice</h1>
+        <p>The about page explains the history of the practice.</p>
+        <a href="/">Home</a> <a href="/contact">Contact</a>
+        </main></body></html>
+    """,
+    'https://example.com/services': """
+        <html><body><main><h1>Services offered here</h1>
+        <p>The services page lists every session that is available.</p>
+        <a href="/contact">Contact</a> <a href="/services/healing">Healing</a>
+        </main></body></html>
+    """,
+    'https://example.com/blog': """
+        <html><body><main><h1>Blog and articles</h1>
+        <p>The blog collects inspirational articles and talks.</p>
+        <a href="/blog/first-post">First post</a>
+        </main></body></html>
+    """,
+    'https://example.com/contact': """
+        <html><body><main><h1>Contact details</h1>
+        <p>Reach out by phone or email to book a session.</p>
+        </main></body></html>
+    """,
+    'https://example.com/services/healing': """
+        <html><body><main><h1>Spiritual healing</h1>
+        <p>Healing sessions are available in person and online.</p>
+        </main></body></html>
+    """,
+    'https://example.com/blog/first-post': """
+        <html><body><main><h1>The first post</h1>
+        <p>This is the very first article published on the blog.</p>
+        </main></body></html>
+    """,
+}
+
+
+class FakeResponse:
+    """Minimal stand-in for requests.Response used by the offline tests."""
+
+    def __init__(self, url, html, status_code=None, headers=None):
+        self.url = url
+        self.status_code = status_code or (200 if html is not None else 404)
+        self.headers = {'Content-Type': 'text/html; charset=utf-8'}
+        self.headers.update(headers or {})
+        self.content = html if isinstance(html, bytes) else (html or '').encode('utf-8')
+        self.raw = io.BytesIO(self.content)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(response=self)
+
+
+class FakeSession:
+    """
+    Serves TEST_SITE pages instead of touching the network.
+    
+    Values are HTML strings/bytes, or (body, headers) tuples for custom headers.
+    URLs in `redirects` answer with the page they redirect to.
+    """
+
+    def __init__(self, site, redirects=None):
+        self.site = site
+        self.redirects = redirects or {}
+        self.headers = {}
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((url, headers or {}))
+        url = self.redirects.get(url, url)
+        html = self.site.get(url)
+        if html is None:
+            return FakeResponse(url, None)
+        extra_headers = {}
+        if isinstance(html, tuple):
+            html, extra_headers = html
+        
+        # Pages are versioned by their length, which is enough for revalidation
+        etag = f'"{len(html)}"'
+        if (headers or {}).get('If-None-Match') == etag:
+            return FakeResponse(url, '', status_code=304, headers={'ETag': etag})
+        return FakeResponse(url, html, headers=dict(extra_headers, ETag=etag))
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
 
 
 def test_basic_functionality():
@@ -185,21 +322,1369 @@ def test_content_cleaning():
     return True
 
 
+def test_async_crawl_matches_sequential():
+    """Test that the concurrent crawler returns the same pages as the sequential one."""
+    print("\n" + "=" * 70)
+    print("Testing Async Crawl Engine")
+    print("=" * 70)
+    
+    sequential = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    sequential.fetcher = FakeSession(TEST_SITE)
+    expected = sequential.crawl()
+    
+    concurrent = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4)
+    concurrent.fetcher = FakeSession(TEST_SITE)
+    pages = concurrent.crawl()
+    
+    assert len(expected) == len(TEST_SITE), "❌ Sequential crawl missed pages"
+    assert pages == expected, "❌ Async crawl output differs from sequential crawl"
+    print(f"✅ Async crawl matches sequential crawl ({len(pages)} pages)")
+    
+    limited = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4, max_depth=1)
+    limited.fetcher = FakeSession(TEST_SITE)
+    urls = [page['url'] for page in limited.crawl()]
+    assert 'https://example.com/blog/first-post' not in urls, "❌ Depth limit not respected"
+    print("✅ Depth limit respected")
+
+
+
+def test_politeness_scheduler():
+    """Test that the per-host token bucket spaces out requests."""
+    print("\n" + "=" * 70)
+    print("Testing Politeness Scheduler")
+    print("=" * 70)
+    
+    import time
+    
+    scheduler = PolitenessScheduler(requests_per_second=20, burst=2)
+    start = time.monotonic()
+    for _ in range(4):
+        scheduler.acquire('example.com')
+        scheduler.release('example.com')
+    elapsed = time.monotonic() - start
+    
+    # Two requests come out of the burst, the other two wait 1/20s each
+    assert elapsed >= 0.09, f"❌ Requests were not rate limited ({elapsed:.3f}s)"
+    print(f"✅ 4 requests at 20 req/s with burst 2 took {elapsed:.3f}s")
+    
+    # Other hosts have their own bucket
+    start = time.monotonic()
+    scheduler.acquire('other.example.com')
+    scheduler.release('other.example.com')
+    assert time.monotonic() - start < 0.05, "❌ Hosts share a bucket"
+    print("✅ Each host has its own bucket")
+
+
+
+def test_adaptive_rate_control():
+    """Test AIMD rate changes and Retry-After parsing."""
+    print("\n" + "=" * 70)
+    print("Testing Adaptive Rate Control")
+    print("=" * 70)
+    
+    scheduler = AdaptivePolitenessScheduler(requests_per_second=2.0, max_rate=8.0, cooldown=0)
+    for _ in range(20):
+        scheduler.record_response('example.com', 0.1, 200)
+    fast_rate = scheduler.current_rate('example.com')
+    assert fast_rate > 2.0, "❌ Rate did not increase while latency was flat"
+    print(f"✅ Rate increased to {fast_rate:.2f} req/s on healthy responses")
+    
+    scheduler.record_response('example.com', 0.1, 503)
+    assert abs(scheduler.current_rate('example.com') - fast_rate / 2) < 1e-6, "❌ 503 did not halve the rate"
+    print("✅ Rate halved on HTTP 503")
+    
+    scheduler.record_response('example.com', 1.0, 200)
+    assert scheduler.current_rate('example.com') < fast_rate / 2, "❌ Latency spike did not slow down"
+    print("✅ Rate reduced on latency spike")
+    
+    assert parse_retry_after('120') == 120.0, "❌ Retry-After seconds not parsed"
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0, "❌ Past Retry-After date not parsed"
+    assert parse_retry_after('soon') is None, "❌ Invalid Retry-After accepted"
+    print("✅ Retry-After header parsed")
+    
+    import time
+    
+    # A Retry-After beyond max_retry_after is not waited out in place, but still honored
+    class ThrottlingSession(FakeSession):
+        def get(self, url, headers=None, **kwargs):
+            self.requests.append((url, headers or {}))
+            return FakeResponse(url, 'Slow down', status_code=429, headers={'Retry-After': '600'})
+    
+    for throttle_retries, max_retry_after in ((0, 300.0), (3, 60.0)):
+        crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, max_throttle_retries=throttle_retries,
+                                 max_retry_after=max_retry_after, respect_robots=False)
+        crawler.fetcher = ThrottlingSession({})
+        assert crawler.scrape_page("https://example.com/about") is None, "❌ Throttled page was scraped"
+        assert len(crawler.fetcher.requests) == 1, "❌ Throttled page retried in place despite the long delay"
+        paused = crawler.scheduler._paused_until['example.com'] - time.monotonic()
+        assert paused > 590, f"❌ Host paused for {paused:.1f}s instead of the Retry-After 600s"
+        crawler._record_failure("https://example.com/about", 1, 1)
+        assert crawler.retries.wait_time() > 590, "❌ Retry scheduled before the Retry-After delay"
+    print("✅ Host paused and retry deferred for the full Retry-After, also when it is not waited out")
+
+
+def test_http_cache_revalidation():
+    """Test that recrawls reuse cached extractions on 304 Not Modified."""
+    print("\n" + "=" * 70)
+    print("Testing HTTP Revalidation Cache")
+    print("=" * 70)
+    
+    import os
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, 'cache.sqlite')
+        
+        first = WebsiteCrawler(base_url="https://example.com", rate_limit=0, http_cache=cache_file)
+        first.fetcher = FakeSession(TEST_SITE)
+        expected = first.crawl()
+        first.close()
+        
+        site = dict(TEST_SITE)
+        site['https://example.com/contact'] = site['https://example.com/contact'].replace(
+            'phone or email', 'phone, email or post')
+        
+        second = WebsiteCrawler(base_url="https://example.com", rate_limit=0, http_cache=cache_file)
+        second.fetcher = FakeSession(site)
+        pages = second.crawl()
+        second.close()
+        
+        assert all('If-None-Match' in headers for url, headers in second.fetcher.requests if url in site), \
+            "❌ Recrawl did not send conditional requests"
+        print("✅ Recrawl sent If-None-Match validators")
+        
+        assert second.http_cache.hits == len(TEST_SITE) - 1, "❌ Unchanged pages were not reused"
+        print(f"✅ {second.http_cache.hits} unchanged pages reused from cache")
+        
+        contact = next(page for page in pages if page['url'].endswith('/contact'))
+        assert 'phone, email or post' in contact['content'], "❌ Changed page not re-extracted"
+        assert len(pages) == len(expected), "❌ Recrawl returned a different number of pages"
+        print("✅ Changed page re-extracted")
+        
+        # Changed settings re-extract the cached bodies, still revalidating instead of downloading
+        reference = WebsiteCrawler(base_url="https://example.com", rate_limit=0, generate_summaries=True)
+        reference.fetcher = FakeSession(site)
+        summarized = reference.crawl()
+        third = WebsiteCrawler(base_url="https://example.com", rate_limit=0, http_cache=cache_file,
+                               generate_summaries=True)
+        third.fetcher = FakeSession(site)
+        fetched_at = third.http_cache.get('https://example.com/about')['fetched_at']
+        assert third.crawl() == summarized, "❌ Cached bodies re-extracted differently than a fresh crawl"
+        assert all('If-None-Match' in headers for url, headers in third.fetcher.requests if url in site), \
+            "❌ Conditional requests dropped after a settings change"
+        assert third.http_cache.hits == len(site), "❌ Unchanged pages downloaded again after a settings change"
+        assert third.http_cache.get('https://example.com/about')['fetched_at'] > fetched_at, \
+            "❌ Revalidated page not marked as fetched"
+        third.close()
+        print("✅ Settings change re-extracts cached bodies on 304 Not Modified")
+
+
+
+def test_checkpoint_resume():
+    """Test that an interrupted crawl resumes from its checkpoint."""
+    print("\n" + "=" * 70)
+    print("Testing Checkpoint and Resume")
+    print("=" * 70)
+    
+    import os
+    import tempfile
+    
+    class InterruptingSession(FakeSession):
+        """Simulates Ctrl-C on the fourth request."""
+        
+        def get(self, url, **kwargs):
+            if len(self.requests) == 3:
+                raise KeyboardInterrupt
+            return super().get(url, **kwargs)
+    
+    reference = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    reference.fetcher = FakeSession(TEST_SITE)
+    expected = reference.crawl()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint_file = os.path.join(tmp, 'checkpoint.sqlite')
+        
+        first = WebsiteCrawler(base_url="https://example.com", rate_limit=0,
+                               checkpoint=checkpoint_file, checkpoint_interval=2)
+        first.fetcher = InterruptingSession(TEST_SITE)
+        try:
+            first.crawl()
+            assert False, "❌ Crawl was not interrupted"
+        except KeyboardInterrupt:
+            first.save_checkpoint()
+        first.close()
+        print(f"✅ Interrupted after {len(first.pages_data)} pages, checkpoint saved")
+        
+        second = WebsiteCrawler(base_url="https://example.com", rate_limit=0,
+                                checkpoint=checkpoint_file, checkpoint_interval=2)
+        second.fetcher = FakeSession(TEST_SITE)
+        assert second.resume(), "❌ Checkpoint could not be loaded"
+        pages = second.crawl()
+        second.close()
+        
+        fetched_again = [url for url, _ in second.fetcher.requests if url in TEST_SITE]
+        assert 'https://example.com' not in fetched_again, "❌ Resumed crawl started from zero"
+        assert pages == expected, "❌ Resumed crawl differs from an uninterrupted crawl"
+        print(f"✅ Resumed crawl finished with {len(pages)} pages, matching an uninterrupted crawl")
+
+
+
+def test_crawl_frontier():
+    """Test frontier deduplication, priorities and size limit."""
+    print("\n" + "=" * 70)
+    print("Testing Crawl Frontier")
+    print("=" * 70)
+    
+    frontier = CrawlFrontier()
+    for url, depth in [('/a', 1), ('/b', 1), ('/a', 2), ('/c', 2), ('/b', 2)]:
+        frontier.push(url, depth)
+    assert len(frontier) == 3, "❌ Duplicate URLs were queued"
+    assert [frontier.pop()[0] for _ in range(3)] == ['/a', '/b', '/c'], "❌ BFS order changed"
+    frontier.push('/a', 3)
+    assert not frontier, "❌ Already crawled URL was queued again"
+    print("✅ Duplicates ignored, BFS order preserved")
+    
+    frontier = CrawlFrontier(priority='inlinks')
+    for url in ['/rare', '/popular', '/popular', '/popular', '/some', '/some']:
+        frontier.push(url, 1)
+    assert [url for url, _ in frontier.snapshot()] == ['/popular', '/some', '/rare'], \
+        "❌ Inlink priority not applied"
+    print("✅ Most linked-to pages come first")
+    
+    frontier = CrawlFrontier(priority='weighted', pattern_weights={r'/blog/': 3})
+    frontier.push('/shallow', 1)
+    frontier.push('/blog/deep/post', 3)
+    assert frontier.pop()[0] == '/blog/deep/post', "❌ URL pattern weight not applied"
+    print("✅ URL pattern weights applied")
+    
+    frontier = CrawlFrontier(max_size=2)
+    for url in ['/1', '/2', '/3']:
+        frontier.push(url, 1)
+    assert len(frontier) == 2 and frontier.dropped == 1, "❌ Size limit not enforced"
+    print("✅ Size limit enforced")
+    
+    # Rediscovering queued URLs must not grow the heap behind the size limit
+    for strategy in ('inlinks', 'weighted'):
+        frontier = CrawlFrontier(strategy, max_size=10)
+        for _ in range(1000):
+            for n in range(10):
+                frontier.push(f'/page/{n}', 1)
+        assert len(frontier) == 10, "❌ Queue size changed"
+        assert len(frontier._heap) <= 2 * 10, f"❌ Heap bloated to {len(frontier._heap)} items ({strategy})"
+        assert [frontier.pop()[0] for _ in range(10)] == [f'/page/{n}' for n in range(10)], \
+            f"❌ Order lost after rebuilding the heap ({strategy})"
+    print("✅ Re-linked URLs keep the heap within twice the size limit")
+
+
+def test_compact_visited_sets():
+    """Test the hashed and Bloom visited sets."""
+    print("\n" + "=" * 70)
+    print("Testing Compact Visited Sets")
+    print("=" * 70)
+    
+    urls = [f"https://example.com/page/{i}" for i in range(5000)]
+    others = [f"https://example.com/other/{i}" for i in range(5000)]
+    
+    hashed = HashedURLSet(expected_urls=100)
+    for url in urls + urls[:10]:
+        hashed.add(url)
+    assert len(hashed) == len(urls), "❌ Hashed set miscounted"
+    assert all(url in hashed for url in urls), "❌ Hashed set lost a URL"
+    assert not any(url in hashed for url in others), "❌ Hashed set reported an unseen URL"
+    print("✅ Hashed set grows and stays exact")
+    
+    bloom = BloomURLSet(expected_urls=len(urls), false_positive_rate=0.01)
+    for url in urls:
+        bloom.add(url)
+    assert all(url in bloom for url in urls), "❌ Bloom filter lost a URL"
+    false_positives = sum(url in bloom for url in others)
+    assert false_positives < len(others) * 0.03, f"❌ Too many false positives ({false_positives})"
+    print(f"✅ Bloom filter: {false_positives / len(others):.2%} false positives at a 1% target")
+    
+    expected = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    expected.fetcher = FakeSession(TEST_SITE)
+    compact = WebsiteCrawler(base_url="https://example.com", rate_limit=0,
+                             visited_set='hashed', expected_urls=100)
+    compact.fetcher = FakeSession(TEST_SITE)
+    assert compact.crawl() == expected.crawl(), "❌ Crawl with hashed visited set differs"
+    print("✅ Crawl with hashed visited set matches exact crawl")
+
+
+
+def test_sitemap_seeding():
+    """Test sitemap discovery, nested indexes, gzip sitemaps and lastmod skips."""
+    print("\n" + "=" * 70)
+    print("Testing Sitemap Seeding")
+    print("=" * 70)
+    
+    import os
+    import tempfile
+    
+    namespace = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    site = dict(TEST_SITE)
+    site['https://example.com/robots.txt'] = "User-agent: *\nSitemap: https://example.com/sitemap_index.xml\n"
+    site['https://example.com/sitemap_index.xml'] = f"""<?xml version="1.0"?>
+        <sitemapindex {namespace}>
+          <sitemap><loc>https://example.com/pages.xml</loc></sitemap>
+          <sitemap><loc>https://example.com/posts.xml.gz</loc></sitemap>
+        </sitemapindex>"""
+    site['https://example.com/pages.xml'] = f"""<?xml version="1.0"?>
+        <urlset {namespace}>
+          <url><loc>https://example.com/about</loc><lastmod>2020-01-01</lastmod></url>
+          <url><loc>https://example.com/orphan</loc><priority>0.9</priority></url>
+        </urlset>"""
+    site['https://example.com/posts.xml.gz'] = gzip.compress(f"""<?xml version="1.0"?>
+        <urlset {namespace}>
+          <url><loc>https://example.com/blog/first-post</loc><lastmod>2020-01-01T10:00:00Z</lastmod></url>
+        </urlset>""".encode('utf-8'))
+    site['https://example.com/orphan'] = """
+        <html><body><main><h1>Orphan page</h1>
+        <p>Nothing links here, only the sitemap knows about it.</p>
+        </main></body></html>"""
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, 'cache.sqlite')
+        
+        crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0,
+                                 use_sitemaps=True, http_cache=cache_file)
+        crawler.fetcher = FakeSession(site)
+        urls = [page['url'] for page in crawler.crawl()]
+        crawler.close()
+        
+        assert 'https://example.com/orphan' in urls, "❌ Orphan page from sitemap not crawled"
+        assert 'https://example.com/blog/first-post' in urls, "❌ Gzip sitemap not read"
+        print("✅ Orphan page found through nested and gzip sitemaps")
+        
+        recrawl = WebsiteCrawler(base_url="https://example.com", rate_limit=0,
+                                 use_sitemaps=True, http_cache=cache_file)
+        recrawl.fetcher = FakeSession(site)
+        pages = recrawl.crawl()
+        recrawl.close()
+        
+        fetched = [url for url, _ in recrawl.fetcher.requests]
+        assert 'https://example.com/about' not in fetched, "❌ Unchanged page was requested again"
+        assert recrawl.sitemap_skips == 2, "❌ lastmod skips not counted"
+        assert sorted(page['url'] for page in pages) == sorted(urls), "❌ Recrawl lost pages"
+        print("✅ Pages unchanged since their lastmod reused without a request")
+
+
+
+def test_robots_compliance():
+    """Test robots.txt rule matching, URL filtering and Crawl-delay."""
+    print("\n" + "=" * 70)
+    print("Testing robots.txt Compliance")
+    print("=" * 70)
+    
+    rules = RobotsRules("""
+        User-agent: *
+        Disallow: /
+        
+        User-agent: WebsiteCrawler
+        Disallow: /blog
+        Allow: /blog/first-post
+        Disallow: /*?sort=
+        Disallow: /*.php$
+        Crawl-delay: 2
+    """)
+    assert not rules.allowed('/blog'), "❌ Disallow rule ignored"
+    assert rules.allowed('/blog/first-post'), "❌ Longer Allow rule did not win"
+    assert not rules.allowed('/services?sort=price'), "❌ Wildcard rule ignored"
+    assert not rules.allowed('/index.php') and rules.allowed('/index.php?x=1'), "❌ $ anchor ignored"
+    assert rules.allowed('/about'), "❌ Unmatched path disallowed"
+    assert rules.crawl_delay == 2.0, "❌ Crawl-delay not parsed"
+    print("✅ Agent groups, wildcards, $ anchors and longest-match precedence")
+    
+    site = dict(TEST_SITE)
+    site['https://example.com/robots.txt'] = "User-agent: *\nDisallow: /blog\nCrawl-delay: 0.01\n"
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    crawler.fetcher = FakeSession(site)
+    urls = [page['url'] for page in crawler.crawl()]
+    fetched = [url for url, _ in crawler.fetcher.requests]
+    
+    assert not any('/blog' in url for url in fetched), "❌ Disallowed URL was fetched"
+    assert 'https://example.com/about' in urls, "❌ Allowed URL was skipped"
+    assert fetched.count('https://example.com/robots.txt') == 1, "❌ robots.txt fetched more than once"
+    assert crawler.scheduler.current_rate('example.com') == 100.0, "❌ Crawl-delay not applied"
+    print("✅ Disallowed URLs never fetched, robots.txt fetched once, Crawl-delay applied")
+
+
+
+def test_streaming_fetch_limits():
+    """Test that non-HTML and oversized responses are abandoned early."""
+    print("\n" + "=" * 70)
+    print("Testing Streaming Fetch Limits")
+    print("=" * 70)
+    
+    consumed = []
+    
+    class TrackingResponse(FakeResponse):
+        def iter_content(self, chunk_size=1):
+            for chunk in super().iter_content(chunk_size):
+                consumed.append(len(chunk))
+                yield chunk
+    
+    class TrackingSession(FakeSession):
+        def get(self, url, headers=None, **kwargs):
+            response = super().get(url, headers=headers, **kwargs)
+            return TrackingResponse(url, response.content, response.status_code, response.headers)
+    
+    big_page = "<html><body><main><p>" + "x" * 500000 + "</p></main></body></html>"
+    site = {
+        'https://example.com/video': (b"\x00" * 300000, {'Content-Type': 'video/mp4'}),
+        'https://example.com/huge': big_page,
+        'https://example.com/latin': ("<html><body><main><h1>Caf\xe9 cr\xe8me menu</h1></main></body></html>".encode('latin-1'),
+                                      {'Content-Type': 'text/html; charset=ISO-8859-1'}),
+    }
+    
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, max_page_bytes=100000)
+    crawler.fetcher = TrackingSession(site)
+    
+    assert crawler.scrape_page('https://example.com/video') is None, "❌ Non-HTML page scraped"
+    assert not consumed, "❌ Non-HTML body was downloaded"
+    print("✅ Non-HTML response abandoned before reading the body")
+    
+    assert crawler.scrape_page('https://example.com/huge') is None, "❌ Oversized page scraped"
+    assert sum(consumed) <= 100000 + 64 * 1024, "❌ Download continued past the size cap"
+    print(f"✅ Oversized page abandoned after {sum(consumed)} bytes")
+    
+    page = crawler.scrape_page('https://example.com/latin')
+    assert page['title'] == 'Caf\xe9 cr\xe8me menu', "❌ Header charset not used for decoding"
+    print("✅ Body decoded with the charset from the Content-Type header")
+
+
+def test_retry_queue():
+    """Test that transient failures are retried with backoff and the rest dead-lettered."""
+    print("\n" + "=" * 70)
+    print("Testing Retry Queue")
+    print("=" * 70)
+    
+    import requests
+    
+    queue = RetryQueue(max_attempts=4, base_delay=1.0, max_delay=3.0, jitter=0.5)
+    delays = [queue.backoff(attempts) for attempts in (1, 2, 3, 4)]
+    assert 0.5 <= delays[0] <= 1.5 and 1.0 <= delays[1] <= 3.0, "❌ Backoff is not exponential"
+    assert all(delay <= 4.5 for delay in delays[2:]), "❌ Backoff ignores max_delay"
+    assert queue.schedule('https://example.com/a', 1, 4) is None, "❌ Attempt limit not enforced"
+    print(f"✅ Backoff with jitter: {', '.join(f'{delay:.2f}s' for delay in delays)}")
+    
+    class FlakySession(FakeSession):
+        """Answers /services with a 500 twice and always times out on /blog."""
+        def get(self, url, headers=None, **kwargs):
+            self.requests.append((url, headers or {}))
+            attempts = sum(1 for requested, _ in self.requests if requested == url)
+            if url.endswith('/services') and attempts <= 2:
+                return FakeResponse(url, 'Server error', status_code=500)
+            if url.endswith('/blog'):
+                raise requests.exceptions.Timeout()
+            self.requests.pop()
+            return super().get(url, headers=headers, **kwargs)
+    
+    site = dict(TEST_SITE)
+    site['https://example.com/contact'] = site['https://example.com/contact'].replace(
+        '</main>', '<a href="/old-page">Old page</a></main>')
+    
+    for crawler_class in (WebsiteCrawler, AsyncWebsiteCrawler):
+        crawler = crawler_class(base_url="https://example.com", rate_limit=0, retry_backoff=0.01)
+        crawler.fetcher = FlakySession(site)
+        pages = crawler.crawl()
+        
+        urls = [page['url'] for page in pages]
+        assert 'https://example.com/services' in urls, "❌ Transient 500 was not retried"
+        failed = {entry['url']: entry for entry in crawler.failed}
+        assert failed['https://example.com/blog']['attempts'] == 3, "❌ Timeouts not retried up to the limit"
+        assert failed['https://example.com/blog']['reason'] == 'Timeout', "❌ Failure reason missing"
+        assert failed['https://example.com/old-page']['attempts'] == 1, "❌ A 404 was retried"
+        print(f"✅ {crawler_class.__name__}: 500s recovered, timeouts dead-lettered after 3 attempts")
+    
+    # --retry-failed: only the dead-lettered URLs are fetched again
+    session = FakeSession(TEST_SITE)
+    retry_crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    retry_crawler.fetcher = session
+    retry_crawler.retry_failed(pages, [failed['https://example.com/blog']])
+    recovered = retry_crawler.crawl()
+    
+    fetched = [url for url, _ in session.requests if not url.endswith('robots.txt')]
+    assert fetched[0] == 'https://example.com/blog', "❌ Retry run started somewhere else"
+    assert not set(fetched) & set(urls), "❌ Retry run re-fetched pages that already succeeded"
+    assert len(recovered) > len(pages), "❌ Recovered page not added to the earlier output"
+    print(f"✅ Retry run fetched {len(fetched)} URLs and grew the output to {len(recovered)} pages")
+
+
+def test_fetcher_backends():
+    """Test crawling a local directory and replaying a recorded crawl offline."""
+    print("\n" + "=" * 70)
+    print("Testing Fetcher Backends")
+    print("=" * 70)
+    
+    import os
+    import tempfile
+    import time
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        site_dir = os.path.join(tmpdir, 'website')
+        os.makedirs(os.path.join(site_dir, 'blog'))
+        files = {
+            'index.html': '<html><body><main><h1>Home page</h1><a href="about.html">About</a> '
+                          '<a href="/blog/">Blog</a> <a href="/missing.html">Missing</a></main></body></html>',
+            'about.html': '<html><body><main><h1>About page</h1><a href="/">Home</a></main></body></html>',
+            os.path.join('blog', 'index.html'): '<html><body><main><h1>Blog index</h1></main></body></html>',
+        }
+        for name, html in files.items():
+            with open(os.path.join(site_dir, name), 'w', encoding='utf-8') as f:
+                f.write(html)
+        
+        # A 5-second rate limit would make this take 15s if the scheduler were used
+        started = time.monotonic()
+        crawler = WebsiteCrawler(base_url="https://example.com/", rate_limit=5.0,
+                                 fetcher=LocalDirectoryFetcher(site_dir, "https://example.com/"))
+        titles = sorted(page['title'] for page in crawler.crawl())
+        assert titles == ['About page', 'Blog index', 'Home page'], f"❌ Unexpected pages: {titles}"
+        assert time.monotonic() - started < 2, "❌ Offline fetcher was rate limited"
+        assert [entry['reason'] for entry in crawler.failed] == ['HTTP 404'], "❌ Missing file not a 404"
+        print(f"✅ Local directory crawled without rate limiting ({len(titles)} pages)")
+        
+        # Record a crawl, then replay it without the original fetcher
+        recording = os.path.join(tmpdir, 'crawl.jsonl')
+        recorder = WebsiteCrawler(base_url="https://example.com", rate_limit=0,
+                                  fetcher=RecordingFetcher(FakeSession(TEST_SITE), recording))
+        expected = recorder.crawl()
+        recorder.close()
+        
+        replayer = WebsiteCrawler(base_url="https://example.com", rate_limit=0,
+                                  fetcher=ReplayFetcher.load(recording))
+        assert replayer.crawl() == expected, "❌ Replayed crawl differs from the recorded one"
+        print(f"✅ Replayed crawl matches the recording ({len(expected)} pages)")
+
+
+def test_warc_reextract():
+    """Test that a WARC recording re-extracts to the same pages without any requests."""
+    print("\n" + "=" * 70)
+    print("Testing WARC Recording and Re-extraction")
+    print("=" * 70)
+    
+    import os
+    import tempfile
+    import time
+    
+    class SlowAboutSession(FakeSession):
+        """Serves /about late, so concurrent downloads finish out of crawl order."""
+        
+        def get(self, url, headers=None, **kwargs):
+            if url == 'https://example.com/about':
+                time.sleep(0.2)
+            return super().get(url, headers=headers, **kwargs)
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        archive = os.path.join(tmpdir, 'crawl.warc.gz')
+        crawler = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4,
+                                      fetcher=RecordingFetcher(SlowAboutSession(TEST_SITE), archive))
+        expected = crawler.crawl()
+        crawler.close()
+        
+        with gzip.open(archive, 'rb') as f:
+            assert f.read(8) == b'WARC/1.1', "❌ Archive is not a WARC file"
+        records = list(read_warc(archive))
+        assert len(records) >= len(TEST_SITE), "❌ Responses missing from the archive"
+        archived = [record['sequence'] for record in records if record['sequence'] is not None]
+        assert archived != sorted(archived), "❌ Downloads were archived in crawl order; the test proves nothing"
+        print("✅ Concurrent crawl recorded as a gzip WARC archive, downloads archived out of crawl order")
+        
+        replayer = WebsiteCrawler(base_url="https://example.com", fetcher=ReplayFetcher({}))
+        assert replayer.reextract(archive, workers=2) == expected, "❌ Re-extracted pages differ from the crawl"
+        print(f"✅ Re-extraction on 2 processes reproduces the crawl in crawl order ({len(expected)} pages)")
+        
+        # Redirect hops are archived too; the page is stored under the URL it moved to
+        redirected = os.path.join(tmpdir, 'redirect.warc')
+        writer = WARCWriter(redirected)
+        writer.write_responses([
+            ('https://example.com/old', 301, {'Location': '/new'}, b''),
+            ('https://example.com/new', 200, {'Content-Type': 'text/html; charset=utf-8'},
+             '<html><body><main><h1>Moved page</h1></main></body></html>'.encode('utf-8')),
+        ])
+        writer.close()
+        
+        pages = replayer.reextract(redirected, workers=1)
+        assert [(page['url'], page['title']) for page in pages] == [('https://example.com/new', 'Moved page')], \
+            "❌ Redirected page not stored under its final URL"
+        assert replayer.redirects == {'https://example.com/old': 'https://example.com/new'}, \
+            "❌ Redirect missing from the redirect map"
+        response = ReplayFetcher.load(redirected).get('https://example.com/old')
+        assert response.url == 'https://example.com/new', "❌ Replay did not follow the recorded redirect"
+        print("✅ Recorded redirects are followed on replay")
+        
+        from scrape_site import REFERENCE_PARSER, parser_available
+        if not parser_available('lxml'):
+            print("⚠️  lxml not installed, skipping the parser check on re-extraction")
+            return
+        
+        # The second page fails the lxml check; the third was parsed with lxml before that was known
+        broken = '<html><head><title>Broken</title></head><body><main><p>First paragraph<p>Second paragraph</main></body></html>'
+        site = {'https://example.com': '<html><body><main><p>Home page of the site.</p><a href="/broken">Broken</a>'
+                                       '<a href="/about">About</a></main></body></html>',
+                'https://example.com/broken': broken,
+                'https://example.com/about': TEST_SITE['https://example.com/about']}
+        checked = os.path.join(tmpdir, 'checked.warc')
+        crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, parser='html.parser',
+                                 fetcher=RecordingFetcher(FakeSession(site), checked))
+        expected = crawler.crawl()
+        crawler.close()
+        for workers in (1, 2):
+            replayer = WebsiteCrawler(base_url="https://example.com", parser='lxml', parser_check_pages=3,
+                                      fetcher=FakeSession({}))
+            assert replayer.reextract(checked, workers=workers) == expected, \
+                f"❌ Pages after a failed parser check differ from html.parser ({workers} workers)"
+            assert replayer.parser == REFERENCE_PARSER, "❌ Failed parser check did not switch the parser"
+            assert replayer.fetcher.requests == [], f"❌ Re-extraction made requests: {replayer.fetcher.requests}"
+        print("✅ Pages parsed before a failed parser check are parsed again without any requests")
+
+
+def test_single_pass_extraction():
+    """Test that one traversal yields title, headings, content and links, with pluggable visitors."""
+    print("\n" + "=" * 70)
+    print("Testing Single-Pass Extraction")
+    print("=" * 70)
+    
+    from bs4 import BeautifulSoup
+    
+    html = """
+    <html><head><title>Browser title</title></head><body>
+    <nav class="main-menu"><a href="/about">About</a><h2>Menu heading</h2></nav>
+    <div class="content-wrapper"><main>
+        <h1>Welcome to the practice</h1>
+        <p>Healing is available to everyone<!-- note --> who asks for it.</p>
+        <div class="widget">Recent posts widget text that is long</div>
+        <div><div>Nested container text that is long enough</div></div>
+        <ul><li>First list item</li><li>Second <b>list</b> item</li></ul>
+        <p>Split by a stray end tag</span> but still one paragraph.</p>
+        <a href="/services">Services</a> <a href="#top">Top</a> <a href="/about/">About again</a>
+    </main></div>
+    <footer><p>Copyright footer text that should go</p></footer>
+    </body></html>
+    """
+    
+    class ImageCounter(PageVisitor):
+        name = 'image_count'
+        
+        def __init__(self):
+            self.count = 0
+        
+        def start(self, walker, tag):
+            if tag.name == 'img' and not walker.removed:
+                self.count += 1
+        
+        def result(self, walker):
+            return self.count
+    
+    class CountingCrawler(WebsiteCrawler):
+        def page_visitors(self, url):
+            return super().page_visitors(url) + [ImageCounter()]
+    
+    crawler = CountingCrawler(base_url="https://example.com", rate_limit=0, respect_robots=False)
+    page = crawler.parse_page('https://example.com/', html.encode('utf-8'), html + '<img src="a.png">')
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    assert page['title'] == 'Welcome to the practice', "❌ Title should come from the first <h1>"
+    assert page['headings'] == [{'level': 1, 'text': 'Welcome to the practice'},
+                                {'level': 2, 'text': 'Menu heading'}], "❌ Headings wrong"
+    assert page['content'] == crawler.extract_content(soup)['clean'], "❌ Content differs from extract_content"
+    assert page['content'].split('\n') == [
+        '# Welcome to the practice',
+        'Healing is available to everyone who asks for it.',
+        'Nested container text that is long enough',
+        '• First list item',
+        '• Second list item',
+        'Split by a stray end tag but still one paragraph.',
+    ], f"❌ Unexpected clean content: {page['content']!r}"
+    assert page['links'] == ['https://example.com/about', 'https://example.com/services'], "❌ Links wrong"
+    assert page['links'] == crawler.extract_links(soup, 'https://example.com/'), "❌ Links differ from extract_links"
+    print("✅ Title, headings, content and links extracted in one traversal")
+    
+    assert page['image_count'] == 1, "❌ Custom visitor result missing"
+    print("✅ Custom visitors run in the same traversal")
+
+
+def test_deeply_nested_extraction():
+    """Test that extraction time stays linear on page-builder style nesting."""
+    print("\n" + "=" * 70)
+    print("Testing Deeply Nested Extraction")
+    print("=" * 70)
+    
+    import gc
+    import time
+    from bs4 import BeautifulSoup
+    
+    def nested(depth):
+        wrappers = ''.join(f'<div class="wrap-{level}"><span>Level {level}</span>' for level in range(depth))
+        return (f'<html><body><main>{wrappers}<p>The innermost paragraph of the page.</p>'
+                f'{"</div>" * depth}<blockquote>A quotation that is long enough.</blockquote></main></body></html>')
+    
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, respect_robots=False)
+    
+    # Best of three with the garbage collector off, so a collection of the huge tree is not timed
+    timings = {}
+    for depth in (250, 1000):
+        soup = BeautifulSoup(nested(depth), 'html.parser')
+        timings[depth] = float('inf')
+        gc.disable()
+        try:
+            for _ in range(3):
+                started = time.perf_counter()
+                content = crawler.extract_content(soup)
+                timings[depth] = min(timings[depth], time.perf_counter() - started)
+        finally:
+            gc.enable()
+        assert content['clean'] == ('The innermost paragraph of the page.\n'
+                                    '> A quotation that is long enough.'), "❌ Nested content wrong"
+    
+    # 4x the depth must not cost anywhere near 16x the time
+    assert timings[1000] < timings[250] * 10, f"❌ Extraction scales super-linearly: {timings}"
+    print(f"✅ 1000-level nesting extracted in {timings[1000] * 1000:.0f} ms "
+          f"({timings[1000] / timings[250]:.1f}x the time of 250 levels)")
+
+
+def test_parser_backends():
+    """Test parser selection, fallback and the equivalence check against html.parser."""
+    print("\n" + "=" * 70)
+    print("Testing Parser Backends")
+    print("=" * 70)
+    
+    from scrape_site import REFERENCE_PARSER, parser_available, resolve_parser
+    
+    # auto picks lxml when installed; unknown names are rejected, missing ones fall back
+    assert resolve_parser('auto') == ('lxml' if parser_available('lxml') else REFERENCE_PARSER), "❌ Wrong auto parser"
+    assert resolve_parser('html.parser') == REFERENCE_PARSER, "❌ Reference parser not accepted"
+    try:
+        resolve_parser('no-such-parser')
+        assert False, "❌ Unknown parser accepted"
+    except ValueError:
+        pass
+    if not parser_available('lxml'):
+        print("⚠️  lxml not installed, skipping the equivalence check")
+        return
+    
+    # Normal pages extract the same with lxml
+    for url in ("https://example.com", "https://example.com/about"):
+        html = TEST_SITE[url].encode('utf-8')
+        reference = WebsiteCrawler(base_url="https://example.com", parser='html.parser',
+                                   respect_robots=False).parse_page(url, html)
+        fast = WebsiteCrawler(base_url="https://example.com", parser='lxml',
+                              respect_robots=False).parse_page(url, html)
+        assert fast == reference, f"❌ lxml and html.parser disagree on {url}"
+    
+    # Unclosed <p> tags are repaired differently, so the crawler falls back for good
+    broken = (b'<html><head><title>Broken</title></head><body><main>'
+              b'<p>First paragraph text here<p>Second paragraph text here</main></body></html>')
+    crawler = WebsiteCrawler(base_url="https://example.com", parser='lxml', parser_check_pages=2,
+                             respect_robots=False)
+    page = crawler.parse_page("https://example.com/broken", broken)
+    assert crawler.parser == REFERENCE_PARSER, "❌ Crawler did not switch to the reference parser"
+    reference = WebsiteCrawler(base_url="https://example.com", parser='html.parser',
+                               respect_robots=False).parse_page("https://example.com/broken", broken)
+    assert page['content'] == reference['content'], "❌ Mismatching page did not use the reference result"
+    print("✅ lxml matches html.parser on normal pages and falls back on a mismatch")
+
+
+def test_streaming_extraction():
+    """Test that the tree-free streaming extractor matches html.parser extraction."""
+    print("\n" + "=" * 70)
+    print("Testing Streaming Extraction")
+    print("=" * 70)
+    
+    from bs4 import BeautifulSoup
+    
+    # Stray end tags, void end tags, comments, CDATA, scripts, templates and unclosed elements
+    html = """<!DOCTYPE html><html><head><title>Stream &amp; tree</title>
+    <script>var menu = "<p>not text</p>";</script></head><body>
+    <nav class="main-menu"><a href="/about">About</a></nav>
+    <main><h1>Streaming <b>works</b></h1>
+    <div class="content-wrapper"><p>First half of a sentence</span> and its second half.</p>
+    <p>Line break<br>inside</br> a paragraph with text.<!-- hidden --></p>
+    <ul><li>Item one is here<li>Item two &#8217;s here</ul>
+    <template><p>Template text is not content</p></template>
+    <pre>  preformatted   text block  </pre><![CDATA[ cdata text in the page ]]>
+    <p>Unclosed paragraph <a href="/services">with a link</a>
+    </div></main><footer><p>Copyright notice text</p></footer>"""
+    
+    crawler = WebsiteCrawler(base_url="https://example.com", parser='html.parser', respect_robots=False)
+    url = "https://example.com/stream"
+    expected = PageWalker(crawler.page_visitors(url)).walk(BeautifulSoup(html, 'html.parser'))
+    for chunk_size in (1, 7, len(html)):
+        walker = StreamingPageWalker(crawler.page_visitors(url))
+        for start in range(0, len(html), chunk_size):
+            walker.feed(html[start:start + chunk_size])
+        assert walker.close() == expected, f"❌ Streaming extraction differs with {chunk_size}-character chunks"
+    print("✅ Streaming extraction matches the html.parser tree, whatever the chunk size")
+    
+    # Charset from <meta> when the header has none, with characters split across chunks
+    body = '<html><head><meta charset="iso-8859-1"></head><body><p>Café crème</p></body></html>'.encode('latin-1')
+    decoder = IncrementalPageDecoder('text/html')
+    text = ''.join(decoder.decode(body[i:i + 1]) for i in range(len(body))) + decoder.decode(b'', final=True)
+    assert text == body.decode('latin-1'), "❌ Declared <meta> charset not used"
+    decoder = IncrementalPageDecoder('text/html; charset=utf-8')
+    encoded = 'Café crème'.encode('utf-8')
+    text = ''.join(decoder.decode(encoded[i:i + 1]) for i in range(len(encoded))) + decoder.decode(b'', final=True)
+    assert text == 'Café crème', "❌ Multi-byte characters split across chunks"
+    print("✅ Chunks decoded with the header or <meta> charset")
+    
+    # An undeclared legacy page is only found not to be UTF-8 after the sniffed head
+    html = '<html><body>' + '<p>Plain ASCII text.</p>' * 300 + '<p>Café crème brûlée</p></body></html>'
+    body = html.encode('latin-1')
+    resolver = CharsetResolver()
+    resolver.decode('https://example.com/', b'<html></html>', 'text/html; charset=iso-8859-1')
+    for chunk_size in (1, 7, len(body)):
+        decoder = IncrementalPageDecoder('text/html', 'https://example.com/legacy', resolver)
+        text = ''.join(decoder.decode(body[i:i + chunk_size]) for i in range(0, len(body), chunk_size))
+        assert text + decoder.decode(b'', final=True) == html, \
+            f"❌ Undeclared legacy page not decoded with the host's charset ({chunk_size}-byte chunks)"
+    print("✅ Undeclared pages that are not UTF-8 use the host's charset")
+    
+    # A streaming crawl gives the same pages as a tree-building crawl
+    tree = WebsiteCrawler(base_url="https://example.com", rate_limit=0, parser='html.parser')
+    tree.fetcher = FakeSession(TEST_SITE)
+    streaming = WebsiteCrawler(base_url="https://example.com", rate_limit=0, streaming=True)
+    streaming.fetcher = FakeSession(TEST_SITE)
+    assert streaming.crawl() == tree.crawl(), "❌ Streaming crawl differs from tree crawl"
+    print(f"✅ Streaming crawl matches ({len(streaming.pages_data)} pages)")
+    
+    site = dict(TEST_SITE)
+    site['https://example.com/contact'] = (
+        site['https://example.com/contact'].replace('Reach out', 'Réservez').encode('latin-1'),
+        {'Content-Type': 'text/html'}
+    )
+    tree = WebsiteCrawler(base_url="https://example.com", rate_limit=0, parser='html.parser')
+    tree.fetcher = FakeSession(site)
+    streaming = WebsiteCrawler(base_url="https://example.com", rate_limit=0, streaming=True)
+    streaming.fetcher = FakeSession(site)
+    assert streaming.crawl() == tree.crawl(), "❌ Undeclared legacy page streamed differently"
+    print("✅ Streaming crawl decodes an undeclared legacy page like a tree-building crawl")
+    
+    # The charset a page declares is learned for its host in both modes
+    site['https://example.com/about'] = (
+        site['https://example.com/about'].replace('About', 'À propos').encode('latin-1'),
+        {'Content-Type': 'text/html; charset=iso-8859-1'}
+    )
+    tree = WebsiteCrawler(base_url="https://example.com", rate_limit=0, parser='html.parser')
+    tree.fetcher = FakeSession(site)
+    streaming = WebsiteCrawler(base_url="https://example.com", rate_limit=0, streaming=True)
+    streaming.fetcher = FakeSession(site)
+    assert streaming.crawl() == tree.crawl(), "❌ Legacy pages streamed differently"
+    assert streaming.charsets.counts == tree.charsets.counts, \
+        f"❌ Charset sources differ: {streaming.charsets.counts} != {tree.charsets.counts}"
+    assert streaming.charsets.counts['host'] == 1 and streaming.charsets.counts['detected'] == 0, \
+        f"❌ Declared charset not reused for the host: {streaming.charsets.counts}"
+    print("✅ Streaming crawl learns and reuses the host's charset like a tree-building crawl")
+
+
+def test_boilerplate_model():
+    """Test that blocks repeated across a site's pages are learned and removed."""
+    print("\n" + "=" * 70)
+    print("Testing Boilerplate Model")
+    print("=" * 70)
+    
+    def page(title, text, links=''):
+        return f"""
+        <html><head><title>{title}</title></head><body><main>
+        <div class="cookie-banner"><p>We use cookies to improve your experience on this site.</p></div>
+        <h1>{title}</h1><p>{text}</p><p>Open daily</p>{links}
+        <h2>Recent posts</h2><ul><li>Healing through prayer</li><li>Finding peace at home</li></ul>
+        <p>Book your free consultation today!</p>
+        </main></body></html>
+        """
+    
+    site = {'https://example.com': page('Welcome home', 'The home page introduces the practice.',
+                                        '<a href="/a">A</a> <a href="/b">B</a> <a href="/c">C</a> <a href="/d">D</a>')}
+    for name in 'abcd':
+        site[f'https://example.com/{name}'] = page(f'Page {name.upper()}', f'Unique text of page {name.upper()} here.')
+    
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, boilerplate_pages=3)
+    crawler.fetcher = FakeSession(site)
+    pages = crawler.crawl()
+    
+    assert len(pages) == 5, "❌ Pages missing"
+    for page_data in pages:
+        content = page_data['content']
+        # Removed from every page, including those scraped before the blocks were learned
+        assert 'cookies' not in content and 'consultation' not in content, f"❌ Boilerplate kept: {content}"
+        assert 'Recent posts' not in content and 'Healing through prayer' not in content, f"❌ Repeated list kept: {content}"
+        assert all(heading['text'] != 'Recent posts' for heading in page_data.get('headings', [])), \
+            "❌ Boilerplate heading kept"
+        # Short headings like "Page A" are kept: the model, not a length filter, catches repeats
+        assert f"# {page_data['title']}" in content, "❌ Short page heading removed"
+        assert 'Open daily' not in content, "❌ Repeated short block kept"
+    assert 'Unique text of page C here.' in pages[3]['content'], "❌ Unique content removed"
+    print(f"✅ {crawler.boilerplate.removed} repeated blocks removed, unique content kept")
+    
+    # Concurrent crawls learn in the same order, so they end up identical
+    concurrent = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4, boilerplate_pages=3)
+    concurrent.fetcher = FakeSession(site)
+    assert concurrent.crawl() == pages, "❌ Async crawl strips differently"
+    
+    # Without the model, every page keeps the template
+    plain = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    plain.fetcher = FakeSession(site)
+    assert all('cookies' in page_data['content'] for page_data in plain.crawl()), "❌ Content changed without the model"
+    print("✅ Async crawl matches; nothing removed when the model is off")
+    
+    # On a large site, a block a few pages share is content; one most pages share is template
+    model = BoilerplateModel(min_pages=3, min_share=0.5)
+    for number in range(100):
+        blocks = ['Book your free consultation today!', f'Article number {number} text.']
+        if number % 10 == 0:
+            blocks.append('A quote several articles share.')
+        model.learn('example.com', '\n'.join(blocks))
+    assert model.is_boilerplate('example.com', 'Book your free consultation today!'), "❌ Template block not learned"
+    assert not model.is_boilerplate('example.com', 'A quote several articles share.'), \
+        "❌ Block on 10 of 100 pages counted as boilerplate"
+    print("✅ Boilerplate threshold grows with the number of pages of the site")
+
+
+
+def test_parse_workers():
+    """Test that parsing on worker processes gives the same crawl."""
+    print("\n" + "=" * 70)
+    print("Testing Parse Worker Processes")
+    print("=" * 70)
+    
+    import os
+    import tempfile
+    
+    sequential = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    sequential.fetcher = FakeSession(TEST_SITE)
+    expected = sequential.crawl()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, 'cache.sqlite')
+        crawler = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4,
+                                      parse_workers=2, http_cache=cache_file)
+        crawler.fetcher = FakeSession(TEST_SITE)
+        assert crawler.crawl() == expected, "❌ Parse workers changed the crawl output"
+        crawler.close()
+        print(f"✅ Crawl with 2 parse workers matches sequential crawl ({len(expected)} pages)")
+        
+        again = WebsiteCrawler(base_url="https://example.com", rate_limit=0, http_cache=cache_file)
+        again.fetcher = FakeSession(TEST_SITE)
+        assert again.crawl() == expected, "❌ Cached pages differ"
+        assert again.http_cache.hits == len(TEST_SITE), "❌ Pages parsed by workers were not cached"
+        again.close()
+        print("✅ Pages parsed by workers are stored in the HTTP cache")
+    
+    # Workers skip robots.txt, so their links are checked before they are queued
+    site = dict(TEST_SITE)
+    site['https://example.com/robots.txt'] = "User-agent: *\nDisallow: /blog\n"
+    crawler = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4, parse_workers=2)
+    crawler.fetcher = FakeSession(site)
+    crawler.crawl()
+    assert not any('/blog' in url for url, _ in crawler.fetcher.requests), "❌ Disallowed URL was fetched"
+    print("✅ robots.txt applied to links found by parse workers")
+    
+    from scrape_site import REFERENCE_PARSER, parser_available
+    if not parser_available('lxml'):
+        print("⚠️  lxml not installed, skipping the parser check across workers")
+        return
+    
+    # Unclosed <p> tags extract differently with lxml; the check budget is shared by all workers
+    broken = '<html><head><title>{0}</title></head><body><main><p>{0} first paragraph<p>{0} second paragraph</main></body></html>'
+    site = {'https://example.com': '<html><body><main><p>Home page of the site.</p>'
+                                   + ''.join(f'<a href="/{name}">{name}</a>' for name in 'abcd') + '</main></body></html>'}
+    for name in 'abcd':
+        site[f'https://example.com/{name}'] = broken.format(f'Page {name}')
+    for checks, fallback in ((1, False), (3, True)):
+        sequential = WebsiteCrawler(base_url="https://example.com", rate_limit=0, parser='lxml', parser_check_pages=checks)
+        sequential.fetcher = FakeSession(site)
+        expected = sequential.crawl()
+        crawler = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4, parse_workers=2,
+                                      parser='lxml', parser_check_pages=checks)
+        crawler.fetcher = FakeSession(site)
+        assert crawler.crawl() == expected, f"❌ Parse workers checked the parser differently ({checks} checks)"
+        assert (crawler.parser == REFERENCE_PARSER) == fallback == (sequential.parser == REFERENCE_PARSER), \
+            f"❌ Wrong parser after {checks} checks: {crawler.parser}"
+        assert crawler._extraction_fingerprint() == sequential._extraction_fingerprint(), \
+            "❌ Extraction cache fingerprint does not follow the parser fallback"
+    print("✅ Parser checks counted across workers, and a worker's fallback switches the whole crawl")
+
+
+def test_charset_resolution():
+    """Test that page bodies are decoded from declarations, UTF-8 or the host's charset."""
+    print("\n" + "=" * 70)
+    print("Testing Charset Resolution")
+    print("=" * 70)
+    
+    import codecs
+    
+    html = '<html><head>{}</head><body><p>Café crème brûlée</p></body></html>'
+    resolver = CharsetResolver()
+    latin = html.format('').encode('latin-1')
+    
+    assert resolver.decode('https://example.com/a', latin, 'text/html; charset=iso-8859-1') == html.format('')
+    meta = html.format('<meta charset="windows-1252">')
+    assert resolver.decode('https://example.com/b', meta.encode('cp1252')) == meta
+    bom = codecs.BOM_UTF16_LE + html.format('').encode('utf-16-le')
+    assert resolver.decode('https://example.com/c', bom) == html.format('')
+    assert resolver.decode('https://example.com/d', html.format('').encode('utf-8')) == html.format('')
+    assert resolver.counts == {'header': 1, 'document': 2, 'utf-8': 1, 'host': 0, 'detected': 0}, \
+        f"❌ Wrong charset sources: {resolver.counts}"
+    print("✅ Header, <meta>, byte-order mark and UTF-8 resolved without detection")
+    
+    # An undeclared legacy page reuses the charset the host declared earlier
+    assert resolver.decode('https://example.com/e', latin) == html.format('')
+    assert resolver.counts['host'] == 1 and resolver.counts['detected'] == 0, "❌ Host charset not reused"
+    fresh = CharsetResolver()
+    assert fresh.decode('https://other.example.com/', latin).endswith('</html>')
+    assert fresh.counts['detected'] == 1, "❌ Undeclared legacy page was not detected"
+    print("✅ Undeclared legacy pages use the host's charset, detection only as a last resort")
+    
+    site = dict(TEST_SITE)
+    site['https://example.com/contact'] = (
+        site['https://example.com/contact'].replace('Reach out', 'Réservez').encode('latin-1'),
+        {'Content-Type': 'text/html'}
+    )
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    crawler.fetcher = FakeSession(site)
+    contact = next(page for page in crawler.crawl() if page['url'].endswith('/contact'))
+    assert 'Réservez' in contact['content'], "❌ Undeclared page decoded wrongly"
+    print("✅ Crawled page without a charset header decoded correctly")
+
+
+
+def test_extraction_cache():
+    """Test that byte-identical pages reuse their extraction until the extractor changes."""
+    print("\n" + "=" * 70)
+    print("Testing Extraction Cache")
+    print("=" * 70)
+    
+    import os
+    import tempfile
+    
+    class ShoutingCrawler(WebsiteCrawler):
+        def _page_data(self, url, extracted, status_code):
+            page_data = super()._page_data(url, extracted, status_code)
+            page_data['title'] = page_data['title'].upper()
+            return page_data
+    
+    site = dict(TEST_SITE)
+    site['https://example.com/contact'] = site['https://example.com/contact'].replace(
+        'phone or email', 'phone, email or post')
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, 'extractions.sqlite')
+        
+        def crawl(crawler_class=WebsiteCrawler, pages=TEST_SITE, **options):
+            crawler = crawler_class(base_url="https://example.com", rate_limit=0, extraction_cache=cache_file, **options)
+            crawler.fetcher = FakeSession(pages)
+            result = crawler.crawl()
+            crawler.close()
+            return crawler, result
+        
+        _, expected = crawl()
+        crawler, pages = crawl(pages=site)
+        assert crawler.extraction_cache.hits == len(TEST_SITE) - 1, "❌ Unchanged pages were parsed again"
+        contact = next(page for page in pages if page['url'].endswith('/contact'))
+        assert 'phone, email or post' in contact['content'], "❌ Changed page not re-extracted"
+        assert [page['url'] for page in pages] == [page['url'] for page in expected], "❌ Cached crawl differs"
+        print(f"✅ {crawler.extraction_cache.hits} byte-identical pages reused, changed page re-extracted")
+        
+        crawler, _ = crawl(generate_summaries=True)
+        assert crawler.extraction_cache.hits == 0, "❌ Results reused after a settings change"
+        crawler, pages = crawl(ShoutingCrawler)
+        assert crawler.extraction_cache.hits == 0, "❌ Results reused after an extraction code change"
+        assert pages[0]['title'] == expected[0]['title'].upper(), "❌ Changed extraction code not applied"
+        print("✅ Settings and code changes invalidate cached results")
+        
+        crawler = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4,
+                                      parse_workers=2, extraction_cache=cache_file)
+        crawler.fetcher = FakeSession(TEST_SITE)
+        assert crawler.crawl() == expected, "❌ Parse workers changed the cached crawl"
+        assert crawler.extraction_cache.hits == len(TEST_SITE), "❌ Parse workers did not use the cache"
+        crawler.close()
+        print("✅ Cache used with parse workers")
+
+
+
+def test_url_canonicalization():
+    """Test that spellings of the same URL collapse to one canonical form."""
+    print("\n" + "=" * 70)
+    print("Testing URL Canonicalization")
+    print("=" * 70)
+    
+    canonicalizer = URLCanonicalizer(keep_query=True, fold_index_files=True)
+    cases = {
+        'HTTP://Example.COM:80/a/./b/../c/?utm_source=x&b=2&a=1&fbclid=z#top': 'http://example.com/a/c?a=1&b=2',
+        'https://example.com:8443/%7euser/index.html?SessionID=1': 'https://example.com:8443/~user',
+        'https://EXAMPLE.com./;jsessionid=abc?page=2': 'https://example.com/?page=2',
+        'https://example.com': 'https://example.com/',
+    }
+    for url, expected in cases.items():
+        assert canonicalizer.canonicalize(url) == expected, f"❌ {url} -> {canonicalizer.canonicalize(url)}"
+    assert URLCanonicalizer().canonicalize('https://example.com/a/?page=2') == 'https://example.com/a', \
+        "❌ Query not dropped by default"
+    print("✅ Case, ports, dot segments, escapes, tracking parameters and index files canonicalized")
+    
+    for url in cases:
+        canonicalizer.canonicalize(url)
+    assert canonicalizer.canonicalize.cache_info().hits == len(cases), "❌ Canonical forms not memoized"
+    print("✅ Repeated URLs answered from the memo")
+    
+    site = dict(TEST_SITE)
+    site['https://example.com/contact'] = site['https://example.com/contact'].replace('</main>', """
+        <a href="HTTPS://EXAMPLE.COM:443/about?utm_campaign=x">About</a>
+        <a href="/blog/../services/">Services</a> <a href="/index.html">Home</a></main>""")
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, include_query_params=True,
+                             fold_index_files=True)
+    crawler.fetcher = FakeSession(site)
+    crawler.crawl()
+    fetched = [url for url, _ in crawler.fetcher.requests if not url.endswith('robots.txt')]
+    assert sorted(fetched) == sorted(TEST_SITE), f"❌ Duplicate or missing fetches: {fetched}"
+    print(f"✅ Crawl fetched each of the {len(fetched)} pages once")
+
+
+
+def test_query_param_learning():
+    """Test that parameters that never change content stop being crawled."""
+    print("\n" + "=" * 70)
+    print("Testing Query Parameter Learning")
+    print("=" * 70)
+    
+    learner = QueryParamLearner(samples=2)
+    same, other = b'same', b'other'
+    learner.observe('https://example.com/shop/1?sort=asc', same)
+    learner.observe('https://example.com/shop/1?sort=desc', same)
+    assert not learner.irrelevant, "❌ Parameter ignored after a single comparison"
+    learner.observe('https://example.com/shop/2?page=1', same)
+    learner.observe('https://example.com/shop/2?page=2', other)
+    learner.observe('https://example.com/shop/2?page=3', same)
+    learner.observe('https://example.com/shop/3', other)
+    learner.observe('https://example.com/shop/3?sort=name', other)
+    assert learner.ignored('example.com/shop/') == {'sort'}, f"❌ Wrong decisions: {learner.snapshot()}"
+    assert ('example.com/shop/', 'page') in learner.relevant, "❌ Content-changing parameter not kept"
+    print("✅ 'sort' ignored after 2 identical variants, 'page' kept after one difference")
+    
+    # A shop whose listing ignores ?sort= and ?view= but paginates with ?page=
+    shop = """
+        <html><body><main><h1>Shop page {page}</h1>
+        <p>Products listed on page {page} of the catalogue.</p>
+        {links}
+        </main></body></html>
+    """
+    site = {'https://example.com': '<html><body><main><a href="/shop?page=1">Shop</a></main></body></html>'}
+    for page in range(1, 6):
+        links = ''.join(f'<a href="/shop?page={target}&sort={order}&view={view}">x</a>'
+                        for target in (page, page + 1) for order in ('price', 'name', 'new') for view in ('grid', 'list'))
+        for order in ('', 'name', 'new', 'price'):
+            for view in ('', 'grid', 'list'):
+                query = '&'.join(part for part in (f'page={page}', order and f'sort={order}', view and f'view={view}') if part)
+                site[f'https://example.com/shop?{query}'] = shop.format(page=page, links=links)
+    
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, include_query_params=True, max_depth=6)
+    crawler.fetcher = FakeSession(site)
+    pages = crawler.crawl()
+    plain = WebsiteCrawler(base_url="https://example.com", rate_limit=0, include_query_params=True,
+                           max_depth=6, query_param_samples=0)
+    plain.fetcher = FakeSession(site)
+    plain_pages = plain.crawl()
+    
+    assert crawler.query_params.ignored('example.com/') == {'sort', 'view'}, "❌ Irrelevant parameters not learned"
+    titles = {page['title'] for page in pages}
+    assert titles == {page['title'] for page in plain_pages}, "❌ Learning lost real pages"
+    assert len(pages) < len(plain_pages) / 2, f"❌ Too many variants fetched ({len(pages)} of {len(plain_pages)})"
+    print(f"✅ All {len(titles) - 1} shop pages kept with {len(pages)} fetches instead of {len(plain_pages)}")
+
+
+
+def test_redirect_canonical_dedup():
+    """Test that redirected and rel=canonical duplicates end up as one record plus aliases."""
+    print("\n" + "=" * 70)
+    print("Testing Redirect and Canonical Deduplication")
+    print("=" * 70)
+    
+    page = '<html><head><title>{title}</title>{head}</head><body><main><p>{text}</p>{links}</main></body></html>'
+    site = {
+        'https://example.com': page.format(title='Home', head='', text='Welcome to the example site home page.',
+                                           links='<a href="/old">Old</a><a href="/new">New</a><a href="/print">Print</a>'
+                                                 '<a href="/about">About</a><a href="/about-copy">Copy</a>'
+                                                 '<a href="/moved">Moved</a><a href="/docs/old">Docs</a>'),
+        'https://example.com/new': page.format(title='New', head='', text='The page everything moved to.', links=''),
+        'https://example.com/print': page.format(title='New', head='<link rel="canonical" href="/new">',
+                                                 text='The page everything moved to.', links=''),
+        'https://example.com/about': page.format(title='About', head='', text='About the example company.', links=''),
+        'https://example.com/about-copy': page.format(title='Team', head='<link rel="Canonical" href="/about">',
+                                                      text='A page that wrongly declares a canonical URL.', links=''),
+        'https://example.com/docs/guide/': page.format(title='Guide', head='', text='Documentation start page.',
+                                                       links='<a href="intro">Intro</a>'),
+        'https://example.com/docs/guide/intro': page.format(title='Intro', head='', text='Introduction to the docs.',
+                                                            links=''),
+    }
+    redirects = {
+        'https://example.com/old': 'https://example.com/new',
+        'https://example.com/moved': 'https://example.com/about',
+        'https://example.com/docs/old': 'https://example.com/docs/guide/',
+    }
+    
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0)
+    crawler.fetcher = FakeSession(site, redirects)
+    pages = crawler.crawl()
+    
+    urls = [page_data['url'] for page_data in pages]
+    assert urls == ['https://example.com', 'https://example.com/new', 'https://example.com/about',
+                    'https://example.com/about-copy', 'https://example.com/docs/guide/',
+                    'https://example.com/docs/guide/intro'], f"❌ Wrong pages stored: {urls}"
+    assert all('canonical' not in page_data for page_data in pages), "❌ Canonical URL left in the page data"
+    print("✅ Redirected pages stored under their final URL, relative links resolved against it")
+    
+    assert crawler.redirects == {
+        'https://example.com/old': 'https://example.com/new',
+        'https://example.com/print': 'https://example.com/new',
+        'https://example.com/moved': 'https://example.com/about',
+        'https://example.com/docs/old': 'https://example.com/docs/guide/',
+    }, f"❌ Wrong redirect map: {crawler.redirects}"
+    requested = [url for url, headers in crawler.fetcher.requests]
+    assert 'https://example.com/new' not in requested, "❌ Redirect target fetched again"
+    print(f"✅ {len(crawler.redirects)} aliases mapped, {crawler.duplicates} duplicates dropped, "
+          f"a canonical URL with different content ignored")
+    
+    concurrent = AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=4)
+    concurrent.fetcher = FakeSession(site, redirects)
+    assert concurrent.crawl() == pages, "❌ Concurrent crawl deduplicates differently"
+    assert concurrent.redirects == crawler.redirects, "❌ Concurrent crawl maps aliases differently"
+    print("✅ Concurrent crawl produces the same records and redirect map")
+    
+    # The copy is reached before the canonical page it declares
+    site['https://example.com'] = page.format(title='Home', head='', text='Welcome to the example site home page.',
+                                              links='<a href="/print">Print</a><a href="/new">New</a>')
+    for crawler in (WebsiteCrawler(base_url="https://example.com", rate_limit=0),
+                    AsyncWebsiteCrawler(base_url="https://example.com", rate_limit=0, concurrency=1)):
+        crawler.fetcher = FakeSession(site)
+        urls = [page_data['url'] for page_data in crawler.crawl()]
+        assert urls == ['https://example.com', 'https://example.com/new'], f"❌ Copy not replaced by canonical: {urls}"
+        assert crawler.redirects == {'https://example.com/print': 'https://example.com/new'}, \
+            f"❌ Wrong redirect map: {crawler.redirects}"
+        assert crawler.duplicates == 1, f"❌ {crawler.duplicates} duplicates counted"
+    print("✅ Copy stored before its canonical page is renamed to the canonical URL")
+
+
+
+def test_crawler_traps():
+    """Test that link loops and endless calendars are cut and oversized URL patterns deferred."""
+    print("\n" + "=" * 70)
+    print("Testing Crawler Trap Detection")
+    print("=" * 70)
+    
+    import time
+    from datetime import datetime, timezone
+    
+    detector = TrapDetector(max_segments=6, now=datetime(2026, 6, 1, tzinfo=timezone.utc).timestamp())
+    assert detector.trap('https://example.com/a/b/a/b') == 'repeating path', "❌ Repeated run not detected"
+    assert detector.trap('https://example.com/x/x/x') == 'repeating path', "❌ Repeated segment not detected"
+    assert detector.trap('https://example.com/1/2/3/4/5/6/7') == 'path depth', "❌ Deep path not detected"
+    assert detector.trap('https://example.com/calendar/2029-01') == 'date runaway', "❌ Far-future month not detected"
+    assert detector.trap('https://example.com/events?year=1985') == 'date runaway', "❌ Ancient year not detected"
+    assert detector.trap('https://example.com/calendar/2031/12/24') == 'date runaway', "❌ Far-future day not detected"
+    assert detector.trap('https://example.com/events?month=2031-05&view=grid') == 'date runaway', \
+        "❌ Far-future month in the query not detected"
+    for url in ('https://example.com/blog/2024/05/spring-update', 'https://example.com/calendar/20280315',
+                'https://example.com/docs/docs', 'https://example.com/product/209912345',
+                'https://example.com/product/205012', 'https://example.com/order/20301231',
+                'https://example.com/sku-2040-11', 'https://example.com/item/x2040-11',
+                'https://example.com/cart?id=2040-11x', 'https://example.com/shop?year=20401'):
+        assert detector.trap(url) is None, f"❌ Real content flagged: {url}"
+    assert TrapDetector.pattern('https://example.com/shop/42?sort=1&color=red') == 'example.com/shop/<n>?color&sort', \
+        "❌ Wrong URL pattern"
+    print("✅ Repeating paths, deep paths and runaway dates detected; dated posts left alone")
+    
+    class EndlessSite(dict):
+        """Fixed pages plus a relative-link loop and a calendar that always has a next month."""
+        
+        def get(self, url, default=None):
+            path = url[len('https://example.com'):]
+            if path.startswith('/loop'):
+                return '<html><body><main><p>Loop page at ' + path + '</p><a href="loop/x">Deeper</a></main></body></html>'
+            if path.startswith('/events/'):
+                year, month = map(int, path[len('/events/'):].split('-'))
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                return (f'<html><body><main><p>Events calendar for {path}</p>'
+                        f'<a href="/events/{year}-{month:02d}">Next month</a></main></body></html>')
+            return dict.get(self, url, default)
+    
+    this_year = time.gmtime().tm_year
+    site = EndlessSite({
+        'https://example.com': '<html><body><main><p>Welcome to the example site.</p>'
+                               + ''.join(f'<a href="/product/{n}">Product {n}</a>' for n in range(1, 7))
+                               + f'<a href="/loop/x">Loop</a><a href="/events/{this_year}-01">Events</a>'
+                               + '</main></body></html>',
+        'https://example.com/about': '<html><body><main><p>About the example company.</p></main></body></html>',
+    })
+    for n in range(1, 7):
+        site[f'https://example.com/product/{n}'] = ('<html><body><main><p>Product description number '
+                                                    f'{n}.</p><a href="/about">About</a></main></body></html>')
+    
+    crawler = WebsiteCrawler(base_url="https://example.com", rate_limit=0, trap_pattern_cap=3)
+    crawler.fetcher = FakeSession(site)
+    urls = [page['url'] for page in crawler.crawl()]
+    
+    calendar = [url for url in urls if '/events/' in url]
+    assert len(calendar) == 12 * (TrapDetector.YEARS_AHEAD + 1), f"❌ Calendar not cut off: {len(calendar)} months"
+    assert not any('/loop/loop/loop' in url for url in urls), "❌ Link loop followed"
+    assert set(crawler.traps.cut) == {'repeating path', 'date runaway'}, f"❌ Wrong cuts: {crawler.traps.cut}"
+    print(f"✅ Calendar stopped after {len(calendar)} months, link loop cut at "
+          f"{max(url.count('/loop') for url in urls)} levels")
+    
+    deferred = [urls.index(f'https://example.com/product/{n}') for n in range(4, 7)]
+    assert crawler.traps.deferred['example.com/product/<n>'] == 3, f"❌ Wrong deferrals: {crawler.traps.deferred}"
+    assert 'example.com/events/<n>-<n>' in crawler.traps.deferred, "❌ Calendar months not deferred"
+    assert min(deferred) > urls.index('https://example.com/about'), "❌ Deferred links crawled before deeper pages"
+    print("✅ Links beyond the pattern cap crawled after everything else")
+
+
 if __name__ == "__main__":
     print("\n🧪 Web Scraper Test Suite\n")
     
+    tests = [
+        ("Basic Functionality", test_basic_functionality),
+        ("Content Cleaning", test_content_cleaning),
+        ("Async Crawl Engine", test_async_crawl_matches_sequential),
+        ("Politeness Scheduler", test_politeness_scheduler),
+        ("Adaptive Rate Control", test_adaptive_rate_control),
+        ("HTTP Revalidation Cache", test_http_cache_revalidation),
+        ("Checkpoint and Resume", test_checkpoint_resume),
+        ("Crawl Frontier", test_crawl_frontier),
+        ("Compact Visited Sets", test_compact_visited_sets),
+        ("Sitemap Seeding", test_sitemap_seeding),
+        ("robots.txt Compliance", test_robots_compliance),
+        ("Streaming Fetch Limits", test_streaming_fetch_limits),
+        ("Retry Queue", test_retry_queue),
+        ("Fetcher Backends", test_fetcher_backends),
+        ("WARC Re-extraction", test_warc_reextract),
+        ("Single-Pass Extraction", test_single_pass_extraction),
+        ("Deeply Nested Extraction", test_deeply_nested_extraction),
+        ("Parser Backends", test_parser_backends),
+        ("Streaming Extraction", test_streaming_extraction),
+        ("Boilerplate Model", test_boilerplate_model),
+        ("Parse Worker Processes", test_parse_workers),
+        ("Charset Resolution", test_charset_resolution),
+        ("Extraction Cache", test_extraction_cache),
+        ("URL Canonicalization", test_url_canonicalization),
+        ("Query Parameter Learning", test_query_param_learning),
+        ("Redirect and Canonical Deduplication", test_redirect_canonical_dedup),
+        ("Crawler Trap Detection", test_crawler_traps),
+    ]
+    
     # Run tests
-    test1_passed = test_basic_functionality()
-    test2_passed = test_content_cleaning()
+    results = []
+    for name, test in tests:
+        try:
+            passed = test() is not False
+        except AssertionError as e:
+            print(f"\n{str(e)}")
+            passed = False
+        results.append((name, passed))
     
     # Summary
     print("\n" + "=" * 70)
     print("Test Summary")
     print("=" * 70)
-    print(f"Basic Functionality: {'✅ PASSED' if test1_passed else '❌ FAILED'}")
-    print(f"Content Cleaning: {'✅ PASSED' if test2_passed else '❌ FAILED'}")
+    for name, passed in results:
+        print(f"{name}: {'✅ PASSED' if passed else '❌ FAILED'}")
     
-    if test1_passed and test2_passed:
+    if all(passed for _, passed in results):
         print("\n🎉 All tests passed! The scraper is working correctly.")
         sys.exit(0)
     else: